@@ -47,7 +47,6 @@ masses = np.linspace(0.5,3.0,100)
 plt.figure(figsize=(12,8))        
 for ii,eosname in enumerate(eosnames):
     print(eosname)
-    radii = np.zeros(masses.shape)
     eos = EOS4ParameterPiecewisePolytrope(eosname)
 
     try:
@@ -55,17 +54,10 @@ for ii,eosname in enumerate(eosnames):
     except:
         continue
 
-    fid = open(os.path.join(plotDir,'%s.dat'%eosname),'w')
-    for jj,mass in enumerate(masses):
-        
-        try:
-            lambda1 = eos.lambdaofm(mass)
-            radius = eos.radiusofm(mass)
-        except:
-            continue
-
-        radii[jj] = radius
+    radii = eos.radiusofm(masses)
 
+    fid = open(os.path.join(plotDir,'%s.dat'%eosname),'w')
+    for mass,radius in zip(masses,radii):
         fid.write('%.10f %.10f\n'%(mass,radius))
 
     plt.plot(radii,masses,'-',label=eosname)
@@ -83,14 +75,8 @@ plotName="%s/love_EOS.pdf"%(plotDir)
 plt.figure(figsize=(12,8))
 for ii,eosname in enumerate(eosnames):
     print(eosname)
-    lovenumbers=np.zeros(masses.shape)
     eos=EOS4ParameterPiecewisePolytrope(eosname)
-    for jj,mass in enumerate(masses):
-	try:
-	    lovenumber=eos.k2ofm(mass)
-	except:
-	    continue
-	lovenumbers[jj]=lovenumber
+    lovenumbers=eos.k2ofm(masses)
     plt.plot(masses,lovenumbers,'+',label=eosname)
 plt.legend(loc='best')
 plt.xlabel('Mass [solar masses]')
@@ -102,14 +88,8 @@ plotName="%s/lambda_EOS.pdf"%(plotDir)
 plt.figure(figsize=(12,8))
 for ii,eosname in enumerate(eosnames):
     print(eosname)
-    lambdas=np.zeros(masses.shape)
     eos=EOS4ParameterPiecewisePolytrope(eosname)
-    for jj,mass in enumerate(masses):
-        try:
-            lambda1=eos.lambdaofm(mass)
-        except:
-            continue
-        lambdas[jj]=lambda1
+    lambdas=eos.lambdaofm(masses)
     plt.plot(masses,lambdas,'-',label=eosname)
 plt.legend(loc='best')
 plt.xlabel('Mass [solar masses]')
@@ -121,7 +101,6 @@ plotName = "%s/radius_density.pdf"%(plotDir)
 plt.figure(figsize=(12,8))
 for ii,eosname in enumerate(eosnames):
     print(eosname)
-    radii = np.zeros(masses.shape)
     eos = EOS4ParameterPiecewisePolytrope(eosname)
 
     try:
@@ -129,13 +108,7 @@ for ii,eosname in enumerate(eosnames):
     except:
         continue
 
-    for jj,mass in enumerate(masses):
-	try:
-            radius = eos.radiusofm(mass)
-        except:
-            continue
-
-        radii[jj] = radius
+    radii = eos.radiusofm(masses)
 
     plt.plot(radii,eps,'-',label=eosname)
 plt.legend(loc='best')
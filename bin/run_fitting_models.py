@@ -574,8 +574,6 @@ def myloglike_bns_Lambda2(cube, ndim, nparams):
         mej1, vej1 = bns2_model(m1,c1,m2,c2)
         mej1 = mej1/(10**alpha)
 
-        print(m1,mTOV,lambdatilde,q,lambda2)
-
         if (m1)>(mTOV):
             prob = -np.inf
             return prob
@@ -614,8 +612,6 @@ def myloglike_bns_Lambda2(cube, ndim, nparams):
         if mej2 == 0.0:
             prob = -np.inf
 
-        print(prob)
-
         return prob
 
 def myloglike_bns_JointFitDisk(cube, ndim, nparams):
@@ -737,8 +733,6 @@ def myloglike_nsbh_JointFitDisk(cube, ndim, nparams):
             prob = -np.inf
             return prob
 
-        print(mej1, mej2, prob)
-
         if mej1 == 0.0:
             prob = -np.inf
         if mej2 == 0.0:
@@ -1004,8 +998,6 @@ def myloglike_NSBH(cube, ndim, nparams):
 
         prob2 = calc_prob_KN_NSBH(q, lambda2, zeta, chi_eff)
 
-        print(zeta, chi_eff, prob, prob2)
-
         #prob = prob + prob2
 
         if np.isnan(prob):
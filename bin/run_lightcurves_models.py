@@ -50,6 +50,8 @@ def parse_commandline():
     parser.add_option("--doMassGap",  action="store_true", default=False)
     parser.add_option("--doReduced",  action="store_true", default=False)
     parser.add_option("--doFixZPT0",  action="store_true", default=False) 
+    parser.add_option("--doMarginalizeZP",  action="store_true", default=False)
+    parser.add_option("--doMarginalizeT0",  action="store_true", default=False)
     parser.add_option("--doFitSigma",  action="store_true", default=False)
     parser.add_option("--doWaveformExtrapolate",  action="store_true", default=False)
     parser.add_option("--doEOSFit",  action="store_true", default=False)
@@ -63,6 +65,12 @@ def parse_commandline():
     parser.add_option("--tmin",default=0.05,type=float)
     parser.add_option("--dt",default=0.05,type=float)
     parser.add_option("--n_live_points",default=100,type=int)
+    parser.add_option("--sampler",default="multinest",help="multinest, emcee or dynesty")
+    parser.add_option("--nprocs",default=1,type=int)
+    parser.add_option("--model_cache_size",default=1000,type=int)
+    parser.add_option("--model_cache_rtol",default=0.0,type=float)
+    parser.add_option("--doTelemetry",  action="store_true", default=False)
+    parser.add_option("--telemetry_interval",default=30.0,type=float)
 
     parser.add_option("--colormodel",default="a2.0")
 
@@ -380,7 +388,9 @@ else:
 Global.data_out = data_out
 Global.errorbudget = errorbudget
 Global.ZPRange = ZPRange
+Global.doMarginalizeZP = opts.doMarginalizeZP
 Global.T0Range = T0Range
+Global.doMarginalizeT0 = opts.doMarginalizeT0
 Global.doLightcurves = 1
 Global.filters = filters
 Global.doWaveformExtrapolate = opts.doWaveformExtrapolate
@@ -3,6 +3,8 @@ import lal
 from distutils.spawn import find_executable
 from astropy.table import Table
 
+from .EOSFamily import polytrope_family, get_family_table
+
 class EOS4ParameterPiecewisePolytrope(object):
     """4-piece polytrope equation of state.
     """
@@ -23,35 +25,27 @@ class EOS4ParameterPiecewisePolytrope(object):
         lp_si = lp_cgs - 1.
 
         # Initialize with piecewise polytrope parameters (logp1 in SI units)
-        eos = lalsimulation.SimNeutronStarEOS4ParameterPiecewisePolytrope(lp_si, g1, g2, g3)
-
         # This creates the interpolated functions R(M), k2(M), etc.
-        # after doing many TOV integrations.
-        self.fam = lalsimulation.CreateSimNeutronStarFamily(eos)
+        # after doing many TOV integrations, once per set of parameters.
+        self.eos, self.fam = polytrope_family(lp_si, g1, g2, g3)
+
+        # R(M), k2(M) tabulated once on a dense mass grid
+        self.table = get_family_table(self.fam)
 
         # Get maximum mass for this EOS
         self.mmax = lalsimulation.SimNeutronStarMaximumMass(self.fam)/lal.MSUN_SI
+
     def radiusofm(self, m):
-        """Radius in km.
+        """Radius in km, -1 outside the family. m may be an array.
         """
-        try:
-            r_SI = lalsimulation.SimNeutronStarRadius(m*lal.MSUN_SI, self.fam)
-            return r_SI/1000.0
-        except:
-            return -1
+        return self.table.radiusofm(m)
 
     def k2ofm(self, m):
-        """Dimensionless Love number.
+        """Dimensionless Love number, -1 outside the family. m may be an array.
         """
-        try:
-            return lalsimulation.SimNeutronStarLoveNumberK2(m*lal.MSUN_SI, self.fam)
-        except:
-            return -1
+        return self.table.k2ofm(m)
 
     def lambdaofm(self, m):
-        """Dimensionless tidal deformability.
+        """Dimensionless tidal deformability. m may be an array.
         """
-        r = self.radiusofm(m)
-        k2 = self.k2ofm(m)
-        return (2./3.)*k2*( (lal.C_SI**2*r*1000.0)/(lal.G_SI*m*lal.MSUN_SI) )**5
-
+        return self.table.lambdaofm(m)
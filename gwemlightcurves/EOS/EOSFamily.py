@@ -0,0 +1,160 @@
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+from scipy.interpolate import interpolate as interp
+
+# lalsimulation families and their tabulated R(M), k2(M), built once per process
+_FAMILIES = {}
+_FAMILY_TABLES = {}
+
+def polytrope_family(lp_si, g1, g2, g3):
+    """Cached (eos, fam) of a 4-parameter piecewise polytrope (logp1 in SI units).
+    """
+    # rounded so that logp1 converted from cgs along different paths agrees
+    key = ('polytrope',) + tuple(round(float(p), 10) for p in (lp_si, g1, g2, g3))
+    if key not in _FAMILIES:
+        import lalsimulation
+        eos = lalsimulation.SimNeutronStarEOS4ParameterPiecewisePolytrope(lp_si, g1, g2, g3)
+        _FAMILIES[key] = (eos, lalsimulation.CreateSimNeutronStarFamily(eos))
+    return _FAMILIES[key]
+
+def named_family(eos_name):
+    """Cached (eos, fam) of an EOS known to lalsimulation by name.
+    """
+    key = ('name', eos_name)
+    if key not in _FAMILIES:
+        import lalsimulation
+        eos = lalsimulation.SimNeutronStarEOSByName(eos_name)
+        _FAMILIES[key] = (eos, lalsimulation.CreateSimNeutronStarFamily(eos))
+    return _FAMILIES[key]
+
+def get_eos_cache_dir():
+    """Directory holding converted EOS tables, $GWEMLIGHTCURVES_CACHE/eos
+    (default ~/.cache/gwemlightcurves/eos).
+    """
+    cache_dir = os.environ.get('GWEMLIGHTCURVES_CACHE',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'gwemlightcurves'))
+    return os.path.join(cache_dir, 'eos')
+
+def tabulated_family(press, edens, cache_dir=None):
+    """Cached (eos, fam) of a pressure - energy density table in SI units.
+
+    lalsimulation only reads tables from disk, so the table is written once
+    to <cache_dir>/<sha1 of its content>.dat, atomically so that concurrent
+    jobs never read a partial file, and reused by every later call or job.
+    """
+    table = np.ascontiguousarray(np.transpose((press, edens)), dtype=float)
+    digest = hashlib.sha1(table.tobytes()).hexdigest()
+    key = ('table', digest)
+    if key not in _FAMILIES:
+        import lalsimulation
+        if cache_dir is None:
+            cache_dir = get_eos_cache_dir()
+        eos_fname = os.path.join(cache_dir, digest + '.dat')
+        if not os.path.isfile(eos_fname):
+            if not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    if not os.path.isdir(cache_dir):
+                        raise
+            fd, tmp_fname = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+            try:
+                with os.fdopen(fd, 'w') as fid:
+                    np.savetxt(fid, table, delimiter='\t')
+                os.rename(tmp_fname, eos_fname)
+            except:
+                if os.path.exists(tmp_fname):
+                    os.remove(tmp_fname)
+                raise
+        eos = lalsimulation.SimNeutronStarEOSFromFile(eos_fname)
+        _FAMILIES[key] = (eos, lalsimulation.CreateSimNeutronStarFamily(eos))
+    return _FAMILIES[key]
+
+def get_family_table(fam, key=None, npts=1000):
+    """Cached EOSFamilyTable of a lalsimulation family, keyed by key or, for
+    families built by this module, by the key of the family itself (its
+    polytrope parameters, EOS name or table hash).
+    """
+    if key is None:
+        key = _family_key(fam)
+    if key is None:
+        return EOSFamilyTable(fam, npts=npts)
+    if (key, npts) not in _FAMILY_TABLES:
+        _FAMILY_TABLES[(key, npts)] = EOSFamilyTable(fam, npts=npts)
+    return _FAMILY_TABLES[(key, npts)]
+
+def _family_key(fam):
+    for key, (eos, cached_fam) in _FAMILIES.items():
+        if cached_fam is fam:
+            return key
+    return None
+
+class EOSFamilyTable(object):
+    """R(M), k2(M) and Lambda(M) of a family of TOV stars, tabulated once on a
+    dense mass grid and interpolated for arrays of masses.
+
+    Masses outside [mmin, mmax] give -1 for the radius and Love number, as
+    the scalar lalsimulation wrappers do.
+    """
+
+    def __init__(self, fam, npts=1000):
+        import lalsimulation
+        import lal
+
+        self.mmin = lalsimulation.SimNeutronStarFamMinimumMass(fam)/lal.MSUN_SI
+        self.mmax = lalsimulation.SimNeutronStarMaximumMass(fam)/lal.MSUN_SI
+
+        # R(M) steepens towards the maximum mass, so the grid is denser there
+        u = np.linspace(0.0, 1.0, npts)
+        mass = self.mmin + (self.mmax - self.mmin)*(1.0 - (1.0 - u)**2)
+        radius = np.zeros(mass.shape)
+        k2 = np.zeros(mass.shape)
+        keep = np.ones(mass.shape, dtype=bool)
+        for ii, m in enumerate(mass):
+            try:
+                radius[ii] = lalsimulation.SimNeutronStarRadius(m*lal.MSUN_SI, fam)/1000.0
+                k2[ii] = lalsimulation.SimNeutronStarLoveNumberK2(m*lal.MSUN_SI, fam)
+            except:
+                keep[ii] = False
+
+        self.mass, self.radius, self.k2 = mass[keep], radius[keep], k2[keep]
+        self.mmin, self.mmax = self.mass[0], self.mass[-1]
+        self.lambdas = lambda_of_radius(self.mass, self.radius, self.k2)
+
+        self._radius = interp.interp1d(self.mass, self.radius, kind='cubic')
+        self._k2 = interp.interp1d(self.mass, self.k2, kind='cubic')
+
+    def _evaluate(self, f, m):
+        m = np.asarray(m, dtype=float)
+        out = np.full(m.shape, -1.0)
+        inside = (m >= self.mmin) & (m <= self.mmax)
+        out[inside] = f(m[inside])
+        if out.ndim == 0:
+            return float(out)
+        return out
+
+    def radiusofm(self, m):
+        """Radius in km.
+        """
+        return self._evaluate(self._radius, m)
+
+    def k2ofm(self, m):
+        """Dimensionless Love number.
+        """
+        return self._evaluate(self._k2, m)
+
+    def lambdaofm(self, m):
+        """Dimensionless tidal deformability.
+        """
+        return lambda_of_radius(m, self.radiusofm(m), self.k2ofm(m))
+
+def lambda_of_radius(m, r, k2):
+    """Dimensionless tidal deformability of a star of mass m (solar masses),
+    radius r (km) and Love number k2.
+    """
+    import lal
+    m = np.asarray(m, dtype=float)
+    return (2./3.)*k2*( (lal.C_SI**2*r*1000.0)/(lal.G_SI*m*lal.MSUN_SI) )**5
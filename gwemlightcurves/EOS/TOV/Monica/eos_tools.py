@@ -1,26 +1,66 @@
 import numpy as np
+
+from . import MonotonicSpline as ms
+
 #do not extrapolate
 def values_from_table(mass, mass_table, value_table, consts):
     """
     """
-    value = np.zeros(mass.size)
-    for (idx, imass) in enumerate(mass):
-        # Check if mass is larger than largest value in table and set to constant
-        if imass > mass_table.max():
-            value[idx] = 10**-6
-            continue
+    return TableInterpolator(mass_table, value_table, consts)(mass)
 
-        # check if any of the masses are in the table exactly
-        if imass in mass_table:
-            value[idx] = value_table[idx]
-            continue
+class TableInterpolator(object):
+    """
+    Monotone cubic interpolation of value_table(mass_table), built once and
+    evaluated on arrays of masses. Masses above the table give 10**-6, masses
+    on a table entry give that entry and masses outside every rising
+    interval of the table give 0.
+    """
+
+    def __init__(self, mass_table, value_table, consts=None):
+        self.mass_table = np.array(mass_table, dtype=float)
+        self.value_table = np.array(value_table, dtype=float)
+        if consts is None:
+            consts = ms.interpolate(self.mass_table, self.value_table)
+        self.consts = np.array(consts, dtype=float)
+        self.increasing = np.all(np.diff(self.mass_table) > 0)
+
+    def __call__(self, mass):
+        mass = np.atleast_1d(np.asarray(mass, dtype=float))
+        mass_table = self.mass_table
+        value = np.zeros(mass.shape)
 
         # finally extrapolate if mass is in between to mass_table values
-        for (idx_table, tmp) in enumerate(mass_table):
-            if mass_table.size != idx_table + 1:
-                if (mass_table[idx_table] < imass and mass_table[idx_table + 1] > imass):
+        idx_table = self._interval(mass)
+        inside = idx_table >= 0
+        idx_table = idx_table[inside]
+        dm = mass[inside] - mass_table[idx_table]
+        value[inside] = self.value_table[idx_table] + self.consts[idx_table,0] * dm + self.consts[idx_table,1] * dm**2 + self.consts[idx_table,2] * dm**3
+
+        # check if any of the masses are in the table exactly
+        exact = np.isin(mass, mass_table)
+        if np.any(exact):
+            value[exact] = self.value_table[np.argmax(mass[exact][:,np.newaxis] == mass_table, axis=1)]
+
+        # Check if mass is larger than largest value in table and set to constant
+        value[mass > mass_table.max()] = 10**-6
+
+        return value
+
+    def _interval(self, mass, chunk=10000):
+        """Index of the last table interval strictly containing each mass, -1 if none"""
+        mass_table = self.mass_table
+        n = len(mass_table)
 
-                    value[idx] = value_table[idx_table] + consts[idx_table,0] * (imass - mass_table[idx_table]) + consts[idx_table,1] * (imass - mass_table[idx_table])**2 + consts[idx_table,2] *(imass - mass_table[idx_table])**3
+        if self.increasing:
+            idx = np.searchsorted(mass_table, mass, side='right') - 1
+            ok = (idx >= 0) & (idx < n-1)
+            ok[ok] = mass_table[idx[ok]] < mass[ok]
+            return np.where(ok, idx, -1)
 
-                    continue
-    return value
+        lower, upper = mass_table[:-1], mass_table[1:]
+        idx = np.empty(mass.shape, dtype=int)
+        for start in range(0, len(mass), chunk):
+            m = mass[start:start+chunk,np.newaxis]
+            contains = (lower < m) & (upper > m)
+            idx[start:start+chunk] = np.where(np.any(contains, axis=1), n-2-np.argmax(contains[:,::-1], axis=1), -1)
+        return idx
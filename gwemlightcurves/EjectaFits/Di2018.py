@@ -66,6 +66,68 @@ def calc_vej(m1,c1,m2,c2):
 
     return a*(m1/m2)*(1+c*c1) + a*(m2/m1)*(1+c*c2)+b
 
+def calc_meje_grad(m1,c1,m2,c2):
+    """
+.. py:function:: calc_meje_grad(m1,c1,m2,c2)
+
+    ejecta mass of calc_meje and its analytic gradient with respect to
+    (m1, c1, m2, c2), vectorized over samples
+
+   :param float m1: mass of larger ns (MSun)
+   :param float c1: compactness of the larger neutron star
+   :param float m2: mass of samller ns (MSun)
+   :param float c2: compactness of the smaller neutron star
+   :return: ejecta mass (Msun) and its gradient, shape (4,) + shape of the inputs
+   :rtype: tuple
+    """
+
+    a= -0.0811876
+    b= 0.228762
+    d= -2.16099
+    n= -2.50884
+
+    m1, c1, m2, c2 = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (m1,c1,m2,c2)])
+    r = m2/m1
+
+    log10_mej = a*(m1*(1-2*c1)/c1 + m2*(1-2*c2)/c2) + b*(m1*r**n + m2*r**(-n))+d
+    meje_fit = 10**log10_mej
+
+    dlog10_mej = np.array([a*(1-2*c1)/c1 + b*((1-n)*r**n + n*r**(1-n)),
+                           -a*m1/c1**2,
+                           a*(1-2*c2)/c2 + b*(n*r**(n-1) + (1-n)*r**(-n)),
+                           -a*m2/c2**2])
+
+    return meje_fit, meje_fit*np.log(10.0)*dlog10_mej
+
+def calc_vej_grad(m1,c1,m2,c2):
+    """
+.. py:function:: calc_vej_grad(m1,c1,m2,c2)
+
+    velocity of calc_vej and its analytic gradient with respect to
+    (m1, c1, m2, c2), vectorized over samples
+
+   :param float m1: mass of larger ns (MSun)
+   :param float c1: compactness of the larger neutron star
+   :param float m2: mass of samller ns (MSun)
+   :param float c2: compactness of the smaller neutron star
+   :return: velocity of ejecta and its gradient, shape (4,) + shape of the inputs
+   :rtype: tuple
+    """
+    a=-0.329242
+    b=0.720385
+    c=-1.63255
+
+    m1, c1, m2, c2 = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (m1,c1,m2,c2)])
+    q = m1/m2
+
+    vej = a*q*(1+c*c1) + a*(1/q)*(1+c*c2)+b
+    dvej = np.array([a*(q*(1+c*c1) - (1+c*c2)/q)/m1,
+                     a*c*q,
+                     a*((1+c*c2)/q - q*(1+c*c1))/m2,
+                     a*c/q])
+
+    return vej, dvej
+
 def calc_qej(m1,c1,m2,c2):
     """
 .. py:function:: calc_qej(m1,c1,m2,c2)
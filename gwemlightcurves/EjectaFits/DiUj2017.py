@@ -45,6 +45,65 @@ def calc_meje(m1,mb1,c1,m2,mb2,c2):
 
     return meje_fit
 
+def calc_meje_grad(m1,mb1,c1,m2,mb2,c2):
+    """
+.. py:function:: calc_meje_grad(m1,mb1,c1,m2,mb2,c2)
+
+    ejecta mass of calc_meje and its analytic gradient with respect to
+    (m1, mb1, c1, m2, mb2, c2), vectorized over samples. The gradient
+    vanishes where the fit is clipped to zero.
+
+   :param float m1: mass of larger ns (MSun)
+   :param float mb1: baryonic mass of larger ns
+   :param float c1: compactness of the larger neutron star
+   :param float m2: mass of samller ns (MSun)
+   :param float mb2: baryonic of smaller ns
+   :param float c2: compactness of the smaller neutron star
+   :return: ejecta mass (Msun) and its gradient, shape (6,) + shape of the inputs
+   :rtype: tuple
+    """
+
+    a= -1.35695
+    b=  6.11252
+    c=-49.43355
+    d=  16.1144
+    n=  -2.5484
+
+    m1, mb1, c1, m2, mb2, c2 = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (m1,mb1,c1,m2,mb2,c2)])
+    r = m2/m1
+    r13, rn = r**(1.0/3.0), r**n
+    f1, f2 = (1.0-2.0*c1)/c1, (1.0-2.0*c2)/c2
+
+    tmp1=(mb1*r13*f1+mb2*f2/r13) * a
+    tmp2=(mb1*rn+mb2/rn) * b
+    tmp3=(mb1*(1.0-m1/mb1)+mb2*(1.0-m2/mb2)) * c
+
+    meje_fit=np.maximum(tmp1+tmp2+tmp3+d,0)/1000.0
+
+    dtmp = np.array([a/(3.0*m1)*(mb2*f2/r13-mb1*r13*f1) + b*n/m1*(mb2/rn-mb1*rn) - c,
+                     a*r13*f1 + b*rn + c,
+                     -a*mb1*r13/c1**2,
+                     a/(3.0*m2)*(mb1*r13*f1-mb2*f2/r13) + b*n/m2*(mb1*rn-mb2/rn) - c,
+                     a*f2/r13 + b/rn + c,
+                     -a*mb2/(r13*c2**2)])
+
+    return meje_fit, np.where(tmp1+tmp2+tmp3+d > 0, dtmp, 0.0)/1000.0
+
+def _calc_v_grad(m1,c1,m2,c2,a,b,c):
+    """
+    value and gradient with respect to (m1, c1, m2, c2) of the velocity fits
+    ((m1/m2)*(1+c*c1)+(m2/m1)*(1+c*c2))*a+b
+    """
+    m1, c1, m2, c2 = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (m1,c1,m2,c2)])
+    q = m1/m2
+
+    v = (q*(1.0+c*c1)+(1.0+c*c2)/q)*a+b
+    dv = np.array([a*(q*(1.0+c*c1) - (1.0+c*c2)/q)/m1,
+                   a*c*q,
+                   a*((1.0+c*c2)/q - q*(1.0+c*c1))/m2,
+                   a*c/q])
+    return v, dv
+
 def calc_vrho(m1,c1,m2,c2):
     """
 .. py:function:: calc_vrho(m1,c1,m2,c2)
@@ -113,6 +172,43 @@ def calc_vej(m1,c1,m2,c2):
     """
     return np.sqrt(calc_vrho(m1,c1,m2,c2)**2.0+calc_vz(m1,c1,m2,c2)**2.0)
 
+def calc_vrho_grad(m1,c1,m2,c2):
+    """
+.. py:function:: calc_vrho_grad(m1,c1,m2,c2)
+
+    velocity of calc_vrho and its analytic gradient with respect to
+    (m1, c1, m2, c2), vectorized over samples
+    """
+    return _calc_v_grad(m1,c1,m2,c2,-0.219479,0.444836,-2.67385)
+
+def calc_vz_grad(m1,c1,m2,c2):
+    """
+.. py:function:: calc_vz_grad(m1,c1,m2,c2)
+
+    velocity of calc_vz and its analytic gradient with respect to
+    (m1, c1, m2, c2), vectorized over samples
+    """
+    return _calc_v_grad(m1,c1,m2,c2,-0.315585,0.63808,-1.00757)
+
+def calc_vej_grad(m1,c1,m2,c2):
+    """
+.. py:function:: calc_vej_grad(m1,c1,m2,c2)
+
+    velocity of calc_vej and its analytic gradient with respect to
+    (m1, c1, m2, c2), vectorized over samples
+
+   :param float m1: mass of larger ns (MSun)
+   :param float c1: compactness of the larger neutron star
+   :param float m2: mass of samller ns (MSun)
+   :param float c2: compactness of the smaller neutron star
+   :return: velocity of ejecta and its gradient, shape (4,) + shape of the inputs
+   :rtype: tuple
+    """
+    vrho, dvrho = calc_vrho_grad(m1,c1,m2,c2)
+    vz, dvz = calc_vz_grad(m1,c1,m2,c2)
+    vej = np.sqrt(vrho**2.0+vz**2.0)
+    return vej, (vrho*dvrho+vz*dvz)/vej
+
 def calc_qej(m1,c1,m2,c2):
     """
 .. py:function:: calc_qej(m1,c1,m2,c2)
@@ -22,10 +22,75 @@ def calc_meje(q,chi_eff,c,mb,mns):
 
     return meje_fit
 
+def calc_meje_grad(q,chi_eff,c,mb,mns):
+    """
+.. py:function:: calc_meje_grad(q,chi_eff,c,mb,mns)
+
+    ejecta mass of calc_meje and its analytic gradient with respect to
+    (q, chi_eff, c, mb, mns), vectorized over samples. The gradient
+    vanishes where the fit is clipped to zero.
+    """
+
+    a1=-2.269e-3
+    a2=4.464e-2 
+    a3=2.431    
+    a4=-0.4159   
+    n1=1.352
+    n2=0.2497
+
+    q, chi_eff, c, mb, mns = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (q,chi_eff,c,mb,mns)])
+    risco, drisco = r_isco_grad(chi_eff)
+
+    tmp1=risco*(q**n1)*a1
+    tmp2=(q**n2)*(1-2*c)*a2/c
+    tmp3=(1-mns/mb)*a3+a4
+    tmp=tmp1+tmp2+tmp3
+
+    meje_fit=mb*np.maximum(tmp,0)
+
+    dtmp = np.array([n1*tmp1/q + n2*tmp2/q,
+                     drisco*(q**n1)*a1,
+                     -(q**n2)*a2/c**2,
+                     a3*mns/mb**2,
+                     -a3/mb])
+    dmeje = mb*np.where(tmp > 0, dtmp, 0.0)
+    dmeje[3] += np.maximum(tmp,0)
+
+    return meje_fit, dmeje
+
 def calc_vave(q):
     return 1.5333330951369120e-2*q+0.19066667068621043
 
+def calc_vave_grad(q):
+    """
+.. py:function:: calc_vave_grad(q)
+
+    velocity of calc_vave and its derivative with respect to q
+    """
+    q = np.asarray(q, dtype=float)
+    return calc_vave(q), 1.5333330951369120e-2*np.ones(q.shape)
+
 def r_isco(chi):
   z1=1+((1-chi*chi)**(1/3.0))*(((1+chi)**(1/3.0))+(1-chi)**(1/3.0))
   z2=(3*chi*chi+z1*z1)**(1/2.0)
   return 3+z2-np.sign(chi)*((3-z1)*(3+z1+2*z2))**(1/2.0)
+
+def r_isco_grad(chi):
+  """
+  r_isco and its derivative with respect to chi, for -1 < chi < 1
+  """
+  chi = np.asarray(chi, dtype=float)
+  A=(1-chi*chi)**(1/3.0)
+  B=((1+chi)**(1/3.0))+(1-chi)**(1/3.0)
+  dA=-(2*chi/3.0)*(1-chi*chi)**(-2/3.0)
+  dB=((1+chi)**(-2/3.0)-(1-chi)**(-2/3.0))/3.0
+  z1=1+A*B
+  dz1=dA*B+A*dB
+  z2=(3*chi*chi+z1*z1)**(1/2.0)
+  dz2=(3*chi+z1*dz1)/z2
+  P=(3-z1)*(3+z1+2*z2)
+  dP=-dz1*(3+z1+2*z2)+(3-z1)*(dz1+2*dz2)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # P vanishes at chi=0, where the derivative tends to -4*sqrt(2/3)
+    dr=np.where(chi == 0, -4*np.sqrt(2/3.0), dz2-np.sign(chi)*dP/(2*np.sqrt(P)))
+  return 3+z2-np.sign(chi)*P**(1/2.0), dr
@@ -1,3 +1,4 @@
+import contextlib
 
 data_out = 0
 errorbudget = 0
@@ -13,3 +14,33 @@ svd_mag_color_model = 0
 svd_mag_color_models = []
 doWaveformExtrapolate = 0
 doAbsorption = 0
+doMarginalizeZP = 0
+doMarginalizeT0 = 0
+
+# the settings above, as held by a sampler.likelihood.Likelihood
+SETTINGS = ['data_out', 'errorbudget', 'ZPRange', 'T0Range', 'doLuminosity',
+            'doLightcurves', 'filters', 'svd_mag_model', 'svd_lbol_model',
+            'svd_spec_model', 'svd_mag_color_model', 'svd_mag_color_models',
+            'doWaveformExtrapolate', 'doAbsorption', 'doMarginalizeZP',
+            'doMarginalizeT0']
+
+def get_settings():
+    """Snapshot of the current settings"""
+    settings = dict((name, globals()[name]) for name in SETTINGS)
+    settings['svd_mag_color_models'] = list(settings['svd_mag_color_models'])
+    return settings
+
+@contextlib.contextmanager
+def use(settings):
+    """Install settings (a dict of some of SETTINGS) for the duration of a
+    with block and restore the previous values afterwards. The settings
+    are shared by all threads, see sampler.likelihood.Likelihood.activate"""
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError('unknown settings %s' % ', '.join(sorted(unknown)))
+    previous = dict((name, globals()[name]) for name in settings)
+    globals().update(settings)
+    try:
+        yield
+    finally:
+        globals().update(previous)
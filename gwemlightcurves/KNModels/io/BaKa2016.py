@@ -56,4 +56,6 @@ def get_BaKa2016_model(table, **kwargs):
     return table
 
 register_model('BaKa2016', KNTable, get_BaKa2016_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 0.3)},
+                 batched=False, cost=1e-1)
@@ -1431,4 +1431,7 @@ def setbc_tabular():
     return td, bct
 
 register_model('DiUj2017', KNTable, get_DiUj2017_model,
-                 usage="table")
+                 usage="table",
+                 parameters=['mej','vej','vmin','th','ph','kappa','eps','alp','eth','flgbct'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 1.0), 'th': (0.0, np.pi/2), 'ph': (0.0, 2*np.pi)},
+                 batched=False, cost=3e-2)
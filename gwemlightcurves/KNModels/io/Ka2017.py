@@ -44,35 +44,7 @@ def get_Ka2017_model(table, **kwargs):
             table['n_coeff'] = 21
 
     if doAB:
-        if not Global.svd_mag_model == 0:
-            svd_mag_model = Global.svd_mag_model
-        else:
-            if LoadModel:
-            #if True:
-                modelfile = os.path.join(ModelPath,'Ka2017_mag.pkl')
-                with open(modelfile, 'rb') as handle:
-                    svd_mag_model = pickle.load(handle)
-            else:
-                svd_mag_model = svd_utils.calc_svd_mag(table['tini'][0], table['tmax'][0], table['dt'][0], model = "Ka2017", n_coeff = table['n_coeff'][0])
-                modelfile = os.path.join(ModelPath,'Ka2017_mag.pkl')
-                with open(modelfile, 'wb') as handle:
-                    pickle.dump(svd_mag_model, handle, protocol=pickle.HIGHEST_PROTOCOL)
-            Global.svd_mag_model = svd_mag_model
-
-        if not Global.svd_lbol_model == 0:
-            svd_lbol_model = Global.svd_lbol_model
-        else:
-            if LoadModel:
-            #if True:
-                modelfile = os.path.join(ModelPath,'Ka2017_lbol.pkl')
-                with open(modelfile, 'rb') as handle:
-                    svd_lbol_model = pickle.load(handle)            
-            else:
-                svd_lbol_model = svd_utils.calc_svd_lbol(table['tini'][0], table['tmax'][0], table['dt'][0], model = "Ka2017", n_coeff = table['n_coeff'][0])
-                modelfile = os.path.join(ModelPath,'Ka2017_lbol.pkl')
-                with open(modelfile, 'wb') as handle:
-                    pickle.dump(svd_lbol_model, handle, protocol=pickle.HIGHEST_PROTOCOL)
-            Global.svd_lbol_model = svd_lbol_model
+        svd_mag_model, svd_lbol_model = load_svd_models(table, LoadModel=LoadModel, ModelPath=kwargs.get('ModelPath'))
     elif doSpec:
         if not Global.svd_spec_model == 0:
             svd_spec_model = Global.svd_spec_model
@@ -102,26 +74,87 @@ def get_Ka2017_model(table, **kwargs):
 
     # Log mass ejecta
     table['mej10'] = np.log10(table['mej'])
-    # Initialize lightcurve values in table
 
-    timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
-    table['t'] = [np.zeros(timeseries.size)]
     if doAB:
-        table['lbol'] = [np.zeros(timeseries.size)]
-        table['mag'] =  [np.zeros([9, timeseries.size])]
+        # all samples go through the surrogate in one batch
+        param_array = np.vstack((np.log10(table['mej']),np.log10(table['vej']),np.log10(table['Xlan']))).T
+        t, lbol, mag = svd_utils.calc_lc_batch(table['tini'][0], table['tmax'][0], table['dt'][0], param_array, svd_mag_model = svd_mag_model, svd_lbol_model = svd_lbol_model, model = "Ka2017")
+        table['t'] = np.tile(t, (len(table), 1))
+        table['lbol'] = lbol
+        table['mag'] = mag
     elif doSpec:
+        # Initialize spectra values in table
+        timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
         lambdas = np.arange(table['lambdaini'][0], table['lambdamax'][0]+table['dlambda'][0], table['dlambda'][0])
+        table['t'] = [np.zeros(timeseries.size)]
         table['lambda'] = [np.zeros(lambdas.size)]
         table['spec'] =  [np.zeros([lambdas.size, timeseries.size])]
 
-    # calc lightcurve for each sample
-    for isample in range(len(table)):
-        if doAB:
-            table['t'][isample], table['lbol'][isample], table['mag'][isample] = svd_utils.calc_lc(table['tini'][isample], table['tmax'][isample],table['dt'][isample], [np.log10(table['mej'][isample]),np.log10(table['vej'][isample]),np.log10(table['Xlan'][isample])],svd_mag_model = svd_mag_model, svd_lbol_model = svd_lbol_model, model = "Ka2017")
-        elif doSpec:
+        # calc spectra for each sample
+        for isample in range(len(table)):
             table['t'][isample], table['lambda'][isample], table['spec'][isample] = svd_utils.calc_spectra(table['tini'][isample], table['tmax'][isample],table['dt'][isample], table['lambdaini'][isample], table['lambdamax'][isample]+table['dlambda'][isample], table['dlambda'][isample], [np.log10(table['mej'][isample]),table['vej'][isample],np.log10(table['Xlan'][isample])],svd_spec_model = svd_spec_model, model = "Ka2017")
 
     return table
 
+def load_svd_models(table, LoadModel=False, ModelPath=None):
+    """
+    Magnitude and bolometric SVD models of Ka2017, taken from Global if
+    already set, otherwise loaded from (or computed and saved to) ModelPath
+    """
+
+    if not Global.svd_mag_model == 0:
+        svd_mag_model = Global.svd_mag_model
+    else:
+        if LoadModel:
+        #if True:
+            modelfile = os.path.join(ModelPath,'Ka2017_mag.pkl')
+            with open(modelfile, 'rb') as handle:
+                svd_mag_model = pickle.load(handle)
+        else:
+            svd_mag_model = svd_utils.calc_svd_mag(table['tini'][0], table['tmax'][0], table['dt'][0], model = "Ka2017", n_coeff = table['n_coeff'][0])
+            modelfile = os.path.join(ModelPath,'Ka2017_mag.pkl')
+            with open(modelfile, 'wb') as handle:
+                pickle.dump(svd_mag_model, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        Global.svd_mag_model = svd_mag_model
+
+    if not Global.svd_lbol_model == 0:
+        svd_lbol_model = Global.svd_lbol_model
+    else:
+        if LoadModel:
+        #if True:
+            modelfile = os.path.join(ModelPath,'Ka2017_lbol.pkl')
+            with open(modelfile, 'rb') as handle:
+                svd_lbol_model = pickle.load(handle)            
+        else:
+            svd_lbol_model = svd_utils.calc_svd_lbol(table['tini'][0], table['tmax'][0], table['dt'][0], model = "Ka2017", n_coeff = table['n_coeff'][0])
+            modelfile = os.path.join(ModelPath,'Ka2017_lbol.pkl')
+            with open(modelfile, 'wb') as handle:
+                pickle.dump(svd_lbol_model, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        Global.svd_lbol_model = svd_lbol_model
+
+    return svd_mag_model, svd_lbol_model
+
+def calc_lc_components(tini,tmax,dt,mej,vej,Xlan,svd_mag_model,svd_lbol_model):
+    """
+    Lightcurves of N samples of a multi-component kilonova. mej, vej and Xlan
+    are (N, ncomp) (or (ncomp,) for one sample); all N*ncomp components go
+    through the surrogate in one batch and their fluxes are summed.
+
+    Returns times (nt,), lbol (N, nt) and mag (N, 9, nt).
+    """
+
+    mej, vej, Xlan = [np.atleast_2d(np.asarray(x, dtype=float)) for x in (mej,vej,Xlan)]
+    nsamples, ncomp = mej.shape
+
+    param_array = np.vstack((np.log10(mej).ravel(),np.log10(vej).ravel(),np.log10(Xlan).ravel())).T
+    t, lbol, mag = svd_utils.calc_lc_batch(tini,tmax,dt,param_array,svd_mag_model=svd_mag_model,svd_lbol_model=svd_lbol_model,model="Ka2017")
+
+    lbol = np.sum(lbol.reshape((nsamples,ncomp,len(t))),axis=1)
+    mag = -2.5*np.log10(np.sum(10**(-mag.reshape((nsamples,ncomp,9,len(t)))*0.4),axis=1))
+
+    return t, lbol, mag
+
 register_model('Ka2017', KNTable, get_Ka2017_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','Xlan'],
+                 bounds={'mej': (1e-5, 1e-1), 'vej': (0.0, 0.3), 'Xlan': (1e-9, 1e-1)},
+                 batched=True, cost=1e-2)
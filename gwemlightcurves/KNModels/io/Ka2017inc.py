@@ -94,4 +94,6 @@ def get_Ka2017inc_model(table, **kwargs):
     return table
 
 register_model('Ka2017inc', KNTable, get_Ka2017inc_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','Xlan','iota'],
+                 bounds={'mej': (1e-5, 1e-1), 'vej': (0.0, 0.3), 'Xlan': (1e-9, 1e-1), 'iota': (0.0, 180.0)},
+                 batched=False, cost=5e-2)
@@ -11,6 +11,7 @@ from .. import KNTable
 
 from gwemlightcurves import lightcurve_utils, Global, svd_utils
 from gwemlightcurves.EjectaFits.DiUj2017 import calc_meje, calc_vej
+from .Ka2017 import load_svd_models, calc_lc_components
 
 def get_Ka2017x2_model(table, **kwargs):
 
@@ -24,15 +25,33 @@ def get_Ka2017x2_model(table, **kwargs):
     else:
         doSpec = False
 
+    if doAB:
+        if not 'n_coeff' in table.colnames:
+            table['n_coeff'] = 43
+
+        # both components of every sample share one surrogate batch
+        svd_mag_model, svd_lbol_model = load_svd_models(table, LoadModel=kwargs.get('LoadModel', False), ModelPath=kwargs.get('ModelPath'))
+        mej = np.vstack((table['mej_1'], table['mej_2'])).T
+        vej = np.vstack((table['vej_1'], table['vej_2'])).T
+        Xlan = np.vstack((table['Xlan_1'], table['Xlan_2'])).T
+
+        # Throw out samples where either mass ejecta is less than zero.
+        mask = np.all(mej > 0, axis=1)
+        table = table[mask]
+        if len(table) == 0: return table
+
+        t, lbol, mag = calc_lc_components(table['tini'][0], table['tmax'][0], table['dt'][0], mej[mask], vej[mask], Xlan[mask], svd_mag_model, svd_lbol_model)
+        table['t'] = np.tile(t, (len(table), 1))
+        table['lbol'] = lbol
+        table['mag'] = mag
+
+        return table
+
     timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
+    lambdas = np.arange(table['lambdaini'][0], table['lambdamax'][0]+table['dlambda'][0], table['dlambda'][0])
     table['t'] = [np.zeros(timeseries.size)]
-    if doAB:
-        table['lbol'] = [np.zeros(timeseries.size)]
-        table['mag'] =  [np.zeros([9, timeseries.size])]
-    elif doSpec:
-        lambdas = np.arange(table['lambdaini'][0], table['lambdamax'][0]+table['dlambda'][0], table['dlambda'][0])
-        table['lambda'] = [np.zeros(lambdas.size)]
-        table['spec'] =  [np.zeros([lambdas.size, timeseries.size])]
+    table['lambda'] = [np.zeros(lambdas.size)]
+    table['spec'] =  [np.zeros([lambdas.size, timeseries.size])]
 
     table1 = copy.copy(table)
     table1['mej'] = table['mej_1']
@@ -47,14 +66,15 @@ def get_Ka2017x2_model(table, **kwargs):
     table1 = KNTable.model('Ka2017', table1, **kwargs)
     table2 = KNTable.model('Ka2017', table2, **kwargs)
 
-    # calc lightcurve for each sample
+    # calc spectra for each sample
     for isample in range(len(table)):
-        if doAB:
-            table['t'][isample], table['lbol'][isample], table['mag'][isample] = table1['t'][isample], table1['lbol'][isample] + table2['lbol'][isample], -2.5*np.log10(10**(-table1['mag'][isample]*0.4) + 10**(-table2['mag'][isample]*0.4))
-        elif doSpec:
-            table['t'][isample], table['lambda'][isample], table['spec'][isample] = table1['t'][isample], table1['lambda'][isample], table1['spec'][isample] + table2['spec'][isample]
+        table['t'][isample], table['lambda'][isample], table['spec'][isample] = table1['t'][isample], table1['lambda'][isample], table1['spec'][isample] + table2['spec'][isample]
 
     return table
 
 register_model('Ka2017x2', KNTable, get_Ka2017x2_model,
-                 usage="table")
+                 usage="table",
+                 parameters=['mej_1','vej_1','Xlan_1','mej_2','vej_2','Xlan_2'],
+                 bounds={'mej_1': (1e-5, 1e-1), 'vej_1': (0.0, 0.3), 'Xlan_1': (1e-5, 1.0),
+                         'mej_2': (1e-5, 1e-1), 'vej_2': (0.0, 0.3), 'Xlan_2': (1e-5, 1.0)},
+                 batched=True, cost=2e-2)
@@ -79,4 +79,9 @@ def get_Ka2017x2inc_model(table, **kwargs):
     return table
 
 register_model('Ka2017x2inc', KNTable, get_Ka2017x2inc_model,
-                 usage="table")
+                 usage="table",
+                 parameters=['mej_1','vej_1','Xlan_1','mej_2','vej_2','Xlan_2','iota'],
+                 bounds={'mej_1': (1e-5, 1e-1), 'vej_1': (0.0, 0.3), 'Xlan_1': (1e-5, 1.0),
+                         'mej_2': (1e-5, 1e-1), 'vej_2': (0.0, 0.3), 'Xlan_2': (1e-5, 1.0),
+                         'iota': (0.0, 180.0)},
+                 batched=False, cost=1e-1)
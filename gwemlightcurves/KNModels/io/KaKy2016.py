@@ -1,4 +1,3 @@
-
 # Modified from: http://www2.yukawa.kyoto-u.ac.jp/~kyohei.kawaguchi/kn_calc/main.html
 # Reference: Kawaguchi et al. https://arxiv.org/abs/1601.07711
 
@@ -10,6 +9,9 @@ from .. import KNTable
 
 from gwemlightcurves.EjectaFits.KaKy2016 import calc_meje, calc_vave
 
+# bolometric corrections are only built once per process, see get_bc_table
+_BC_TABLE = None
+
 def get_KaKy2016_model(table, **kwargs):
     if not 'mej' in table.colnames:
         # calc the mass of ejecta
@@ -24,18 +26,16 @@ def get_KaKy2016_model(table, **kwargs):
 
     # Log mass ejecta
     table['mej10'] = np.log10(table['mej'])
-    # Initialize columns
-    timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
-    table['t'] = [np.zeros(timeseries.size)]
-    table['lbol'] = [np.zeros(timeseries.size)]
-    table['mag'] =  [{}]
 
-    # Loop over samples
-    for isample in range(len(table)):
-        table['t'][isample], table['lbol'][isample], table['mag'][isample] = calc_lc(table['tini'][isample], table['tmax'][isample], table['dt'][isample],
-                                               table['mej'][isample], table['vej'][isample], table['vmin'][isample],
-                                               table['th'][isample], table['ph'][isample], table['kappa'][isample],
-                                               table['eps'][isample], table['alp'][isample], table['eth'][isample])
+    # All samples share one time grid, so evaluate the whole table at once
+    t_d, lbol, mag = calc_lc_batch(table['tini'][0], table['tmax'][0], table['dt'][0],
+                                   table['mej'], table['vej'], table['vmin'],
+                                   table['th'], table['ph'], table['kappa'],
+                                   table['eps'], table['alp'], table['eth'])
+    table['t'] = np.tile(t_d, (len(table), 1))
+    table['lbol'] = lbol
+    table['mag'] = mag
+
     return table
 
 def slope(x,a):
@@ -45,71 +45,69 @@ def slope(x,a):
         s=a*Math.exp((x-a)/a)
     return s
 
-def calc_lc(tini,tmax,dt,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
+def lightcurve(tini,tmax,dt,vmin,th,ph,kappa,eps,alp,eth,q,chi_eff,mns,mb,c):
+    """
+.. py:function:: lightcurve(tini,tmax,dt,vmin,th,ph,kappa,eps,alp,eth,q,chi_eff,mns,mb,c)
 
-  td, bc = setbc_APR4Q3a75()
+   Lightcurves of BH-NS mergers straight from the binary parameters.
+   All arguments broadcast, so arrays of samples (e.g. those used by
+   ``bhns_model``) are evaluated in one call.
 
-  lbol_d=[]
-  bc_tmp=[]
+   :return: times (nt,), lbol (N, nt), mag (N, 9, nt), mej (N,), vej (N,)
+    """
 
-  t_d = np.arange(tini,tmax+dt,dt)
+    mej = np.atleast_1d(calc_meje(q,chi_eff,c,mb,mns))
+    vej = np.atleast_1d(calc_vave(q))
+    t_d, lbol, mag = calc_lc_batch(tini,tmax,dt,mej,vej,vmin,th,ph,kappa,eps,alp,eth)
+
+    return t_d, lbol, mag, mej, vej
+
+def calc_lc(tini,tmax,dt,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
+
+  t_d, lbol_d, mag_d = calc_lc_batch(tini,tmax,dt,mej,vave,vmin,th,ph,kappa,eps,alp,eth)
 
-  mag_d = {}
-  for ii in xrange(9):
-      mag_d[ii] = np.array([])
+  mag_new = {}
+  for ii in range(9):
+      mag_new[ii] = mag_d[0,ii]
+
+  return t_d, lbol_d[0], mag_new
 
-  epsBarnes = 0
-  if epsBarnes:
-        mejtab = (0.001,0.001,0.001,0.005,0.005,0.005,0.01,0.01,0.01,0.05,0.05,0.05)
-        vejtab = (0.1,0.2,0.3,0.1,0.2,0.3,0.1,0.2,0.3,0.1,0.2,0.3)
-        a      = (2.01,4.52,8.16,0.81,1.90,3.20,0.56,1.31,2.19,0.27,0.55,0.95)
-        b      = (0.28,0.62,1.19,0.19,0.28,0.45,0.17,0.21,0.31,0.10,0.13,0.15)
-        d      = (1.12,1.39,1.52,0.86,1.21,1.39,0.74,1.13,1.32,0.60,0.90,1.13)
+def calc_lc_batch(tini,tmax,dt,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
+  """
+.. py:function:: calc_lc_batch(tini,tmax,dt,mej,vave,vmin,th,ph,kappa,eps,alp,eth)
 
-        fa     = scipy.interpolate.interp2d(mejtab,vejtab,a, kind='linear')
-        fb     = scipy.interpolate.interp2d(mejtab,vejtab,b, kind='linear')
-        fd     = scipy.interpolate.interp2d(mejtab,vejtab,d, kind='linear')
+   Vectorized version of :py:func:`calc_lc` over epochs and samples.
+   The ejecta parameters may be scalars or arrays of length N, the time
+   grid is shared by all samples.
 
-        fam    = fa(mej,vave)
-        fbm    = fb(mej,vave)
-        fdm    = fd(mej,vave)
+   :return: times (nt,), lbol (N, nt) and mag (N, 9, nt) with bands ugrizyJHK
+  """
 
-  for t in t_d:
+  td, bc = get_bc_table()
 
-    if epsBarnes:
-          eth = 0.36*(np.exp(-fam*t)+ np.log(1+2*fbm*t**fdm)/(2*fbm*t**fdm))[0]
+  t_d = np.arange(tini,tmax+dt,dt)
 
-    lbol=kn_lbol(t,mej,vave,vmin,th,ph,kappa,eps,alp,eth)
-    lbol_d.append(lbol)
-    mbol=mag_bol(lbol,10)
-    tt=t/(mej**(1/3.2))
-    bc_tmp=getBC(td,bc,tt)
+  mej, vave, vmin, th, ph, kappa, eps, alp, eth = [np.atleast_1d(np.asarray(x, dtype=float))[:,np.newaxis] for x in (mej,vave,vmin,th,ph,kappa,eps,alp,eth)]
 
-    for ii in xrange(9):
-        if t > 2.*(mej*100)**(1.0/3.2):
-          mag_d[ii] = np.append(mag_d[ii],mbol-bc_tmp[ii])
-        else:
-          mag_d[ii] = np.append(mag_d[ii],np.nan)
+  lbol_d = kn_lbol(t_d,mej,vave,vmin,th,ph,kappa,eps,alp,eth)
+  mbol = mag_bol(lbol_d,10)
+  tt = t_d/(mej**(1/3.2))
+  bc_tmp = getBC(td,bc,tt)
 
-  lbol_d = np.array(lbol_d)
+  late = t_d > 2.*(mej*100)**(1.0/3.2)
+  mag_d = np.where(late[:,np.newaxis,:], mbol[:,np.newaxis,:] - bc_tmp, np.nan)
 
+  # y band interpolated between z (8657.8) and J (12350), as np.interp would
   wavelengths = [3543, 4775.6, 6129.5, 7484.6, 8657.8, 12350, 16620, 21590]
   wavelength_interp = 9603.1
 
-  mag_y = np.zeros(t_d.shape)
-  for ii in xrange(len(t_d)):
-      mags = [mag_d[jj][ii] for jj in xrange(8)]
-      mag_y[ii] = np.interp(wavelength_interp,wavelengths,mags)
-  mag_new = {}
-  mag_new[0] = mag_d[0]
-  mag_new[1] = mag_d[1]
-  mag_new[2] = mag_d[2]
-  mag_new[3] = mag_d[3]
-  mag_new[4] = mag_d[4]
-  mag_new[5] = mag_y
-  mag_new[6] = mag_d[5]
-  mag_new[7] = mag_d[6]
-  mag_new[8] = mag_d[7]
+  slope_y = (mag_d[:,5]-mag_d[:,4])/(wavelengths[5]-wavelengths[4])
+  mag_y = slope_y*(wavelength_interp-wavelengths[4]) + mag_d[:,4]
+
+  mag_new = np.empty(mag_d.shape)
+  mag_new[:,:5] = mag_d[:,:5]
+  mag_new[:,5] = mag_y
+  mag_new[:,6:] = mag_d[:,5:8]
 
   return t_d, lbol_d, mag_new
 
@@ -120,22 +118,38 @@ def mag_bol(lbol,d):
 
   return -2.5*np.log(lbol/4/np.pi/d0/d0/f0)/np.log(10.0)
 
+def get_bc_table():
+  """
+  Bolometric correction table of APR4Q3a75, built on first use and cached
+  """
+  global _BC_TABLE
+  if _BC_TABLE is None:
+      td, bc = setbc_APR4Q3a75()
+      td.flags.writeable = False
+      bc.flags.writeable = False
+      _BC_TABLE = (td, bc)
+
+  return _BC_TABLE
+
 def getBC(td,bc,tt):
+  """
+  Linear interpolation of the bolometric corrections at rescaled times tt,
+  located by binary search. Returns shape (9,) for a scalar, (9, nt) for
+  tt of shape (nt,) and (N, 9, nt) for (N, nt); NaN outside of the table.
+  """
 
-  if (tt<td[0]) or (tt>td[99]):
-      return np.array([np.nan,np.nan,np.nan,np.nan,np.nan,np.nan,np.nan,np.nan,np.nan])
-  else:
-      for ii in xrange(100):
-          if (td[ii]<=tt) and (tt<=td[ii+1]):
-              break
-      bc_tmp=np.zeros((9,))
-      fac=(tt-td[ii])/(td[ii+1]-td[ii])
-      for jj in xrange(9):
-          bc_tmp[jj]=(1-fac)*bc[jj][ii]+fac*bc[jj][ii+1]
-          if not np.isfinite(bc_tmp[jj]):
-              bc_tmp[jj] = np.nan
+  tt = np.asarray(tt, dtype=float)
+  ii = np.clip(np.searchsorted(td, tt, side='left') - 1, 0, len(td) - 2)
+  fac = (tt-td[ii])/(td[ii+1]-td[ii])
 
-      return bc_tmp
+  with np.errstate(invalid='ignore'):
+      bc_tmp = (1-fac)*bc[:,ii] + fac*bc[:,ii+1]
+  outside = (tt < td[0]) | (tt > td[-1])
+  bc_tmp = np.where(outside | ~np.isfinite(bc_tmp), np.nan, bc_tmp)
+  if tt.ndim > 1:
+      bc_tmp = np.moveaxis(bc_tmp, 0, -2)
+
+  return bc_tmp
 
 def kn_lbol(t,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
   c=2.99792458e10
@@ -148,15 +162,9 @@ def kn_lbol(t,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
   eps0=eth*eps/eneu0*day*msun
 
   vdiff = vmax(vave,vmin)-vmin
-  if vdiff < 0:
-      tobs = 0.0
-  else:
-      tobs=(th*mej*kappa0/(2*ph*vdiff))**(1/2.0)
-
-  if (t<tobs):
-      fac=t/tobs
-  else:
-      fac=1
+  with np.errstate(divide='ignore', invalid='ignore'):
+      tobs = np.where(vdiff < 0, 0.0, (th*mej*kappa0/(2*ph*np.abs(vdiff)))**(1/2.0))
+      fac = np.where(t < tobs, t/tobs, 1.0)
 
   lbol=(1+th)*mej*fac*eps0*(t**(-alp))*lumu0
 
@@ -164,10 +172,7 @@ def kn_lbol(t,mej,vave,vmin,th,ph,kappa,eps,alp,eth):
 
 def vmax(vave,vmin):
   vdiff = 12*vave*vave-3*vmin*vmin
-  if vdiff < 0:
-      return 0
-  else:
-      return 0.5*(vdiff**(1/2.0) -vmin)
+  return np.where(vdiff < 0, 0.0, 0.5*(np.sqrt(np.abs(vdiff)) - vmin))
 
 def setbc_APR4Q3a75():
   td= np.zeros((100,))
@@ -1094,4 +1099,7 @@ def setbc_APR4Q3a75():
   return td, bc
 
 register_model('KaKy2016', KNTable, get_KaKy2016_model,
-                 usage="table")
+                 usage="table",
+                 parameters=['mej','vej','vmin','th','ph','kappa','eps','alp','eth'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 1.0), 'th': (0.0, np.pi/2), 'ph': (0.0, 2*np.pi)},
+                 batched=True, cost=2e-4)
@@ -4,7 +4,9 @@
 # Brian Metzger, 2016
 
 import os, sys
+import warnings
 import numpy as np
+from scipy.interpolate import CubicSpline
 
 from .model import register_model
 from .. import KNTable
@@ -16,6 +18,7 @@ def get_Me2017_model(table, **kwargs):
 .. py:function:: get_Me2017_model(table, **kwargs) 
 
    :param table table: a table which must at least have columns of solar masses of objects the baryonic masses of the objects and the compactness of the object. The table except m1, mb1, c1, m2, mb2, c2, mej and vej as column names
+   :param float tol: optional magnitude tolerance of the adaptive time stepping, see :py:func:`calc_lc_batch`
    :return: The lbol, mag and sampling times of the KN Metzger 2017
    :rtype: table
 
@@ -34,19 +37,15 @@ def get_Me2017_model(table, **kwargs):
     # Log mass ejecta
     table['mej10'] = np.log10(table['mej'])
 
-    # Initialize lightcurve values in table
-    timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
-    table['t'] = [np.zeros(timeseries.size)]
-    table['lbol'] = [np.zeros(timeseries.size)]
-    table['mag'] =  [np.zeros([9, timeseries.size])]
-    table['Tobs'] = [np.zeros(timeseries.size)]
-
-    # calc lightcurve for each sample
-    for isample in range(len(table)):
-        # Calc lightcurve
-        table['t'][isample], table['lbol'][isample], table['mag'][isample], table['Tobs'][isample] = calc_lc(table['tini'][isample],table['tmax'][isample],
-                                                                     table['dt'][isample], table['mej'][isample],
-                                                                     table['vej'][isample],table['beta'][isample], table['kappa_r'][isample])
+    # All samples share one time grid, so integrate the whole table at once
+    t_d, lbol, mag, Tobs = calc_lc_batch(table['tini'][0], table['tmax'][0], table['dt'][0],
+                                         table['mej'], table['vej'], table['beta'], table['kappa_r'],
+                                         tol=kwargs.get('tol'))
+    table['t'] = np.tile(t_d, (len(table), 1))
+    table['lbol'] = lbol
+    table['mag'] = mag
+    table['Tobs'] = Tobs
+
     return table
 
 def lightcurve(tini,tmax,dt,beta,kappa_r,m1,mb1,c1,m2,mb2,c2):
@@ -325,5 +324,292 @@ def calc_lc(tini,tmax,dt,mej,vej,beta,kappa_r):
     return tdays, Ltotm*1e40, mAB, Tobs
 
 
+def calc_lc_batch(tini,tmax,dt,mej,vej,beta,kappa_r,mprec=300,tol=None):
+    """
+.. py:function:: calc_lc_batch(tini,tmax,dt,mej,vej,beta,kappa_r,mprec=300,tol=None)
+
+   Version of :py:func:`calc_lc` that integrates N samples at once, with a
+   sample axis in front of the mass layers. Only the engine-off, magnetar-free
+   branch of :py:func:`calc_lc` is kept, so the one-zone bulk solution (which
+   does not enter the observed light curve in that case) is not evolved.
+
+   :param mej: ejecta masses, scalar or array of length N (as are vej, beta and kappa_r)
+   :param float tol: if given, integrate in log time with steps chosen from a local error estimate, keeping the magnitudes within about tol of the converged light curve, then interpolate onto the output times. By default the output grid itself is stepped, as in :py:func:`calc_lc`
+   :return: times (nt,), lbol (N, nt), mag (N, 9, nt) and Tobs (N, nt)
+    """
+
+    # ** define constants **
+    c = 3.0e10
+    Msun = 2.0e33
+
+    mej, vej, beta, kappa_r = [np.atleast_1d(np.asarray(x, dtype=float))[:,np.newaxis] for x in (mej,vej,beta,kappa_r)]
+    mej, vej, beta, kappa_r = np.broadcast_arrays(mej, vej, beta, kappa_r)
+
+    M0 = mej*Msun
+    v0 = vej*c
+    Mn = 1.0e-8*Msun
+    Ye = 0.1
+    Xn0max = 1.0-2.0*Ye
+
+    tdays = np.arange(tini,tmax+dt,dt)
+    t = tdays*(3600.*24.)
+
+    # ** mass/velocity grid of the outer ejecta, (N, mprec) **
+    mmin = np.log(1.0e-8)
+    mmax = np.log(M0/Msun)
+    m = np.exp(np.arange(mprec)*(mmax-mmin)/(mprec-1.0) + mmin)
+    vm = v0*(m/(M0/Msun))**(-1./beta)
+    vm[vm > c] = c
+    dm = m[:,1:]-m[:,:-1]
+
+    # the outermost layer is never evolved, so drop it from the workspaces
+    m, vm = m[:,:-1], vm[:,:-1]
+
+    # neutron and r-process mass fractions
+    Xn0 = Xn0max*2*np.arctan((Mn/(m*Msun))**(1.0))/np.pi
+    Xr = 1.0-Xn0
+
+    layers = {"Xn0": Xn0, "Xr": Xr, "kappar": kappa_r*Xr,
+              # time independent factors of the diffusion time and optical depth
+              "tdiff_fac": 0.08*m*Msun*3/(vm*c*beta),
+              "tlc_fac": vm/c,
+              "tau_fac": m*Msun/(4.0*np.pi*vm**(2.0)),
+              "dmMsun": dm*Msun, "vm": vm}
+
+    if tol is None:
+        Ltotm, Rphoto = _integrate_layers(t, layers)
+    else:
+        Rphoto = _photosphere(t, layers)
+        Ltotm = _integrate_layers_adaptive(t, layers, tol)
+
+    Ltotm = Ltotm/1.0e20
+    Ltotm = Ltotm/1.0e20
+
+    mAB, Tobs = _magnitudes(Ltotm, Rphoto)
+
+    return tdays, Ltotm*1e40, mAB, Tobs
+
+def _magnitudes(Ltot, Rphoto):
+    """Blackbody AB magnitudes (N, 9, nt) and temperatures of the photosphere, Ltot in 1e40 erg/s"""
+
+    c = 3.0e10
+    kb = 1.38e-16
+    sigSB = 5.67e-5
+    h = 6.63e-27
+    Mpc = 3.08e24
+
+    z = 0.00
+    D = 1e-5*Mpc
+
+    # u (0) g (1) r (2) i (3) z (4) y (5) J (6) H (7) K (8)
+    lambdaobs = np.array([354.3, 477.56, 612.95, 748.46, 865.78, 960.31, 1235.0, 1662.0, 2159.0])
+    nuobs = c/(1.0e-7*lambdaobs)
+    nuobs = nuobs/(1.0 + z)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        Tobs = 1.0e10*(Ltot/(4.0*np.pi*(Rphoto)**(2.0)*sigSB))**(0.25)
+
+        nuobsarray = nuobs[np.newaxis,:,np.newaxis]
+        expo = np.exp(h*nuobsarray/(kb*Tobs[:,np.newaxis,:]))-1.0
+        F = (2.0*np.pi*(h*nuobsarray)*((nuobsarray/c)**(2.0))/expo)*((Rphoto/D)*(Rphoto/D))[:,np.newaxis,:]
+
+        mAB = -2.5*np.log10(F) - 48.6
+
+    return mAB, Tobs
+
+def _heating_and_opacity(tj, layers, Xn, edot, kappa):
+    """Fill the specific heating rate and opacity of each layer at time tj (s)"""
+
+    tdays = tj/(3600.*24.)
+    # thermalization efficiency from Barnes+16 (1e-2 Msun, 0.1 c)
+    ca = 0.56
+    cb = 0.17
+    cd = 0.74
+    eth = 0.36*(np.exp(-ca*tdays) + np.log(1.0+2*cb*(tdays**(cd)))/(2*cb*tdays**(cd)))
+
+    np.multiply(layers["Xn0"], np.exp(-tj/900.), out=Xn)
+    np.multiply(Xn, 3.2e14, out=edot)
+    edot += 2.1e10*eth*(tdays**(-1.3))
+    # kappa = 0.4*(1-Xn-Xr) + kappa_r*Xr
+    np.subtract(1.0, Xn, out=kappa)
+    kappa -= layers["Xr"]
+    kappa *= 0.4
+    kappa += layers["kappar"]
+
+def _integrate_layers(t, layers):
+    """Explicit integration of the layer energies stepping through the times t"""
+
+    vm = layers["vm"]
+    nsamples, nlayers = vm.shape
+    tprec = len(t)
+    dt = t[1:]-t[:-1]
+    rows = np.arange(nsamples)
+
+    # preallocated workspaces, (N, mprec-1)
+    ene = np.zeros(vm.shape)
+    Xn = np.empty(vm.shape)
+    kappa = np.empty(vm.shape)
+    edot = np.empty(vm.shape)
+    tdiff = np.empty(vm.shape)
+    lum = np.empty(vm.shape)
+    work = np.empty(vm.shape)
+
+    Ltotm = np.zeros((nsamples,tprec))
+    Rphoto = np.zeros((nsamples,tprec))
+
+    for j in range(tprec-1):
+        _heating_and_opacity(t[j], layers, Xn, edot, kappa)
+
+        np.multiply(kappa, layers["tdiff_fac"], out=tdiff)
+        tdiff /= t[j]
+        np.multiply(layers["tlc_fac"], t[j], out=work)
+        work += tdiff
+        np.divide(ene, work, out=lum)
+
+        # ene += (edot - ene/t - lum)*dt
+        np.divide(ene, t[j], out=work)
+        np.subtract(edot, work, out=work)
+        work -= lum
+        work *= dt[j]
+        ene += work
+
+        lum *= layers["dmMsun"]
+        Ltotm[:,j] = lum.sum(axis=1)
+
+        # photosphere
+        np.multiply(kappa, layers["tau_fac"], out=work)
+        work /= t[j]**(2.0)
+        work -= 1.0
+        np.abs(work, out=work)
+        pig = np.argmin(work, axis=1)
+        Rphoto[:,j] = vm[rows,pig]*t[j]
+
+    return Ltotm, Rphoto
+
+def _exp_step(ene, tj, h, layers, ws):
+    """
+    Layer energies after a step h (s) from tj with the exponential
+    (integrating factor) update, which is stable for any step size since
+    de/dt = edot - e/t - e/tdiff is linear in e. Heating and losses are
+    frozen at the geometric midpoint of the step.
+    """
+
+    Xn, edot, kappa, rate, work = ws
+    tm = np.sqrt(tj*(tj+h))
+    _heating_and_opacity(tm, layers, Xn, edot, kappa)
+    np.multiply(kappa, layers["tdiff_fac"], out=work)
+    work /= tm
+    work += layers["tlc_fac"]*tm
+    np.divide(1.0, work, out=rate)
+    rate += 1.0/tm
+
+    # ene = q + (ene - q)*exp(-rate*h) with q = edot/rate
+    np.multiply(rate, -h, out=work)
+    np.exp(work, out=work)
+    edot /= rate
+    out = ene - edot
+    out *= work
+    out += edot
+    return out
+
+def _diffusion_time(tj, layers, ws):
+    """Diffusion plus light crossing time of each layer at tj, left in ws"""
+
+    Xn, edot, kappa, rate, work = ws
+    _heating_and_opacity(tj, layers, Xn, edot, kappa)
+    np.multiply(kappa, layers["tdiff_fac"], out=work)
+    work /= tj
+    work += layers["tlc_fac"]*tj
+    return work
+
+def _integrate_layers_adaptive(t, layers, tol, h0=0.01, hmax=0.25, hmin=1e-8, nmax=10000):
+    """
+    Total luminosity at the times t from the exponential integration in one
+    pass over log time. Each step is taken once whole and once as two
+    halves; their difference estimates the local error of the luminosity,
+    which sets the next step, and the accepted energies are the Richardson
+    extrapolation of the two. The luminosity at the accepted nodes is then
+    interpolated onto t with a cubic spline in log-log.
+    """
+
+    vm = layers["vm"]
+    ws = [np.empty(vm.shape) for ii in range(5)]
+    dm = layers["dmMsun"]
+
+    # relative error of the luminosity per unit log time of tol magnitudes;
+    # the estimate is that of the half steps, the extrapolated energies
+    # are more accurate
+    logt = np.log(t)
+    rtol = tol/(2.5/np.log(10))
+
+    ene = np.zeros(vm.shape)
+    tnodes, Lnodes = [t[0]], [np.zeros(vm.shape[0])]
+    u, h = logt[0], h0
+    nattempts = 0
+    while u < logt[-1]:
+        h = min(h, logt[-1]-u)
+        ta, tb, tc = np.exp(u), np.exp(u+h/2), np.exp(u+h)
+        full = _exp_step(ene, ta, tc-ta, layers, ws)
+        half = _exp_step(ene, ta, tb-ta, layers, ws)
+        half = _exp_step(half, tb, tc-tb, layers, ws)
+        work = _diffusion_time(tc, layers, ws)
+        Lfull = np.sum(full/work*dm, axis=1)
+        Lhalf = np.sum(half/work*dm, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relerr = np.abs(Lhalf-Lfull)/Lhalf
+        relerr = relerr[np.isfinite(relerr)]
+        err = np.max(relerr)/3.0/h if len(relerr) else 0.0
+
+        nattempts += 1
+        if nattempts == nmax:
+            warnings.warn("Me2017 adaptive integration did not reach tol=%g in %d steps, "
+                          "finishing with steps of %g in log time" % (tol, nmax, hmax))
+        if err <= rtol or h <= hmin or nattempts >= nmax:
+            u += h
+            ene = half + (half-full)/3.0
+            tnodes.append(tc)
+            Lnodes.append(np.sum(ene/work*dm, axis=1))
+        if nattempts >= nmax:
+            h = hmax
+        else:
+            # second order steps, the error per unit time scales as h**2
+            h = min(hmax, h*min(4.0, max(0.2, 0.9*np.sqrt(rtol/max(err, 1e-300)))))
+
+    # no energy has been deposited at t[0]
+    tnodes, Lnodes = np.array(tnodes), np.array(Lnodes).T
+    with np.errstate(divide='ignore'):
+        spline = CubicSpline(np.log(tnodes[1:]), np.log(Lnodes[:,1:]), axis=1)
+    L = np.exp(spline(logt))
+    L[:,logt <= logt[0]] = 0.0
+    return L
+
+def _photosphere(t, layers, chunk=2**21):
+    """Photospheric radius (tau = 1) of each sample at the times t, in
+    blocks of times of at most chunk layer values"""
+
+    vm = layers["vm"]
+    nsamples, nlayers = vm.shape
+    rows = np.arange(nsamples)[:,np.newaxis]
+
+    # kappa*tau_fac = a - b*exp(-t/900) with kappa as in _heating_and_opacity,
+    # layers last so that the search for tau = 1 runs over contiguous memory
+    a = ((0.4*(1.0-layers["Xr"]) + layers["kappar"])*layers["tau_fac"])[:,np.newaxis,:]
+    b = (0.4*layers["Xn0"]*layers["tau_fac"])[:,np.newaxis,:]
+
+    Rphoto = np.zeros((nsamples,len(t)))
+    step = max(1, chunk//(nsamples*nlayers))
+    for start in range(0, len(t), step):
+        tj = t[start:start+step]
+        tau = a - b*np.exp(-tj/900.)[:,np.newaxis]
+        tau /= (tj**(2.0))[:,np.newaxis]
+        tau -= 1.0
+        np.abs(tau, out=tau)
+        pig = np.argmin(tau, axis=2)
+        Rphoto[:,start:start+step] = vm[rows,pig]*tj
+
+    return Rphoto
+
 register_model('Me2017', KNTable, get_Me2017_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','beta','kappa_r'],
+                 bounds={'mej': (1e-5, 10.0), 'vej': (0.0, 0.3), 'beta': (1.0, 5.0), 'kappa_r': (1e-1, 1e2)},
+                 batched=True, cost=4e-3)
@@ -56,4 +56,6 @@ def get_RoFe2017_model(table, **kwargs):
     return table
 
 register_model('RoFe2017', KNTable, get_RoFe2017_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','Ye'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 0.3), 'Ye': (0.0, 1.0)},
+                 batched=False, cost=1e-1)
@@ -4,6 +4,7 @@
 # Brian Metzger, 2016
 
 import os, sys
+import warnings
 import numpy as np
 
 from .model import register_model
@@ -25,7 +26,7 @@ def get_SmCh2017_model(table, **kwargs):
 
     # Log mass ejecta
     table['mej10'] = np.log10(table['mej'])
-    # Initialize lightcurve values in table
+    # All samples share one time grid, one call per sample evaluates all epochs
     timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
     table['t'] = [np.zeros(timeseries.size)]
     table['lbol'] = [np.zeros(timeseries.size)]
@@ -36,7 +37,8 @@ def get_SmCh2017_model(table, **kwargs):
     for isample in range(len(table)):
         table['t'][isample], table['lbol'][isample], table['mag'][isample], table['Tobs'][isample] = calc_lc(table['tini'][isample], table['tmax'][isample],
                                                                      table['dt'][isample], table['mej'][isample],
-                                                                     table['vej'][isample], table['slope_r'][isample], table['kappa_r'][isample])
+                                                                     table['vej'][isample], table['slope_r'][isample], table['kappa_r'][isample],
+                                                                     tol=kwargs.get('tol'))
     return table
 
 def lightcurve_break(tini,tmax,dt,slope_r,kappa_r,t_break,slope_break,m1,mb1,c1,m2,mb2,c2):
@@ -47,161 +49,211 @@ def lightcurve_break(tini,tmax,dt,slope_r,kappa_r,t_break,slope_break,m1,mb1,c1,
 
     return t, lbol, mag, Tobs
 
-def calc_lc(tini,tmax,dt,mej,vej,slope_r,kappa_r):
+def calc_lc(tini,tmax,dt,mej,vej,slope_r,kappa_r,tol=None):
 
     t_break = 10.0
     slope_break = slope_r * 1.0
-    t, lbol, mag, Tobs = calc_lc_break(tini,tmax,dt,mej,vej,slope_r,kappa_r,t_break,slope_break)
+    t, lbol, mag, Tobs = calc_lc_break(tini,tmax,dt,mej,vej,slope_r,kappa_r,t_break,slope_break,tol=tol)
 
     return t, lbol, mag, Tobs
 
-def calc_lc_break(tini,tmax,dt,mej,vej,slope_r,kappa_r,t_break,slope_break):
+def calc_lc_break(tini,tmax,dt,mej,vej,slope_r,kappa_r,t_break,slope_break,tol=None):
+    """
+.. py:function:: calc_lc_break(tini,tmax,dt,mej,vej,slope_r,kappa_r,t_break,slope_break,tol=None)
+
+   :param float tol: if given, the Arnett integrals of all epochs are taken in one cumulative pass, refined until the magnitudes change by less than tol. By default every output time is integrated on its own 5000 node grid
+   :return: times, lbol, mag (9, nt) and Tobs
+    """
 
     # ** define constants **
-    c = 3.0e10
-    mp = 1.67e-24
+    c = 2.998e10
     Msun = 2.0e33
-    kb = 1.38e-16
-    sigSB = 5.67e-5
-    h = 6.63e-27
-    arad = 7.56e-15
-    Mpc = 3.08e24
-
-    # ** define parameters **
-
-    # fiducial redshift/distance
-    #z = 0.01
-    #D = 39.5*Mpc
-    z = 0.00
-    D = 1e-5*Mpc
-
-    # engine (0 = off, 1 = on)
-    engine_switch = 0
-
-    # define desired observer band wavelengths (nm)
-    # u (0), b (1), v (2), r (3), i (4), z (5), y(6), j (7), k (8), l (9)
-    #lambdaobs = np.array([365., 445., 551., 658., 806., 900., 1020., 1220., 2190., 3450.])
-
-    # u (0) g (1) r (2) i (3) z (4) y (5) J (6) H (7) K (8)
-    lambdaobs = np.array([354.3, 477.56, 612.95, 748.46, 865.78, 960.31, 1235.0, 1662.0, 2159.0])
 
-    nuobs = c/(1.0e-7*lambdaobs)
-    nuobs = nuobs/(1.0 + z)
-
-    dotrap = 0
-    M_ej = mej  # Ejecta mass (Msun)
-    V_ej = vej*c
-    E_51 = 1/((10./(V_ej**2))*1e51/(3*M_ej*2e33))
-    kappa = kappa_r  # Initial spin period (ms)
-    slope = slope_r  # Shift in days of light curve (t_sinceexplosion = tvec_days + shift_days)
-    t0 = 1
-
-    # Constants
-    c      = 2.998e10   # Speed of light (cm/s) CHECKED
-    e_ni0   = 3.90e10    # Energy release in Ni56 decay (erg/s/g)  CHECKED
-    e_co0   = 6.78e9     # Energy release in Co56 decay (erg/s/g)  CHECKED
-    m_sol  = 2e33    # Solar mass (g)  CHECKED
-    tau_ni = 6.077*24*60*60/np.log(2)    # Decay time (half life / ln2) for Ni56 (s) 6.077  CHECKED
-    tau_co = 77.27*24*60*60/np.log(2)    # Decay time (half life / ln2) for Co56 (s) 77.27d  CHECKED
-    kappa_gamma = 0.03  # CHECKED
-
-    # total ejecta mass 
+    # total ejecta mass
     M0 = mej*Msun
     # minimum initial velocity
     v0 = vej*c
     # velocity index (M ~ v**-beta)
     beta = 3.
-  
+
     # ** define mass/velocity array of outer ejecta, comprised of half of mass **
     mmin = np.log(1.0e-8)
     mmax = np.log(M0/Msun)
     mprec = 300
     m = np.arange(mprec)*(mmax-mmin)/(mprec-1.0) + mmin
     m = np.exp(m)
- 
+
     vm = v0*(m/(M0/Msun))**(-1./beta)
     vm[vm > c] = c
 
-    tau_m = 1.05*((kappa/(13.7*c))**0.5) * (((((M_ej*m_sol)**3))/(E_51*1e51))**0.25)    # Diffusion time (Arnett 1982) Eq 18, 19, 22, 23 CHECKED
-    y = tau_m/(2*tau_ni)   # Arnett 1982 Eq 33 CHECKED
-    yp = tau_m/(2*tau_co)    # Arnet 1982 Eq 33, modified to 56Co decay  CHECKED
+    tvec_days = np.arange(tini,tmax+dt,dt)
+    t = tvec_days*24*3600
 
-    Nintegrate = 5000  # Number of time steps to run integrals over
+    # photosphere
+    tau = m*Msun*kappa_r/(4.0*np.pi*(t[:,np.newaxis]*vm)**(2.0))
+    pig = np.argmin(np.abs(tau-1.0), axis=1)
+    vphoto = vm[pig]
+    Rphoto = vphoto*t
 
-    tvec_days = np.arange(tini,tmax+dt,dt)
-    Ntimes = len(tvec_days)
-    Ltotm = np.zeros(tvec_days.shape)
-    vphoto = np.zeros(tvec_days.shape)
-    Rphoto = np.zeros(tvec_days.shape)
-
-    for i in xrange(Ntimes):
-
-        t = tvec_days[i]*24*3600         # Time in seconds
-        x = t/tau_m     # Arnett 1982 Eq 32 CHECKED
-        z = np.linspace(0.000001,x,Nintegrate)        # Define limits of intergration for A(z)  CHECKED
-
-        # Compute gamma ray deposition
-        R = V_ej*z*tau_m     # Radius vector...z*tau_m = time  CHECKED
-        rho = M_ej*2e33/(4*np.pi/3*R**3) # CHECKED
-        tau_56co_gamma = kappa_gamma*rho*R  # CHECKED
-        G = tau_56co_gamma/(tau_56co_gamma + 1.6)    # Arnett 1982 Eq 51 CHECKED
-        D_gamma = G*(1 + 2*G*(1-G)*(1-0.75*G))    # Arnett 1982 eq 50  CHECKED
-
-        power = np.zeros((z.shape))
-        ind = np.where((z*tau_m > 0.0001*24*3600) & (z*tau_m <= t_break*24*3600))[0]
-        slopeuse = slope
-        ts = 1.3
-        sigma = 0.11
-        eth = 0.36*(np.exp(-0.56*z*tau_m/(24*3600)) + (np.log(1 + 2*0.17*(z*tau_m/(24*3600))**0.74))/(2*0.17*(z*tau_m/(24*3600))**0.74))
-         
-        power[ind] = eth[ind]*1.9e10*(M_ej*m_sol)*(z[ind]*tau_m/(t0*24*3600))**(slopeuse)
-        ind = np.where(z*tau_m > t_break*24*3600)[0]
-        slopeuse = slope_break
-        power[ind] = 10**(slope-slopeuse)*eth[ind]*1.9e10*(M_ej*m_sol)*(z[ind]*tau_m/(t0*24*3600))**(slopeuse)
-    
-        # Kilnova part
-        taudiff = 1.05/(13.7*3e10)**0.5*kappa**0.5*(M_ej*2e33)**0.75*(E_51*1e51)**(-0.25)/(24*3600)
-        if (tvec_days[i] <= 2.5*taudiff):
-            integrand_rprocess = power*np.exp(z**2-x**2)*2*z
-            Lambda_kilonova = np.sum(integrand_rprocess*(x/Nintegrate))
-        else:
-            Lambda_kilonova = power[Nintegrate-1]
-        Ltotm[i] = Lambda_kilonova   # Calculate luminosity
-
-        kappa_correction = 1.0
-        tdiff = 0.08*kappa*m*Msun*3*kappa_correction/(vm*c*t*beta)
-        tau = m*Msun*kappa/(4.0*np.pi*(t*vm)**(2.0))
-
-        # photosphere 
-        pig1 = np.argmin(np.abs(taudiff-t))
-        pig = np.argmin(np.abs(tau-1.0))
-        vphoto[i] = vm[pig]
-        Rphoto[i] = vphoto[i]*t
+    if tol is None:
+        Ltotm = calc_lbol_break(tvec_days,mej,vej,slope_r,kappa_r,t_break,slope_break)
+    else:
+        Ltotm = calc_lbol_break_adaptive(tvec_days,mej,vej,slope_r,kappa_r,t_break,slope_break,Rphoto,tol)
 
     Ltotm = Ltotm/1.0e20
     Ltotm = Ltotm/1.0e20
 
-    if engine_switch:
-        Ltot = Lrad
-        Tobs = 1.0e10*(Ltot/(4.0*np.pi*(R)**(2.0)*sigSB))**(0.25)
-        if not BH_switch:
-            tlife = (Lsd/1.0e5)**(0.5)*(v/(0.3*c))**(0.5)*(t/(3600.*24.))**(-0.5)
-            Ltot = Ltot/(1.0+tlife)
-    if not engine_switch:
-        Ltot = Ltotm
-        Tobs = 1.0e10*(Ltot/(4.0*np.pi*(Rphoto)**(2.0)*sigSB))**(0.25)
-
-    nuobsarray = np.tile(nuobs,(Ntimes,1)).T
+    mAB, Tobs = calc_mags(Ltotm, Rphoto)
+
+    return tvec_days, Ltotm*1e40, mAB, Tobs
+
+def calc_mags(Ltot,Rphoto):
+    """Blackbody AB magnitudes (9, nt) and temperatures of the photosphere, Ltot in 1e40 erg/s"""
+
+    c = 2.998e10
+    kb = 1.38e-16
+    sigSB = 5.67e-5
+    h = 6.63e-27
+    Mpc = 3.08e24
+
+    # fiducial redshift/distance
+    z = 0.00
+    D = 1e-5*Mpc
+
+    # u (0) g (1) r (2) i (3) z (4) y (5) J (6) H (7) K (8)
+    lambdaobs = np.array([354.3, 477.56, 612.95, 748.46, 865.78, 960.31, 1235.0, 1662.0, 2159.0])
+
+    nuobs = 3.0e10/(1.0e-7*lambdaobs)
+    nuobs = nuobs/(1.0 + z)
+
+    Tobs = 1.0e10*(Ltot/(4.0*np.pi*(Rphoto)**(2.0)*sigSB))**(0.25)
+
+    nuobsarray = np.tile(nuobs,(len(Tobs),1)).T
     expo = np.exp(h*nuobsarray/(kb*Tobs))-1.0
     F = (2.0*np.pi*(h*nuobsarray)*((nuobsarray/c)**(2.0))/expo)*(Rphoto/D)*(Rphoto/D)
 
     mAB = -2.5*np.log10(F) - 48.6
 
-    # distance modulus
-    muD = 5.0*np.log10(D/(3.08e18))-5.
+    return mAB, Tobs
 
-    return tvec_days, Ltotm*1e40, mAB, Tobs
+def _arnett_break(mej,vej,slope_r,kappa_r,t_break,slope_break):
+    """
+    Diffusion times tau_m (s) and taudiff (days) of Arnett (1982) and the
+    r-process heating rate with a broken power law, power_break(t in s)
+    """
+
+    c      = 2.998e10   # Speed of light (cm/s) CHECKED
+    m_sol  = 2e33    # Solar mass (g)  CHECKED
+    kappa_gamma = 0.03  # CHECKED
 
+    M_ej = mej  # Ejecta mass (Msun)
+    V_ej = vej*3.0e10
+    E_51 = 1/((10./(V_ej**2))*1e51/(3*M_ej*2e33))
+    kappa = kappa_r
+    slope = slope_r
+    t0 = 1
+
+    tau_m = 1.05*((kappa/(13.7*c))**0.5) * (((((M_ej*m_sol)**3))/(E_51*1e51))**0.25)    # Diffusion time (Arnett 1982) Eq 18, 19, 22, 23 CHECKED
+    taudiff = 1.05/(13.7*3e10)**0.5*kappa**0.5*(M_ej*2e33)**0.75*(E_51*1e51)**(-0.25)/(24*3600)
+
+    def power_break(tz):
+        # r-process heating rate with thermalization efficiency, broken at t_break
+        eth = 0.36*(np.exp(-0.56*tz/(24*3600)) + (np.log(1 + 2*0.17*(tz/(24*3600))**0.74))/(2*0.17*(tz/(24*3600))**0.74))
+        power = np.zeros(tz.shape)
+        ind = (tz > 0.0001*24*3600) & (tz <= t_break*24*3600)
+        power[ind] = eth[ind]*1.9e10*(M_ej*m_sol)*(tz[ind]/(t0*24*3600))**(slope)
+        ind = tz > t_break*24*3600
+        power[ind] = 10**(slope-slope_break)*eth[ind]*1.9e10*(M_ej*m_sol)*(tz[ind]/(t0*24*3600))**(slope_break)
+        return power
+
+    return tau_m, taudiff, power_break
+
+def calc_lbol_break(tvec_days,mej,vej,slope_r,kappa_r,t_break,slope_break,Nintegrate=5000,chunk=100):
+    """
+    Arnett (1982) luminosity of r-process heating with a broken power law,
+    evaluated at the times tvec_days (days) in chunks of epochs
+    """
+
+    tau_m, taudiff, power_break = _arnett_break(mej,vej,slope_r,kappa_r,t_break,slope_break)
+
+    tvec_days = np.asarray(tvec_days, dtype=float)
+    x = tvec_days*24*3600/tau_m     # Arnett 1982 Eq 32 CHECKED
+
+    # after a few diffusion times the luminosity follows the instantaneous heating
+    Ltotm = power_break(x*tau_m)
+
+    early = np.where(tvec_days <= 2.5*taudiff)[0]
+    frac = np.linspace(0.0, 1.0, Nintegrate)
+    for start in range(0, len(early), chunk):
+        idx = early[start:start+chunk]
+        z = 0.000001 + frac*(x[idx,np.newaxis]-0.000001)        # Define limits of intergration for A(z)  CHECKED
+        z[:,-1] = x[idx]
+        power = power_break(z*tau_m)
+
+        # Kilnova part
+        integrand_rprocess = power*np.exp(z**2-x[idx,np.newaxis]**2)*2*z
+        Ltotm[idx] = np.sum(integrand_rprocess, axis=1)*(x[idx]/Nintegrate)
+
+    return Ltotm
+
+def calc_lbol_break_adaptive(tvec_days,mej,vej,slope_r,kappa_r,t_break,slope_break,Rphoto,tol,nstart=64,nmax=2**16):
+    """
+    :py:func:`calc_lbol_break` with the Arnett integral of all epochs taken
+    at once as a cumulative trapezoidal integral in ln z, so that early and
+    late epochs are resolved alike. The spacing is halved (evaluating the
+    integrand only at the new midpoints) until the magnitudes at tvec_days
+    change by less than tol/2, which bounds the remaining error by tol while
+    the error shrinks at least threefold per halving.
+    """
+
+    tau_m, taudiff, power_break = _arnett_break(mej,vej,slope_r,kappa_r,t_break,slope_break)
+
+    tvec_days = np.asarray(tvec_days, dtype=float)
+    x = tvec_days*24*3600/tau_m
+    Ltotm = power_break(x*tau_m)
+
+    early = np.where(tvec_days <= 2.5*taudiff)[0]
+    # no heating before 1e-4 days, so the integrals start there
+    zmin = max(0.000001, 0.0001*24*3600/tau_m*(1.0+1e-9))
+    early = early[x[early] > zmin]
+    Ltotm[x <= zmin] = 0.0
+    if len(early) == 0:
+        return Ltotm
+    ue = np.log(x[early])
+
+    def integrand(u):
+        z = np.exp(u)
+        return power_break(z*tau_m)*np.exp(z**2)*2*z*z
+
+    # the epochs close the last interval of their own integral
+    fe = integrand(ue)
+    u = np.linspace(np.log(zmin), np.max(ue), nstart+1)
+    fu = integrand(u)
+    magprev = None
+    while True:
+        cumulative = np.concatenate(([0.0], np.cumsum(0.5*(fu[1:]+fu[:-1])*np.diff(u))))
+        k = np.clip(np.searchsorted(u, ue, side='right')-1, 0, len(u)-2)
+        Le = (cumulative[k] + 0.5*(fu[k]+fe)*(ue-u[k]))*np.exp(-np.exp(2*ue))
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            mag = calc_mags(Le/1.0e40, Rphoto[early])[0]
+        if magprev is not None:
+            dmag = np.abs(mag-magprev)
+            if not np.any(dmag[np.isfinite(dmag)] > 0.5*tol):
+                break
+            if len(u)-1 >= nmax:
+                warnings.warn("SmCh2017 Arnett integral did not reach tol=%g with %d intervals" % (tol, nmax))
+                break
+        magprev = mag
+
+        umid = 0.5*(u[1:]+u[:-1])
+        u = np.insert(u, np.arange(1, len(u)), umid)
+        fu = np.insert(fu, np.arange(1, len(fu)), integrand(umid))
+
+    Ltotm[early] = Le
+    return Ltotm
 
 register_model('SmCh2017', KNTable, get_SmCh2017_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','slope_r','kappa_r'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 0.3), 'slope_r': (-5.0, 5.0), 'kappa_r': (1e-1, 1e2)},
+                 batched=False, cost=5e-2)
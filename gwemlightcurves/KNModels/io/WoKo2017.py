@@ -2,8 +2,6 @@
 
 import os, sys
 import numpy as np
-import scipy.interpolate
-from scipy.interpolate import interpolate as interp
 
 from .model import register_model
 from .. import KNTable
@@ -24,110 +22,121 @@ def get_WoKo2017_model(table, **kwargs):
 
     # Log mass ejecta
     table['mej10'] = np.log10(table['mej'])
-    # Initialize lightcurve values in table
-
-    timeseries = np.arange(table['tini'][0], table['tmax'][0]+table['dt'][0], table['dt'][0])
-    table['t'] = [np.zeros(timeseries.size)]
-    table['lbol'] = [np.zeros(timeseries.size)]
-    table['mag'] =  [np.zeros([9, timeseries.size])]
-
-    # calc lightcurve for each sample
-    for isample in range(len(table)):
-        table['t'][isample], table['lbol'][isample], table['mag'][isample] = calc_lc(table['tini'][isample], table['tmax'][isample],
-                                                                     table['dt'][isample], table['mej'][isample],
-                                                                     table['vej'][isample], table['theta_r'][isample], table['kappa'][isample])
+
+    # All samples share one time grid, so evaluate the whole table at once
+    table['t'], table['lbol'], table['mag'] = calc_lc_batch(table['tini'][0], table['tmax'][0], table['dt'][0],
+                                                            table['mej'], table['vej'], table['theta_r'], table['kappa'])
     return table
 
-def calc_lc(tini,tmax,dt,mej,vej,theta_r,kappa_r,model="DZ2"):
+_MODELFILES = {"DZ2": "../data/macronova_models_wollaeger2017/DZ2_mags_2017-03-20.dat",
+               "gamA2": "../data/macronova_models_wollaeger2017/gamA2_mags_2017-03-20.dat",
+               "gamB2": "../data/macronova_models_wollaeger2017/gamB2_mags_2017-03-20.dat"}
 
-    mejconst = [-1.13,-1.01,-0.94,-0.94,-0.93,-0.93,-0.95,-0.99]
-    vejconst = [-1.28,-1.60,-1.52,-1.56,-1.61,-1.61,-1.55,-1.33]
-    kappaconst = [2.65,2.27,2.02,1.87,1.76,1.56,1.33,1.13]
-
-    if model == "DZ2":
-        mej0 = 0.013+0.005
-        vej0 = 0.132+0.08
-        kappa0 = 1.0
-        modelfile = "../data/macronova_models_wollaeger2017/DZ2_mags_2017-03-20.dat"
-    elif model == "gamA2":
-        mej0 = 0.013+0.005
-        vej0 = 0.132+0.08
-        kappa0 = 1.0
-        modelfile = "../data/macronova_models_wollaeger2017/gamA2_mags_2017-03-20.dat"
-    elif model == "gamB2":
-        mej0 = 0.013+0.005
-        vej0 = 0.132+0.08
-        kappa0 = 1.0
-        modelfile = "../data/macronova_models_wollaeger2017/gamB2_mags_2017-03-20.dat"
-
-    data_out = np.loadtxt(modelfile)
-    ndata, nslices = data_out.shape
-    ints = np.arange(0,ndata,ndata/9)
+# model tables are only parsed once per process, see get_model_table
+_MODEL_TABLES = {}
 
-    tvec_days = np.arange(tini,tmax+dt,dt)
-    mAB = np.zeros((len(tvec_days),8))
+def get_model_table(model="DZ2"):
+    """
+.. py:function:: get_model_table(model="DZ2")
 
-    for ii in xrange(len(ints)):
-        idx = np.arange(ndata/9) + ii*(ndata/9)
-        data_out_slice = data_out[idx,:]
+   Load a Wollaeger et al. (2017) table on first use and cache it. The file
+   is split into its 9 slices (lbol, then g r i z y J H K), with lbol kept
+   as log10.
 
-        t = data_out_slice[:,1]
-        data = data_out_slice[:,2:]
-        #idx = np.where((t >= 0) & (t <= 7))[0]
-        #t = t[idx]
-        #data = data[idx,:]
-        nt, nbins = data.shape
+   :return: dictionary with times (9, nt), data (9, nt, nbins) and angular bin centres (nbins,) in degrees
+    """
+
+    if not model in _MODEL_TABLES:
+        data_out = np.loadtxt(_MODELFILES[model])
+        ndata, nslices = data_out.shape
+        data_out = data_out.reshape((9, ndata//9, nslices))
+
+        t = data_out[:,:,1]
+        data = data_out[:,:,2:]
+        data[0] = np.log10(data[0])
+        nt, nbins = data.shape[1:]
 
         a_i = (360/(2*np.pi))*np.arccos(1 - np.arange(nbins)*2/float(nbins))
         b_i = (360/(2*np.pi))*np.arccos(1 - (np.arange(nbins)+1)*2/float(nbins))
         bins = (a_i + b_i)/2.0
 
-        idx = np.argsort(np.abs(bins-theta_r*2*np.pi))
-        idx1 = idx[0]
-        idx2 = idx[1]
-        weight1 = 1/np.abs(bins[idx1]-theta_r*2*np.pi)
-        weight2 = 1/np.abs(bins[idx1]-theta_r*2*np.pi)
-        if not np.isfinite(weight1):
-            weight1, weight2 = 1.0, 0.0
-        elif not np.isfinite(weight2):
-            weight1, weight2 = 0.0, 1.0
-        else:
-            weight1, weight2 = weight1/(weight1+weight2), weight2/(weight1+weight2)
-
-        if ii == 0:
-            #f     = scipy.interpolate.interp2d(bins,t,np.log10(data), kind='cubic')
-            f1 = interp.interp1d(t, np.log10(data[:,idx1]), fill_value='extrapolate')
-            f2 = interp.interp1d(t, np.log10(data[:,idx2]), fill_value='extrapolate')
-        else:
-            #f     = scipy.interpolate.interp2d(bins,t,data, kind='cubic')
-            f1 = interp.interp1d(t,data[:,idx1], fill_value='extrapolate')
-            f2 = interp.interp1d(t,data[:,idx2], fill_value='extrapolate')
-
-        fam1, fam2  = f1(tvec_days), f2(tvec_days)
-        fam = weight1*fam1+weight2*fam2
-
-        if ii == 0:
-            lbol = 10**fam
-        else:
-            mAB[:,int(ii-1)] = np.squeeze(fam + mejconst[int(ii-1)]*np.log10(mej/mej0) + vejconst[int(ii-1)]*np.log10(vej/vej0)) #+ kappaconst[int(ii-1)]*np.log10(kappa_r/kappa0))
+        for arr in (t, data, bins):
+            arr.flags.writeable = False
+        _MODEL_TABLES[model] = {"t": t, "data": data, "bins": bins}
+
+    return _MODEL_TABLES[model]
+
+def calc_lc(tini,tmax,dt,mej,vej,theta_r,kappa_r,model="DZ2"):
+
+    tvec_days, lbol, mAB = calc_lc_batch(tini,tmax,dt,mej,vej,theta_r,kappa_r,model=model)
+
+    return tvec_days[0], lbol[0], mAB[0]
+
+def calc_lc_batch(tini,tmax,dt,mej,vej,theta_r,kappa_r,model="DZ2"):
+    """
+.. py:function:: calc_lc_batch(tini,tmax,dt,mej,vej,theta_r,kappa_r,model="DZ2")
+
+   Version of :py:func:`calc_lc` for N samples at once. The parameters may
+   be scalars or arrays of length N; the times are rescaled per sample.
+
+   :return: times (N, nt), lbol (N, nt) and mag (N, 9, nt)
+    """
+
+    mejconst = np.array([-1.13,-1.01,-0.94,-0.94,-0.93,-0.93,-0.95,-0.99])
+    vejconst = np.array([-1.28,-1.60,-1.52,-1.56,-1.61,-1.61,-1.55,-1.33])
+    kappaconst = np.array([2.65,2.27,2.02,1.87,1.76,1.56,1.33,1.13])
+
+    mej0 = 0.013+0.005
+    vej0 = 0.132+0.08
+    kappa0 = 1.0
+
+    modeltable = get_model_table(model)
+    t, data, bins = modeltable["t"], modeltable["data"], modeltable["bins"]
+    nslices, nt, nbins = data.shape
+
+    mej, vej, theta_r, kappa_r = [np.atleast_1d(np.asarray(x, dtype=float))[:,np.newaxis] for x in (mej,vej,theta_r,kappa_r)]
+    mej, vej, theta_r, kappa_r = np.broadcast_arrays(mej, vej, theta_r, kappa_r)
+    nsamples = mej.shape[0]
+
+    tvec_days = np.arange(tini,tmax+dt,dt)
+
+    # two nearest viewing angle bins of each sample
+    dist = np.abs(bins-theta_r*2*np.pi)
+    idx = np.argsort(dist, axis=1)
+    idx1 = idx[:,0]
+    idx2 = idx[:,1]
+    rows = np.arange(nsamples)
+    with np.errstate(divide='ignore'):
+        weight1 = 1/dist[rows,idx1]
+        weight2 = 1/dist[rows,idx1]
+    exact = ~np.isfinite(weight1)
+    weight1, weight2 = np.where(exact, 1.0, 0.5), np.where(exact, 0.0, 0.5)
+
+    # linear interpolation (and extrapolation) of every slice and bin in time
+    fam = np.empty((nsamples,nslices,len(tvec_days)))
+    for ii in range(nslices):
+        jj = np.clip(np.searchsorted(t[ii], tvec_days), 1, nt-1)
+        fac = ((tvec_days-t[ii,jj-1])/(t[ii,jj]-t[ii,jj-1]))[:,np.newaxis]
+        vals = (1-fac)*data[ii,jj-1] + fac*data[ii,jj]
+        fam[:,ii] = weight1[:,np.newaxis]*vals[:,idx1].T + weight2[:,np.newaxis]*vals[:,idx2].T
+
+    lbol = 10**fam[:,0]
+    mAB = fam[:,1:] + mejconst[:,np.newaxis]*np.log10(mej/mej0)[:,:,np.newaxis] + vejconst[:,np.newaxis]*np.log10(vej/vej0)[:,:,np.newaxis] #+ kappaconst[:,np.newaxis]*np.log10(kappa_r/kappa0)[:,:,np.newaxis]
 
     tmax = (kappa_r/10)**0.35 * (mej/10**-2)**0.318 * (vej/0.1)**-0.60
     Lmax = 2.8*10**40 * (kappa_r/10)**-0.60 * (mej/10**-2)**0.426 * (vej/0.1)**0.776
 
-    tvec_days = tvec_days*tmax/tvec_days[np.argmax(lbol)]
-    lbol = lbol*Lmax/np.max(lbol)
-
-    wavelengths = [4775.6, 6129.5, 7484.6, 8657.8, 9603.1, 12350, 16620, 21590]
-    wavelength_interp = 3543
+    tvec_days = tvec_days*tmax/tvec_days[np.argmax(lbol,axis=1)][:,np.newaxis]
+    lbol = lbol*Lmax/np.max(lbol,axis=1)[:,np.newaxis]
 
-    mAB_y = np.zeros(tvec_days.shape)
-    for ii in xrange(len(tvec_days)):
-        mAB_y[ii] = np.interp(wavelength_interp,wavelengths,mAB[ii,:])
-    mAB_new = np.zeros((len(tvec_days),9))
-    mAB_new[:,0] = np.squeeze(mAB_y)
+    # u band at 3543 lies blueward of g (4775.6), where np.interp holds g constant
+    mAB_new = np.zeros((nsamples,9,len(tvec_days[0])))
+    mAB_new[:,0] = mAB[:,0]
     mAB_new[:,1:] = mAB
 
-    return np.squeeze(tvec_days), np.squeeze(lbol), mAB_new.T
+    return tvec_days, lbol, mAB_new
 
 register_model('WoKo2017', KNTable, get_WoKo2017_model,
-                 usage="table")
+                 usage="table", parameters=['mej','vej','theta_r','kappa'],
+                 bounds={'mej': (1e-5, 1.0), 'vej': (0.0, 0.3), 'theta_r': (0.0, 180.0), 'kappa': (1e-1, 1e2)},
+                 batched=True, cost=1e-3)
@@ -27,12 +27,17 @@ from astropy.io.registry import IORegistryError
 from astropy.table import Table
 
 _MODELS = {}
+_MODEL_INFO = {}
+
+# photometric bands of the ``mag`` column, in row order
+BANDS = ("u", "g", "r", "i", "z", "y", "J", "H", "K")
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
 
 def register_model(data_format, data_class, function, force=False,
-                     usage=None):
+                     usage=None, parameters=None, bounds=None, bands=BANDS,
+                     batched=False, cost=None):
     """Register a new method to EventTable.model() for a given format
 
     Parameters
@@ -49,10 +54,33 @@ def register_model(data_format, data_class, function, force=False,
     force : `bool`, optional
         overwrite existing registration for ``data_format`` if found,
         default: `False`
+
+    parameters : `list` of `str`, optional
+        table columns the model is evaluated from
+
+    bounds : `dict`, optional
+        ``(min, max)`` of each parameter that the model is valid for
+
+    bands : `tuple` of `str`, optional
+        photometric bands of the ``mag`` column, default: ugrizyJHK
+
+    batched : `bool`, optional
+        whether all rows of a table are evaluated in one vectorized call,
+        default: `False`
+
+    cost : `float`, optional
+        rough wall time in seconds to evaluate one row
     """
     key = (data_format, data_class)
     if key not in _MODELS or force:
         _MODELS[key] = (function, usage)
+        _MODEL_INFO[key] = {
+            'parameters': list(parameters or []),
+            'bounds': dict(bounds or {}),
+            'bands': tuple(bands or ()),
+            'batched': bool(batched),
+            'cost': cost,
+        }
     else:
         raise IORegistryError("Fetcher for format '{0}' and class '{1}' "
                               "has already been " "defined".format(
@@ -85,6 +113,63 @@ def get_model(data_format, data_class):
                               % (data_format, formats))
 
 
+def get_model_info(data_format, data_class):
+    """Return the capabilities registered for the given format
+
+    Parameters
+    ----------
+    data_format : `str`
+        name of the format
+
+    data_class : `type`
+        the class that the model returns
+
+    Returns
+    -------
+    info : `dict`
+        with keys ``parameters``, ``bounds``, ``bands``, ``batched`` and
+        ``cost``
+
+    Raises
+    ------
+    astropy.io.registry.IORegistryError
+        if not registration is found matching ``data_format``
+    """
+    get_model(data_format, data_class)
+    info = _MODEL_INFO[(data_format, data_class)]
+    return dict(info, parameters=list(info['parameters']),
+                bounds=dict(info['bounds']))
+
+
+def list_models(data_class, **criteria):
+    """List the formats registered for ``data_class``
+
+    Keyword arguments filter on the registered capabilities, e.g.
+    ``list_models(KNTable, batched=True)``.
+    """
+    formats = []
+    for (fmt, cls) in sorted(_MODELS, key=lambda x: x[0]):
+        if cls is not data_class:
+            continue
+        info = _MODEL_INFO[(fmt, cls)]
+        if all(info.get(key) == val for key, val in criteria.items()):
+            formats.append(fmt)
+    return formats
+
+
+def get_chunk_size(data_format, data_class, target=1.0, maxsize=10000):
+    """Number of rows to hand to one model call
+
+    Batched models get as many rows as fit in roughly ``target`` seconds
+    (bounded by ``maxsize``), unbatched models or models without a cost
+    estimate one row at a time.
+    """
+    info = get_model_info(data_format, data_class)
+    if not info['batched'] or not info['cost']:
+        return 1
+    return int(max(1, min(maxsize, target/info['cost'])))
+
+
 def _update__doc__(data_class):
     header = "The available named formats are:"
     model = data_class.model
@@ -19,13 +19,15 @@
 """
 
 import os
+from collections import OrderedDict
+
 import numpy as np
 
 from astropy.table import (Table, Column, vstack)
 from distutils.spawn import find_executable
 
 __author__ = 'Scott Coughlin <scott.coughlin@ligo.org>'
-__all__ = ['KNTable', 'tidal_lambda_from_tilde', 'CLove', 'EOSfit', 'get_eos_list', 'get_lalsim_eos', 'construct_eos_from_polytrope']
+__all__ = ['KNTable', 'tidal_lambda_from_tilde', 'CLove', 'EOSfit', 'get_eos_list', 'get_eos_interpolator', 'read_samples_table', 'iter_samples_table', 'get_lalsim_eos', 'construct_eos_from_polytrope']
 
 
 def tidal_lambda_from_tilde(mass1, mass2, lam_til, dlam_til):
@@ -110,11 +112,248 @@ def get_eos_list(TOV):
 		EOS_List=[file_name[:-14] for file_name in os.listdir(path) if file_name.endswith("lalsim_mr.dat")]
 	return EOS_List
 
+# columns of the mass-radius tables of each set of TOV solvers
+_EOS_TABLE_COLUMNS = {
+	'Monica': ('_mr.dat', 'mass', {'radius': 'radius', 'mb': 'mb', 'rho_c': 'rho_c'}),
+	'Wolfgang': ('.tidal.seq', 'grav_mass', {'radius': 'Circumferential_radius', 'mb': 'baryonic_mass'}),
+	'lalsim': ('_lalsim_mr.dat', 'mass', {'radius': 'radius'}),
+}
+
+# interpolators are built once per (EOS, TOV, quantity), see get_eos_interpolator
+_EOS_INTERPOLATORS = {}
+
+def get_eos_interpolator(EOS, TOV, quantity, log=False):
+	"""
+	Cached monotone cubic interpolator of an EOS table quantity
+	('radius', 'mb' or 'rho_c', optionally as log10) against the
+	gravitational mass, in the units of the table
+	"""
+	key = (EOS, TOV, quantity, log)
+	if key not in _EOS_INTERPOLATORS:
+		import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
+		suffix, masscol, columns = _EOS_TABLE_COLUMNS[TOV]
+		MassRadiusBaryMassTable = Table.read(find_executable(EOS + suffix), format='ascii')
+		values = np.array(MassRadiusBaryMassTable[columns[quantity]])
+		if log:
+			values = np.log10(values)
+		_EOS_INTERPOLATORS[key] = et.TableInterpolator(MassRadiusBaryMassTable[masscol], values)
+	return _EOS_INTERPOLATORS[key]
+
+def _is_number(value):
+	try:
+		float(value)
+	except ValueError:
+		return False
+	return True
+
+def _read_header(filename):
+	"""
+	Column names of an ascii table and the number of lines up to them:
+	the first non-comment line, or the last comment line before it
+	("# m1 m2 ...") when that line already holds numbers
+	"""
+	commented = None
+	with open(filename) as fid:
+		for ii, line in enumerate(fid):
+			if not line.strip():
+				continue
+			if line.startswith('#'):
+				commented = line.lstrip('#').split()
+				continue
+			if commented is not None and any(_is_number(value) for value in line.split()):
+				return commented, ii
+			return line.split(), ii+1
+	return [], 0
+
+def _posterior_samples_path(filename_samples):
+	"""
+	Path of the first posterior_samples dataset of an HDF5 file
+	"""
+	import h5py
+	paths = []
+	with h5py.File(filename_samples, 'r') as fid:
+		fid.visititems(lambda name, obj: paths.append(name) if name.split('/')[-1] == 'posterior_samples' and isinstance(obj, h5py.Dataset) else None)
+	if len(paths) == 0:
+		raise ValueError("No posterior_samples dataset in %s" % filename_samples)
+	return paths[0]
+
+def _samples_colnames(filename_samples):
+	"""
+	Column names of a table of samples, without reading its rows
+	"""
+	if os.path.splitext(filename_samples)[1] in ['.h5', '.hdf5']:
+		import h5py
+		with h5py.File(filename_samples, 'r') as fid:
+			return list(fid[_posterior_samples_path(filename_samples)].dtype.names)
+	return _read_header(filename_samples)[0]
+
+def read_samples_table(filename_samples, names=None, columns=None, cache=False):
+	"""
+	Read a table of samples, keeping only the requested columns
+
+	Numeric ascii files are parsed by the numpy C reader, reading only the
+	requested columns (the header names the columns unless names is given),
+	others fall back to astropy. HDF5 files (.h5/.hdf5, requires h5py)
+	are read from their first posterior_samples dataset. With cache=True
+	the parsed columns are stored in a binary sidecar, written atomically
+	and reused while it is newer than the samples file: all columns go to
+	<filename_samples>.cache.npy, which also serves reads of some columns,
+	and a selection of columns to <filename_samples>.<hash>.cache.npy.
+	"""
+	import tempfile
+	import hashlib
+
+	full_sidecar = filename_samples + '.cache.npy'
+	if columns is None:
+		sidecar = full_sidecar
+		sidecars = [full_sidecar]
+	else:
+		digest = hashlib.sha1(','.join(columns).encode()).hexdigest()[:16]
+		sidecar = '%s.%s.cache.npy' % (filename_samples, digest)
+		sidecars = [full_sidecar, sidecar]
+	if cache:
+		for cached in sidecars:
+			if os.path.isfile(cached) and os.path.getmtime(cached) >= os.path.getmtime(filename_samples):
+				data_out = Table(np.load(cached, allow_pickle=False))
+				if columns is None:
+					return data_out
+				if all(column in data_out.colnames for column in columns):
+					return data_out[list(columns)]
+
+	if os.path.splitext(filename_samples)[1] in ['.h5', '.hdf5']:
+		data_out = Table.read(filename_samples, format='hdf5', path=_posterior_samples_path(filename_samples))
+		if columns is not None:
+			data_out = data_out[list(columns)]
+	else:
+		if names is None:
+			names, skiprows = _read_header(filename_samples)
+		else:
+			names, skiprows = list(names), 0
+		if columns is None:
+			columns = names
+		try:
+			# all-numeric tables go through the numpy C parser, reading only the wanted columns
+			usecols = [names.index(column) for column in columns]
+			data = np.loadtxt(filename_samples, skiprows=skiprows, usecols=usecols, ndmin=2)
+			data_out = Table(list(data.T), names=list(columns))
+		except ValueError:
+			# mixed or irregular files go through the astropy readers
+			with open(filename_samples) as fid:
+				data_lines = fid.readlines()[skiprows:]
+			data_out = Table.read(data_lines, format='ascii.no_header', names=names)
+			data_out = data_out[list(columns)]
+
+	if cache:
+		fd, tmp_fname = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(filename_samples)))
+		try:
+			with os.fdopen(fd, 'wb') as fid:
+				np.save(fid, data_out.as_array(), allow_pickle=False)
+			os.rename(tmp_fname, sidecar)
+		except:
+			if os.path.exists(tmp_fname):
+				os.remove(tmp_fname)
+			raise
+
+	return data_out
+
+def iter_samples_table(filename_samples, chunksize=100000, names=None, columns=None):
+	"""
+	Iterate over a numeric ascii table of samples in chunks of chunksize
+	rows, keeping only the requested columns
+	"""
+	import itertools
+
+	if names is None:
+		names, skiprows = _read_header(filename_samples)
+	else:
+		skiprows = 0
+	names = list(names)
+
+	with open(filename_samples) as fid:
+		lines = itertools.islice(fid, skiprows, None)
+		lines = (line for line in lines if line.strip() and not line.startswith('#'))
+		if columns is None:
+			columns = names
+		usecols = [names.index(column) for column in columns]
+		while True:
+			chunk = list(itertools.islice(lines, chunksize))
+			if len(chunk) == 0:
+				break
+			data = np.loadtxt(chunk, usecols=usecols, ndmin=2)
+			yield Table(list(data.T), names=list(columns))
+
+# columns KNTable.read_samples sets from others (source-frame masses and
+# tidal parameters) when the samples have them
+_SAMPLE_ALIASES = OrderedDict([
+	('m1', 'm1_source'),
+	('m2', 'm2_source'),
+	('dlambdat', 'dlam_tilde'),
+	('lambdat', 'lam_tilde'),
+])
+
+def _get_rng(seed):
+	"""
+	Random number generator for seed: the global numpy RNG for None,
+	a RandomState for an integer and seed itself for a RandomState or
+	Generator
+	"""
+	if seed is None:
+		return np.random
+	if isinstance(seed, (int, np.integer)):
+		return np.random.RandomState(seed)
+	return seed
+
+def _get_weights(table, weights):
+	"""
+	Sample weights from a column name, an array or None (equal weights)
+	"""
+	if weights is None:
+		return np.ones(len(table))
+	if isinstance(weights, str):
+		weights = table[weights]
+	weights = np.asarray(weights, dtype=float)
+	if np.any(weights < 0) or len(weights) != len(table):
+		raise ValueError("weights must be non-negative, one per sample")
+	return weights
+
+def _sampling_keys(weights, rng):
+	"""
+	Efraimidis-Spirakis keys log(u)/w: the rows with the largest keys are a
+	weighted sample without replacement, rows with zero weight get -inf
+	"""
+	u = rng.uniform(size=len(weights))
+	with np.errstate(divide='ignore'):
+		return np.where(weights > 0, np.log(u) / weights, -np.inf)
+
+def _weighted_choice(weights, Nsamples, rng):
+	"""
+	Indices of Nsamples rows drawn without replacement with probability
+	proportional to weights
+	"""
+	keys = _sampling_keys(weights, rng)
+	idx = np.argsort(-keys, kind='mergesort')[:Nsamples]
+	return idx[np.isfinite(keys[idx])]
+
+def _eos_ensemble_member(job):
+	"""
+	One EOS of KNTable.calc_eos_ensemble, at module level so that it can
+	be sent to worker processes
+	"""
+	samples, EOS, TOV, ejecta, model, model_kwargs = job
+	samples = samples.calc_radius(EOS=EOS, TOV=TOV)
+	samples = samples.calc_compactness(fit=False)
+	if ejecta in ['DiUj2017', 'KaKy2016']:
+		samples = samples.calc_baryonic_mass(EOS=EOS, TOV=TOV)
+	samples = samples.calc_ejecta(ejecta=ejecta)
+	if model is not None:
+		samples = KNTable.model(model, samples, **model_kwargs)
+	samples['eos'] = [EOS] * len(samples)
+	return samples
+
 def construct_eos_from_polytrope(eos_name):
 	"""
 	Uses lalsimulation to read polytrope parameters from table
 	"""
-	import lalsimulation as lalsim
 	from astropy.io import ascii
 	polytrope_table=np.genfromtxt(find_executable('polytrope_table.dat'), dtype=("|S10", '<f8','<f8','<f8','<f8'), names=True)
   
@@ -126,10 +365,11 @@ def construct_eos_from_polytrope(eos_name):
 	for i in range(0, len(polytrope_table['logP1'])):
 		polytrope_table['logP1'][i]=np.log10(10**(polytrope_table['logP1'][i])*0.1)
 
-	eos_indx=np.where(polytrope_table['eos']==eos)[0][0]
+	eos_indx=np.where(polytrope_table['eos']==eos_name.lower())[0][0]
 
-	eos=lalsim.SimNeutronStarEOS4ParameterPiecewisePolytrope(polytrope_table['logP1'][eos_indx], polytrope_table['gamma1'][eos_indx], polytrope_table['gamma2'][eos_indx], polytrope_table['gamma3'][eos_indx])
-	fam=lalsim.CreateSimNeutronStarFamily(eos)
+	# families are built once per set of polytrope parameters
+	from gwemlightcurves.EOS.EOSFamily import polytrope_family
+	eos, fam = polytrope_family(polytrope_table['logP1'][eos_indx], polytrope_table['gamma1'][eos_indx], polytrope_table['gamma2'][eos_indx], polytrope_table['gamma3'][eos_indx])
 
 	return eos, fam
 
@@ -137,13 +377,14 @@ def construct_eos_from_polytrope(eos_name):
 def get_lalsim_eos(eos_name):
 	"""
 	EOS tables described by Ozel `here <https://arxiv.org/pdf/1603.02698.pdf>`_ and downloadable `here <http://xtreme.as.arizona.edu/NeutronStars/data/eos_tables.tar>`_. LALSim utilizes this tables, but needs some interfacing (i.e. conversion to SI units, and conversion from non monotonic to monotonic pressure density tables)
+
+	Converted tables are written once under gwemlightcurves.EOS.EOSFamily.get_eos_cache_dir() (set GWEMLIGHTCURVES_CACHE to move it), named by the hash of their content, and families are reused within a process.
 	"""
 	import os
 	import lalsimulation
 	import lal
 	obs_max_mass = 2.01 - 0.04
 	print("Checking %s" % eos_name)
-	eos_fname = ""
 	if os.path.exists(eos_name):
 		# NOTE: Adapted from code by Monica Rizzo
 		print("Loading from %s" % eos_name)
@@ -166,15 +407,13 @@ def get_lalsim_eos(eos_name):
 			edens = edens[keep_idx]
 		assert np.all(np.diff(edens) > 0)
 
-		print("Dumping to %s" % eos_fname)
-		eos_fname = "./." + eos_name + ".dat"
-		np.savetxt(eos_fname, np.transpose((press, edens)), delimiter='\t')
-		eos = lalsimulation.SimNeutronStarEOSFromFile(eos_fname)
-		fam = lalsimulation.CreateSimNeutronStarFamily(eos)
+		# the converted table is cached under its content hash and its family reused
+		from gwemlightcurves.EOS.EOSFamily import tabulated_family
+		eos, fam = tabulated_family(press, edens)
 
 	else:
-		eos = lalsimulation.SimNeutronStarEOSByName(eos_name)
-		fam = lalsimulation.CreateSimNeutronStarFamily(eos)
+		from gwemlightcurves.EOS.EOSFamily import named_family
+		eos, fam = named_family(eos_name)
 
 	mmass = lalsimulation.SimNeutronStarMaximumMass(fam) / lal.MSUN_SI
 	print("Family %s, maximum mass: %1.2f" % (eos_name, mmass))
@@ -196,41 +435,50 @@ class KNTable(Table):
 	"""
 	# -- i/o ------------------------------------
 	@classmethod
-	def read_samples(cls, filename_samples):
+	def read_samples(cls, filename_samples, columns=None, cache=False):
 		"""
 		Read LALinference posterior_samples
+
+		columns restricts the read to those columns and cache keeps a
+		binary sidecar of them, see read_samples_table
 		"""
 		import os
 		if not os.path.isfile(filename_samples):
 			raise ValueError("Sample file supplied does not exist")
 
-		data_out = Table.read(filename_samples, format='ascii')
-
-		if 'm1_source' in list(data_out.columns):
-			data_out['m1'] = data_out['m1_source']
-			print('setting m1 to m1_source')
-		if 'm2_source' in list(data_out.columns):
-			data_out['m2'] = data_out['m2_source']
-			print('setting m2 to m2_source')
-
-		if 'dlam_tilde' in list(data_out.columns):
-			data_out['dlambdat'] = data_out['dlam_tilde']
-			print('setting dlambdat to dlam_tilde')
-		if 'lam_tilde' in list(data_out.columns):
-			data_out['lambdat'] = data_out['lam_tilde']
-			print('setting lambdat to lam_tilde')
+		if columns is None:
+			data_out = read_samples_table(filename_samples, cache=cache)
+		else:
+			# read the columns the requested ones are set from instead
+			colnames = _samples_colnames(filename_samples)
+			read_columns = []
+			for column in columns:
+				source = _SAMPLE_ALIASES.get(column)
+				if source in colnames:
+					column = source
+				if column not in read_columns:
+					read_columns.append(column)
+			data_out = read_samples_table(filename_samples, columns=read_columns, cache=cache)
+
+		for column, source in _SAMPLE_ALIASES.items():
+			if source in list(data_out.columns):
+				data_out[column] = data_out[source]
+				print('setting %s to %s' % (column, source))
+
+		if columns is not None:
+			data_out = data_out[list(columns)]
 
 		return KNTable(data_out)
 
 	@classmethod
-	def read_cbc_list(cls, filename_samples):
+	def read_cbc_list(cls, filename_samples, cache=False):
 		"""
 		Read CBC list
 		"""
 		if not os.path.isfile(filename_samples):
 			raise ValueError("Sample file supplied does not exist")
 
-		data_out = Table.read(filename_samples, format='ascii',
+		data_out = read_samples_table(filename_samples, cache=cache,
 				      names = ("idx","type","t0","tc","m1",
 				               "m2","Xi1",
 				               "Xi2","z","dist","ra",
@@ -258,7 +506,7 @@ class KNTable(Table):
 		return KNTable(data_out)
 
 	@classmethod
-	def read_multinest_samples(cls, filename_samples, model):
+	def read_multinest_samples(cls, filename_samples, model, cache=False):
 		"""
 		Read LALinference posterior_samples
 		"""
@@ -277,7 +525,7 @@ class KNTable(Table):
 		else:
 			print("Model not implemented...")
 			exit(0)
-		data_out = Table.read(filename_samples, format='ascii', names = names)
+		data_out = read_samples_table(filename_samples, names=names, cache=cache)
 		if model == "Ka2017":
 			data_out['mej'] = 10**data_out['mej']
 			data_out['Xlan'] = 10**data_out['Xlan']
@@ -328,7 +576,7 @@ class KNTable(Table):
 		except:
 			import astropy.units as u
 			import astropy.constants as C
-			G = lal.G_SI; c = C.c.value; msun = u.M_sun.to(u.kg)
+			G = C.G.value; c = C.c.value; msun = u.M_sun.to(u.kg)
 
 		if fit:
 			print 'You have chose to calculate compactness from fit.'
@@ -366,24 +614,10 @@ class KNTable(Table):
 							'and therefore cannot '
 							'calculate the Baryonic mass.')
 
-		if TOV == 'Monica':
-			import gwemlightcurves.EOS.TOV.Monica.MonotonicSpline as ms
-			import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
-			MassRadiusBaryMassTable = Table.read(find_executable(EOS + '_mr.dat'), format='ascii')
-			baryonic_mass_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['mb'])
-			# after obtaining the baryonic_mass_of_mass constants we now can either take values directly from table or use pre calculated spline to extrapolate the values
-			self['mb1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['mb'], baryonic_mass_of_mass_const)
-			self['mb2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['mb'], baryonic_mass_of_mass_const)
-
-		if TOV == 'Wolfgang':
-
-			import gwemlightcurves.EOS.TOV.Monica.MonotonicSpline as ms
-			import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
-			MassRadiusBaryMassTable = Table.read(find_executable(EOS + '.tidal.seq'), format='ascii')
-			baryonic_mass_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['baryonic_mass'])
-			# after obtaining the baryonic_mass_of_mass constants we now can either take values directly from table or use pre calculated spline to extrapolate the values
-			self['mb1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['baryonic_mass'], baryonic_mass_of_mass_const)
-			self['mb2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['baryonic_mass'], baryonic_mass_of_mass_const)
+		# the monotone spline of each EOS is built once and evaluated on all masses at once
+		baryonic_mass_of_mass = get_eos_interpolator(EOS, TOV, 'mb')
+		self['mb1'] = baryonic_mass_of_mass(self['m1'])
+		self['mb2'] = baryonic_mass_of_mass(self['m2'])
 
 		return self
 
@@ -405,20 +639,13 @@ class KNTable(Table):
 
 		if TOV == 'Monica':
 
-			import gwemlightcurves.EOS.TOV.Monica.MonotonicSpline as ms
-			import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
-			MassRadiusBaryMassTable = Table.read(find_executable(EOS + '_mr.dat'), format='ascii')
-			radius_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'])
-			# after obtaining the radius_of_mass constants we now can either take values directly from table or use pre calculated spline to extrapolate the values
-			# also radius is in km in table. need to convert to SI (i.e. meters)
-			self['r1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
-			self['r2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
+			# radius is in km in table. need to convert to SI (i.e. meters)
+			radius_of_mass = get_eos_interpolator(EOS, TOV, 'radius')
+			self['r1'] = radius_of_mass(self['m1'])*10**3
+			self['r2'] = radius_of_mass(self['m2'])*10**3
 
 		elif TOV == 'Wolfgang':
 
-			import gwemlightcurves.EOS.TOV.Monica.MonotonicSpline as ms
-			import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
-
 			try:
 				import lal
 				G = lal.G_SI; c = lal.C_SI; msun = lal.MSUN_SI
@@ -427,34 +654,30 @@ class KNTable(Table):
 				import astropy.constants as C
 				G = C.G.value; c = C.c.value; msun = u.M_sun.to(u.kg)
 
-			MassRadiusBaryMassTable = Table.read(find_executable(EOS + '.tidal.seq'), format='ascii')
-			radius_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['Circumferential_radius'])
+			radius_of_mass = get_eos_interpolator(EOS, TOV, 'radius')
 			unit_conversion = (msun * G / c**2)
-			self['r1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['Circumferential_radius'], radius_of_mass_const) * unit_conversion
-			self['r2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['grav_mass'], MassRadiusBaryMassTable['Circumferential_radius'], radius_of_mass_const) * unit_conversion
+			self['r1'] = radius_of_mass(self['m1']) * unit_conversion
+			self['r2'] = radius_of_mass(self['m2']) * unit_conversion
 
 		elif TOV == 'lalsim':
-			import lalsimulation as lalsim
 			if polytrope==True:
-				try:
-					import lal
-					G = lal.G_SI; c = lal.C_SI; msun = lal.MSUN_SI
-				except:
-					import astropy.units as u
-					import astropy.constants as C
-					G = C.G.value; c = C.c.value; msun = u.M_sun.to(u.kg)
+				from gwemlightcurves.EOS.EOSFamily import get_family_table
 
+				# R(M) of the family is tabulated once and interpolated for all samples
+				# radius is in km in table. need to convert to SI (i.e. meters)
+				# masses outside the family have no radius
 				ns_eos, eos_fam=construct_eos_from_polytrope(EOS)
-				self['r1']=lalsim.SimNeutronStarRadius(self['m1']*msun, eos_fam)
-				self['r2']=lalsim.SimNeutronStarRadius(self['m2']*msun, eos_fam)
+				fam_table = get_family_table(eos_fam)
+				r1 = fam_table.radiusofm(self['m1'])
+				r2 = fam_table.radiusofm(self['m2'])
+				self['r1'] = np.where(r1 < 0, np.nan, r1)*10**3
+				self['r2'] = np.where(r2 < 0, np.nan, r2)*10**3
 
 			else:
-				MassRadiusBaryMassTable = Table.read(find_executable(EOS + '_lalsim_mr.dat'), format='ascii')
-				radius_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'])
-				# after obtaining the radius_of_mass constants we now can either take values directly from table or use pre calculated spline to extrapolate the values
-				# also radius is in km in table. need to convert to SI (i.e. meters)
-				self['r1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
-				self['r2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
+				# radius is in km in table. need to convert to SI (i.e. meters)
+				radius_of_mass = get_eos_interpolator(EOS, TOV, 'radius')
+				self['r1'] = radius_of_mass(self['m1'])*10**3
+				self['r2'] = radius_of_mass(self['m2'])*10**3
 
 		return self
 
@@ -474,32 +697,146 @@ class KNTable(Table):
 
 		if TOV == 'Monica':
 
-			import gwemlightcurves.EOS.TOV.Monica.MonotonicSpline as ms
-			import gwemlightcurves.EOS.TOV.Monica.eos_tools as et
-			import numpy as np
-			MassRadiusBaryMassTable = Table.read(find_executable(EOS + '_mr.dat'), format='ascii')
-
-			radius_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'])
-			energy_density_of_mass_const = ms.interpolate(MassRadiusBaryMassTable['mass'],	np.log10(MassRadiusBaryMassTable['rho_c']))
-
-			# after obtaining the radius_of_mass constants we now can either take values directly from table or use pre calculated spline to extrapolate the values
-			# also radius is in km in table. need to convert to SI (i.e. meters)
-			self['r1'] = et.values_from_table(self['m1'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
-			self['r2'] = et.values_from_table(self['m2'], MassRadiusBaryMassTable['mass'], MassRadiusBaryMassTable['radius'], radius_of_mass_const)*10**3
-			self['eps01'] = 10**(et.values_from_table(self['m1'], MassRadiusBaryMassTable['mass'], np.log10(MassRadiusBaryMassTable['rho_c']), energy_density_of_mass_const))
-			self['eps02'] = 10**(et.values_from_table(self['m2'], MassRadiusBaryMassTable['mass'], np.log10(MassRadiusBaryMassTable['rho_c']), energy_density_of_mass_const))
-   
+			# radius is in km in table. need to convert to SI (i.e. meters)
+			radius_of_mass = get_eos_interpolator(EOS, TOV, 'radius')
+			log_energy_density_of_mass = get_eos_interpolator(EOS, TOV, 'rho_c', log=True)
+			self['r1'] = radius_of_mass(self['m1'])*10**3
+			self['r2'] = radius_of_mass(self['m2'])*10**3
+			self['eps01'] = 10**log_energy_density_of_mass(self['m1'])
+			self['eps02'] = 10**log_energy_density_of_mass(self['m2'])
+
 		return self
 
-	def downsample(self, Nsamples=100):
+	def calc_ejecta(self, ejecta='Di2018'):
+		"""
+		ejecta mass and velocity from the fits of gwemlightcurves.EjectaFits,
+		from the compactness (and baryonic mass for DiUj2017 and KaKy2016,
+		which also needs the q and chi_eff columns)
+		"""
+		if ejecta in ['Di2018', 'Di2018b']:
+			if ejecta == 'Di2018':
+				from gwemlightcurves.EjectaFits.Di2018 import calc_meje, calc_vej
+			else:
+				from gwemlightcurves.EjectaFits.Di2018b import calc_meje, calc_vej
+			self['mej'] = calc_meje(self['m1'], self['c1'], self['m2'], self['c2'])
+			self['vej'] = calc_vej(self['m1'], self['c1'], self['m2'], self['c2'])
+		elif ejecta == 'DiUj2017':
+			from gwemlightcurves.EjectaFits.DiUj2017 import calc_meje, calc_vej
+			self['mej'] = calc_meje(self['m1'], self['mb1'], self['c1'], self['m2'], self['mb2'], self['c2'])
+			self['vej'] = calc_vej(self['m1'], self['c1'], self['m2'], self['c2'])
+		elif ejecta == 'KaKy2016':
+			from gwemlightcurves.EjectaFits.KaKy2016 import calc_meje, calc_vave
+			self['mej'] = calc_meje(self['q'], self['chi_eff'], self['c2'], self['mb2'], self['m2'])
+			self['vej'] = calc_vave(self['q'])
+		else:
+			raise ValueError('Ejecta fit %s not implemented' % ejecta)
+		return self
+
+	def calc_eos_ensemble(self, EOS='all', TOV='Monica', ejecta='Di2018', model=None, nprocs=1, **model_kwargs):
+		"""
+		Evaluates every sample for every EOS in one call: radius,
+		compactness, baryonic mass and ejecta (see calc_ejecta) and, if
+		model is given, the lightcurves of KNTable.model(model, ...,
+		**model_kwargs). EOS is a list of names or 'all' (get_eos_list(TOV)).
+		The EOSs are processed by nprocs processes and the result is a
+		single table indexed by its eos column.
+		"""
+		if EOS == 'all':
+			EOS = get_eos_list(TOV)
+
+		jobs = [(KNTable(self, copy=True), eos, TOV, ejecta, model, model_kwargs) for eos in EOS]
+		if nprocs > 1:
+			import multiprocessing
+			pool = multiprocessing.Pool(processes=min(nprocs, len(jobs)))
+			try:
+				tables = pool.map(_eos_ensemble_member, jobs)
+			finally:
+				pool.close()
+				pool.join()
+		else:
+			tables = [_eos_ensemble_member(job) for job in jobs]
+
+		tables = [table for table in tables if len(table) > 0]
+		if len(tables) == 0:
+			return KNTable()
+		ensemble = KNTable(vstack(tables, metadata_conflicts='silent'))
+		ensemble.add_index('eos')
+		return ensemble
+
+	def downsample(self, Nsamples=100, seed=None, weights=None, stratify=None, bins=10):
 		"""
 		randomly down samples the number os posterior samples used for calculating lightcurves
 		plotting etc
+
+		seed (int, np.random.RandomState or np.random.Generator) makes the
+		subset reproducible, the global numpy RNG is used otherwise.
+		weights (column name or array) draws without replacement with
+		probability proportional to the weights. stratify (column name)
+		splits the samples into bins (number of quantile bins or bin edges)
+		of that column and draws from each in proportion to its size (or
+		total weight).
 		"""
 		print('You are requesting to downsample the number of posterior samples to {0}'.format(Nsamples))
-		idx = np.random.permutation(len(self))
-		idx = idx[:Nsamples]
-		return self[idx]
+		rng = _get_rng(seed)
+		if weights is None and stratify is None:
+			idx = rng.permutation(len(self))
+			idx = idx[:Nsamples]
+			return self[idx]
+
+		weights = _get_weights(self, weights)
+		if stratify is None:
+			idx = _weighted_choice(weights, Nsamples, rng)
+			return self[idx[rng.permutation(len(idx))]]
+
+		values = np.asarray(self[stratify], dtype=float)
+		if np.isscalar(bins):
+			bins = np.quantile(values, np.linspace(0.0, 1.0, int(bins)+1))
+		strata = np.clip(np.searchsorted(bins, values, side='right') - 1, 0, len(bins)-2)
+		totals = np.bincount(strata, weights=weights, minlength=len(bins)-1)
+		sizes = np.bincount(strata[weights > 0], minlength=len(bins)-1)
+
+		# largest remainder allocation of the samples to the strata
+		Nsamples = min(Nsamples, np.sum(sizes))
+		quota = Nsamples * totals / np.sum(totals)
+		nstrata = np.minimum(np.floor(quota).astype(int), sizes)
+		for ii in np.argsort(nstrata - quota):
+			if np.sum(nstrata) >= Nsamples:
+				break
+			if nstrata[ii] < sizes[ii]:
+				nstrata[ii] += 1
+
+		idx = []
+		for ii, n in enumerate(nstrata):
+			members = np.where(strata == ii)[0]
+			idx.append(members[_weighted_choice(weights[members], n, rng)])
+		idx = np.concatenate(idx)
+		return self[idx[rng.permutation(len(idx))]]
+
+	@classmethod
+	def reservoir_downsample(cls, chunks, Nsamples=100, seed=None, weights=None):
+		"""
+		Down samples a stream of tables (e.g. iter_samples_table) to Nsamples
+		rows without holding more than one chunk and the reservoir in
+		memory. With weights (column name) rows are kept with probability
+		proportional to their weight, without replacement; the result has
+		the same distribution as downsample on the full table.
+		"""
+		rng = _get_rng(seed)
+		reservoir, keys = None, np.array([])
+		for chunk in chunks:
+			chunk_keys = _sampling_keys(_get_weights(chunk, weights), rng)
+			if reservoir is None:
+				reservoir = Table(chunk)
+			else:
+				reservoir = vstack([reservoir, Table(chunk)])
+			keys = np.concatenate((keys, chunk_keys))
+			# keep the Nsamples largest keys, see _weighted_choice
+			keep = np.argsort(-keys, kind='mergesort')[:Nsamples]
+			keep = keep[np.isfinite(keys[keep])]
+			reservoir, keys = reservoir[keep], keys[keep]
+		if reservoir is None:
+			return KNTable()
+		return KNTable(reservoir[rng.permutation(len(reservoir))])
 
 	@classmethod
 	def plot_mag_panels(cls, table_dict, distance, filts=["g","r","i","z","y","J","H","K"],  magidxs=[0,1,2,3,4,5,6,7,8], figsize=(20, 28)):
@@ -652,3 +989,28 @@ class KNTable(Table):
 		from .io.model import get_model
 		model = get_model(format_, cls)
 		return model(*args, **kwargs)
+
+	@classmethod
+	def model_info(cls, format_):
+		"""Capabilities registered for a model format
+
+		Returns
+		-------
+		info : `dict`
+			parameter names and bounds, output bands, whether whole
+			tables are evaluated in one vectorized call and the rough
+			cost of one row in seconds
+		"""
+		from .io.model import get_model_info
+		return get_model_info(format_, cls)
+
+	@classmethod
+	def list_models(cls, **criteria):
+		"""Names of the registered models, filtered on their capabilities
+
+		Examples
+		--------
+		>>> KNTable.list_models(batched=True)
+		"""
+		from .io.model import list_models
+		return list_models(cls, **criteria)
@@ -90,24 +90,111 @@ def loadModelsLbol(outputDir,name):
 
     return Lbols
 
+class Observations(dict):
+    """Photometry as a dict of per-filter (n, 3) [time, mag, dmag] arrays,
+    backed by one packed array sorted by filter and time.
+
+    The per-filter arrays are views of the packed data, so editing them in
+    place also edits the packed arrays; assigning or deleting a filter
+    repacks. t, mag, sigma, band (index into filters) and limit (upper
+    limits, i.e. infinite dmag) give all points at once. Entries that are
+    not (n, 3) arrays are kept as they are and not packed.
+    """
+
+    def __init__(self, data=None):
+        dict.__init__(self)
+        self._pack(dict(data) if data is not None else {})
+
+    def _pack(self, data):
+        # existing keys are updated in place so that assigning a filter while
+        # iterating over the dict, as the scripts do, remains valid
+        for key in [key for key in dict.keys(self) if key not in data]:
+            dict.__delitem__(self, key)
+        self.filters, arrays, self.extras = [], [], {}
+        for key, value in data.items():
+            value_array = np.asarray(value)
+            if value_array.ndim == 2 and value_array.shape[1] == 3:
+                self.filters.append(key)
+                arrays.append(np.array(value_array[np.argsort(value_array[:,0], kind='mergesort')], dtype=float))
+            else:
+                self.extras[key] = value
+
+        counts = np.array([len(array) for array in arrays], dtype=int)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        if len(arrays) > 0:
+            self.data = np.concatenate(arrays)
+        else:
+            self.data = np.empty((0,3), float)
+        self.band = np.repeat(np.arange(len(arrays)), counts)
+
+        for key, value in data.items():
+            if key in self.extras:
+                dict.__setitem__(self, key, value)
+            else:
+                ii = self.filters.index(key)
+                dict.__setitem__(self, key, self.data[self.offsets[ii]:self.offsets[ii+1]])
+
+    def __setitem__(self, key, value):
+        data = dict(self)
+        data[key] = value
+        self._pack(data)
+
+    def __delitem__(self, key):
+        data = dict(self)
+        del data[key]
+        self._pack(data)
+
+    def pop(self, key, *args):
+        data = dict(self)
+        value = data.pop(key, *args)
+        self._pack(data)
+        return value
+
+    def update(self, *args, **kwargs):
+        data = dict(self)
+        data.update(*args, **kwargs)
+        self._pack(data)
+
+    def __reduce__(self):
+        return (Observations, (dict((key, np.array(value) if key in self.filters else value) for key, value in self.items()),))
+
+    @property
+    def t(self):
+        return self.data[:,0]
+
+    @property
+    def mag(self):
+        return self.data[:,1]
+
+    @property
+    def sigma(self):
+        return self.data[:,2]
+
+    @property
+    def limit(self):
+        return ~np.isfinite(self.data[:,2])
+
 def loadEvent(filename):
     lines = [line.rstrip('\n') for line in open(filename)]
     lines = filter(None,lines)
 
+    lines = [list(filter(None,line.split(" "))) for line in lines]
+    if len(lines) == 0:
+        return Observations()
+    # all dates are converted at once
+    mjds = np.atleast_1d(Time([lineSplit[0] for lineSplit in lines], format='isot').mjd)
+
     data = {}
-    for line in lines:
-        lineSplit = line.split(" ")
-        lineSplit = filter(None,lineSplit)
-        mjd = Time(lineSplit[0], format='isot').mjd
+    for mjd, lineSplit in zip(mjds, lines):
         filt = lineSplit[1]
         mag = float(lineSplit[2])
         dmag = float(lineSplit[3])
 
         if not filt in data:
-            data[filt] = np.empty((0,3), float)
-        data[filt] = np.append(data[filt],np.array([[mjd,mag,dmag]]),axis=0)
+            data[filt] = []
+        data[filt].append([mjd,mag,dmag])
 
-    return data
+    return Observations((filt, np.array(data[filt], float)) for filt in data)
 
 def loadEventSpec(filename):
 
@@ -228,8 +315,11 @@ def loadLightcurves(filename):
         if not psid in data:
             data[psid] = {}
         if not filt in data[psid]:
-            data[psid][filt] = np.empty((0,3), float)
-        data[psid][filt] = np.append(data[psid][filt],np.array([[mjd,mag,dmag]]),axis=0)
+            data[psid][filt] = []
+        data[psid][filt].append([mjd,mag,dmag])
+
+    for psid in data:
+        data[psid] = Observations((filt, np.array(data[psid][filt], float)) for filt in data[psid])
 
     return data
 
@@ -587,84 +677,137 @@ def get_macronovae_rosswog(name):
         params = [-1,-1,-1]
     return params
 
-def calc_peak_mags(model_table, filts=["u","g","r","i","z","y","J","H","K"], magidxs=[0,1,2,3,4,5,6,7,8]):
+def stack_rows(model_table, column):
+    """Column of a model table as a dense (N, ...) float array, or None if
+    its rows differ in shape."""
+
+    values = np.asarray(model_table[column])
+    if values.dtype == object:
+        try:
+            values = np.array([row[column] for row in model_table], dtype=float)
+        except ValueError:
+            return None
+    return values
+
+def iter_row_chunks(model_table, chunk=1000):
+    """Chunks of (t (n,nt), lbol (n,nt), mag (n,9,nt)) arrays of a model
+    table. Tables whose rows differ in length are yielded row by row."""
+
+    if len(model_table) == 0:
+        return
+    t, lbol, mag = [stack_rows(model_table, column) for column in ["t","lbol","mag"]]
+    if t is None or lbol is None or mag is None:
+        for row in model_table:
+            t, lbol, mag = np.asarray(row["t"]), np.asarray(row["lbol"]), np.asarray(row["mag"])
+            yield t[np.newaxis], lbol[np.newaxis], mag[np.newaxis]
+        return
+    if t.ndim == 1:
+        t = np.tile(t, (len(model_table),1))
+    for start in range(0, len(model_table), chunk):
+        yield t[start:start+chunk], lbol[start:start+chunk], mag[start:start+chunk]
+
+def peak_mags(t, mag):
+    """Time and magnitude of the peak (minimum ignoring NaNs) of each row and
+    band of mag (n, nbands, nt) sampled at t (n, nt); NaN if a band has no
+    finite magnitude."""
+
+    t = np.broadcast_to(t[:,np.newaxis,:], mag.shape)
+    allnan = np.all(np.isnan(mag), axis=-1)
+    idx = np.argmin(np.where(np.isnan(mag), np.inf, mag), axis=-1)[...,np.newaxis]
+    tt = np.take_along_axis(t, idx, axis=-1)[...,0]
+    mm = np.take_along_axis(mag, idx, axis=-1)[...,0]
+    tt[allnan] = np.nan
+    mm[allnan] = np.nan
+    return tt, mm
+
+def interp_masked(tt, t, y):
+    """Linear interpolation of each row of y (n, nt), sampled at t (n, nt),
+    onto the common grid tt, ignoring NaNs and extrapolating linearly from
+    the end segments like interp1d(fill_value='extrapolate'). Rows with a
+    single finite value are constant, rows without any are NaN."""
+
+    n, nt = y.shape
+    valid = ~np.isnan(y)
+    nvalid = np.sum(valid, axis=1)
+
+    # move the valid points of every row to its front, keeping their order
+    order = np.argsort(~valid, axis=1, kind='mergesort')
+    tc = np.take_along_axis(t, order, axis=1)
+    yc = np.take_along_axis(y, order, axis=1)
+
+    # one searchsorted over all rows, offsetting each row along the time axis
+    tmin = min(np.nanmin(t), np.min(tt))
+    span = max(np.nanmax(t), np.max(tt)) - tmin + 1.0
+    offsets = np.arange(n)[:,np.newaxis]*span
+    keys = (tc - tmin + offsets)[np.arange(nt)[np.newaxis,:] < nvalid[:,np.newaxis]]
+    starts = np.concatenate(([0], np.cumsum(nvalid)[:-1]))
+    jj = np.searchsorted(keys, tt[np.newaxis,:] - tmin + offsets, side='right') - starts[:,np.newaxis]
+    jj = np.clip(jj, 1, np.maximum(nvalid-1, 1)[:,np.newaxis])
+
+    rows = np.arange(n)[:,np.newaxis]
+    t0, t1 = tc[rows,jj-1], tc[rows,np.minimum(jj,nt-1)]
+    y0, y1 = yc[rows,jj-1], yc[rows,np.minimum(jj,nt-1)]
+    single = (nvalid < 2)[:,np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(single, 0.0, (y1 - y0)/(t1 - t0))
+    yinterp = y0 + slope*(tt[np.newaxis,:] - t0)
+    yinterp[nvalid == 0] = np.nan
+    return yinterp
+
+def calc_peak_mags(model_table, filts=["u","g","r","i","z","y","J","H","K"], magidxs=[0,1,2,3,4,5,6,7,8], chunk=1000):
     """
     # Peak magnitudes and times in each band"
     """
 
-    # Initiaize peak mag dictionarts
-    model_table_tts = {}
-    model_table_mags = {}
-    model_table_appmags = {}
-    for filt, magidx in zip(filts, magidxs):
-        model_table_tts[filt] = []
-        model_table_mags[filt] = []
-        model_table_appmags[filt] = []
-
-    for row in model_table:
-        t, lbol, mag = row["t"], row["lbol"], row["mag"]
-        for filt, magidx in zip(filts,magidxs):
-            idx = np.where(~np.isnan(mag[magidx]))[0]
-            if len(idx) == 0:
-                model_table_tts[filt].append(np.nan)
-                model_table_mags[filt].append(np.nan)
-                model_table_appmags[filt].append(np.nan)
-            else:
-                ii = np.argmin(mag[magidx][idx])
-                model_table_tts[filt].append(t[idx][ii])
-                model_table_mags[filt].append(mag[magidx][idx][ii])
-                model_table_appmags[filt].append(mag[magidx][idx][ii]+5*(np.log10(row["dist"]*1e6) - 1))
+    tts, mags = [], []
+    for t, lbol, mag in iter_row_chunks(model_table, chunk=chunk):
+        tt, mm = peak_mags(t, mag[:,magidxs,:])
+        tts.append(tt)
+        mags.append(mm)
+    if len(tts) == 0:
+        tts = mags = np.empty((0,len(filts)))
+    else:
+        tts, mags = np.concatenate(tts), np.concatenate(mags)
 
-    for filt, magidx in zip(filts, magidxs):
-        model_table["peak_tt_%s"%filt] = model_table_tts[filt]
-        model_table["peak_mag_%s"%filt] = model_table_mags[filt]        
-        model_table["peak_appmag_%s"%filt] = model_table_appmags[filt]  
+    distmod = 5*(np.log10(np.asarray(model_table["dist"], dtype=float)*1e6) - 1)
+    for ii, filt in enumerate(filts):
+        model_table["peak_tt_%s"%filt] = tts[:,ii]
+        model_table["peak_mag_%s"%filt] = mags[:,ii]
+        model_table["peak_appmag_%s"%filt] = mags[:,ii] + distmod
 
     return model_table
 
 
-def interpolate_mags_lbol(model_table, filts=["u","g","r","i","z","y","J","H","K"], magidxs=[0,1,2,3,4,5,6,7,8]):
+def interpolate_mags_lbol(model_table, filts=["u","g","r","i","z","y","J","H","K"], magidxs=[0,1,2,3,4,5,6,7,8], chunk=1000):
     """
     """
-    from scipy.interpolate import interpolate as interp
     tt = np.arange(model_table['tini'][0], model_table['tmax'][0] + model_table['dt'][0], model_table['dt'][0])
-    mag_all = {}
-    lbol_all = np.empty((0, len(tt)), float)
-
-    for filt in filts:
-        mag_all[filt] = np.empty((0,len(tt)))
-
-    for row in model_table:
-        t, lbol, mag = row["t"], row["lbol"], row["mag"]
-
-        if np.sum(lbol) == 0.0:
-            continue
-
-        allfilts = True
-        for filt, magidx in zip(filts, magidxs):
-            idx = np.where(~np.isnan(mag[magidx]))[0]
-            if len(idx) == 0:
-                allfilts = False
-                break
-
-        if not allfilts: continue
-
-        for filt, magidx in zip(filts, magidxs):
-            idx = np.where(~np.isnan(mag[magidx]))[0]
-            f = interp.interp1d(t[idx], mag[magidx][idx], fill_value='extrapolate')
-            maginterp = f(tt)
-            mag_all[filt] = np.append(mag_all[filt], [maginterp], axis=0)
 
-        idx = np.where((~np.isnan(np.log10(lbol))) & ~(lbol==0))[0]
-        f = interp.interp1d(t[idx], np.log10(lbol[idx]), fill_value='extrapolate')
-        lbolinterp = 10**f(tt)
-        lbol_all = np.append(lbol_all, [lbolinterp], axis=0)
+    keep, lbol_all, mag_all = [], [], []
+    for t, lbol, mag in iter_row_chunks(model_table, chunk=chunk):
+        mag = mag[:,magidxs,:]
+        # rows without luminosity or with an empty band are dropped
+        ok = (np.sum(lbol, axis=1) != 0.0) & np.all(np.any(~np.isnan(mag), axis=2), axis=1)
+        keep.append(ok)
+        t, lbol, mag = t[ok], lbol[ok], mag[ok]
+        nrows, nbands, nt = mag.shape
+
+        tband = np.repeat(t, nbands, axis=0)
+        mag_all.append(interp_masked(tt, tband, mag.reshape(nrows*nbands, nt)).reshape(nrows, nbands, len(tt)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loglbol = np.log10(lbol)
+        loglbol[lbol == 0] = np.nan
+        lbol_all.append(10**interp_masked(tt, t, loglbol))
+
+    keep = np.concatenate(keep)
+    lbol_all = np.concatenate(lbol_all)
+    mag_all = np.concatenate(mag_all)
 
     # Ad to model table
+    model_table = model_table[keep]
     model_table["lbol"] = lbol_all
-    for filt in filts:
-        model_table["lbol"] = lbol
-        model_table["mag_%s"%filt] = mag_all[filt]
+    for ii, filt in enumerate(filts):
+        model_table["mag_%s"%filt] = mag_all[:,ii,:]
 
     return model_table
 
@@ -690,86 +833,113 @@ def get_legend(model):
 
     return legend_name
 
+# model bands, the rows of the model magnitudes
+MAG_BANDS = ["u","g","r","i","z","y","J","H","K"]
+
+# observed filters as weights of the model bands, see register_filter
+_FILTERS = {}
+
+def register_filter(name, weights):
+    """Register an observed filter as a weighted combination of the model
+    bands, e.g. register_filter("V", {"g": 0.5, "r": 0.5})."""
+    row = np.zeros(len(MAG_BANDS))
+    for band, weight in weights.items():
+        row[MAG_BANDS.index(band)] = weight
+    _FILTERS[name] = row
+
+for band in MAG_BANDS:
+    register_filter(band, {band: 1.0})
+register_filter("w", {"g": 1/3.0, "r": 1/3.0, "i": 1/3.0})
+for filt in ["U","UVW2","UVW1","UVM2"]:
+    register_filter(filt, {"u": 1.0})
+register_filter("B", {"g": 1.0})
+for filt in ["c","V","F606W"]:
+    register_filter(filt, {"g": 0.5, "r": 0.5})
+register_filter("o", {"r": 0.5, "i": 0.5})
+register_filter("R", {"z": 1.0})
+for filt in ["I","F814W"]:
+    register_filter(filt, {"z": 0.5, "y": 0.5})
+register_filter("F160W", {"H": 1.0})
+
+def get_filters():
+    """Names of the registered filters"""
+    return list(_FILTERS.keys())
+
+def filter_matrix(filts):
+    """(len(filts), 9) mixing matrix of the model bands for filts"""
+    return np.array([_FILTERS[filt] for filt in filts])
+
+def mix_mags(mag, filts):
+    """Magnitudes (..., len(filts), nt) in filts of model magnitudes
+    (..., 9, nt), with one matrix product. Non-finite magnitudes of the
+    bands a filter uses carry over to it as in the weighted sum of those
+    bands (so a single-band filter keeps them as they are), bands it does
+    not use are ignored."""
+    weights = filter_matrix(filts)
+    mag = np.asarray(mag, dtype=float)
+    bad = ~np.isfinite(mag)
+    magmix = np.einsum('fk,...kt->...ft', weights, np.where(bad, 0.0, mag))
+    if np.any(bad):
+        for ii in range(len(weights)):
+            used = np.nonzero(weights[ii])[0]
+            if np.any(bad[...,used,:]):
+                with np.errstate(invalid='ignore'):
+                    magmix[...,ii,:] = np.sum(weights[ii,used,np.newaxis]*mag[...,used,:], axis=-2)
+    return magmix
+
 def get_mag(mag,key):
-    if key == "u":
-        magave = 1.0*mag[0]
-    elif key == "g":
-        magave = 1.0*mag[1]
-    elif key == "r":
-        magave = 1.0*mag[2]
-    elif key == "i":
-        magave = 1.0*mag[3]
-    elif key == "z":
-        magave = 1.0*mag[4]
-    elif key == "y":
-        magave = 1.0*mag[5]
-    elif key == "J":
-        magave = 1.0*mag[6]
-    elif key == "H":
-        magave = 1.0*mag[7]
-    elif key == "K":
-        magave = 1.0*mag[8]
-    elif key == "w": 
-        magave = (mag[1]+mag[2]+mag[3])/3.0
-    elif key in ["U","UVW2","UVW1","UVM2"]:
-        magave = 1.0*mag[0]
-    elif key == "B":
-        magave = 1.0*mag[1]
-    elif key in ["c","V","F606W"]:
-        magave = (mag[1]+mag[2])/2.0
-    elif key == "o":
-        magave = (mag[2]+mag[3])/2.0
-    elif key == "R":
-        magave = 1.0*mag[4]
-    elif key in ["I","F814W"]:
-        magave = (mag[4]+mag[5])/2.0
-    elif key == "F160W":
-        magave = 1.0*mag[7]
-    return magave
-
-def get_med(magtable, errorbudget = 0.0, filts = ["u","g","r","i","z","y","J","H","K"]):
-
-    mag_all = {}
+    # bands along the first axis of mag
+    mag = np.asarray(mag, dtype=float)
+    if mag.ndim == 1:
+        return mix_mags(mag[:,np.newaxis], [key])[0,0]
+    return mix_mags(np.moveaxis(mag,0,-2), [key])[...,0,:]
+
+def stack_mags(magtable):
+    """Times (N, nt) and magnitudes (N, 9, nt) of all rows of a model table.
+    Dense KNTable columns are used as they are, other tables are stacked
+    once. Rows may have their own time grids but must share their length."""
+
+    t = stack_rows(magtable, "t")
+    mags = stack_rows(magtable, "mag")
+    if t is None or mags is None:
+        raise ValueError("model table rows differ in length")
+    if t.ndim == 1:
+        t = np.tile(t, (len(magtable),1))
+    return t, mags
+
+def get_med(magtable, errorbudget = 0.0, filts = ["u","g","r","i","z","y","J","H","K"], percentiles = [10,50,90,5,95]):
+
+    t, mags = stack_mags(magtable)
+    # all filters of all rows in one product
+    mags = mix_mags(mags, filts)
+
     med_all = {}
     for ii, filt in enumerate(filts):
         med_all[filt] = {}
-        for jj, row in enumerate(magtable):
-            t, lbol, mag = row["t"], row["lbol"], row["mag"]
-            if (jj==0):
-                mag_all[filt] = np.empty((0,len(t)))
-
-            maginterp = get_mag(mag,filt)
-            mag_all[filt] = np.append(mag_all[filt],[maginterp],axis=0)
-        magmed = np.percentile(mag_all[filt], 50, axis=0)
-        magmax = np.percentile(mag_all[filt], 90, axis=0) + errorbudget
-        magmin = np.percentile(mag_all[filt], 10, axis=0) - errorbudget
-        magmax2 = np.percentile(mag_all[filt], 95, axis=0) + errorbudget
-        magmin2 = np.percentile(mag_all[filt], 5, axis=0) - errorbudget
-
-        med_all[filt]["10"] = magmin
-        med_all[filt]["50"] = magmed
-        med_all[filt]["90"] = magmax
-        med_all[filt]["5"] = magmin2
-        med_all[filt]["95"] = magmax2
+        mag_all = mags[:,ii,:]
+        magpercentiles = np.percentile(mag_all, percentiles, axis=0)
+        for percentile, magpercentile in zip(percentiles, magpercentiles):
+            if percentile > 50:
+                magpercentile = magpercentile + errorbudget
+            elif percentile < 50:
+                magpercentile = magpercentile - errorbudget
+            med_all[filt]["%g"%percentile] = magpercentile
 
     return med_all
 
 def get_peak(magtable, filts = ["u","g","r","i","z","y","J","H","K"]):
 
+    t, mags = stack_mags(magtable)
+    mags = mix_mags(mags, filts)
+
     peaks_all = {}
     for ii, filt in enumerate(filts):
-        peaks_all[filt] = {}
-        for jj, row in enumerate(magtable):
-            t, lbol, mag = row["t"], row["lbol"], row["mag"]
-            maginterp = get_mag(mag,filt)
-            if (jj==0):
-                peaks_all[filt] = np.empty((0,2)) 
-
-            idx = np.argmin(maginterp)
-            time_min = t[idx]
-            mag_min = maginterp[idx]
-
-            peaks_all[filt] = np.append(peaks_all[filt],[[time_min,mag_min]],axis=0)
+        maginterp = mags[:,ii,:]
+        # nanargmin over time, rows without any finite magnitude give t[0]
+        idx = np.argmin(np.where(np.isnan(maginterp), np.inf, maginterp), axis=1)[:,np.newaxis]
+        time_min = np.take_along_axis(t, idx, axis=1)[:,0]
+        mag_min = np.take_along_axis(maginterp, idx, axis=1)[:,0]
+        peaks_all[filt] = np.vstack((time_min,mag_min)).T
     return peaks_all
 
 def get_envelope(lambdas,spec):
@@ -23,4 +23,4 @@
 from .model import *
 from .loglike import *
 from .prior import *
-
+from .likelihood import *
@@ -0,0 +1,352 @@
+import json
+import contextlib
+
+import numpy as np
+
+from .likelihood import Likelihood
+from .cache import get_model_cache, configure_model_cache
+from .telemetry import get_telemetry, configure_telemetry
+
+__all__ = ['SamplerResult', 'SamplerBackend', 'register_backend', 'get_backend',
+           'run_sampler']
+
+# sampler name -> SamplerBackend subclass
+_BACKENDS = {}
+
+def register_backend(name, backend_class, force=False):
+    """Register a SamplerBackend subclass under name for run_sampler"""
+    if name in _BACKENDS and not force:
+        raise ValueError("Sampler backend %r already registered" % name)
+    _BACKENDS[name] = backend_class
+
+def get_backend(name):
+    """SamplerBackend subclass registered under name"""
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError("Unknown sampler backend %r, choose from %s"
+                         % (name, ', '.join(sorted(_BACKENDS))))
+
+class SamplerResult(object):
+    """
+    Output of every backend: equally weighted posterior samples of the
+    parameters (N, ndim), their log-likelihood (N,) and, for nested
+    samplers, the log-evidence and its error (nan otherwise).
+    """
+
+    def __init__(self, samples, loglikelihood, logZ=np.nan, logZerr=np.nan, parameters=None):
+        self.samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        self.loglikelihood = np.asarray(loglikelihood, dtype=float)
+        self.logZ = float(logZ)
+        self.logZerr = float(logZerr)
+        self.parameters = parameters
+        # statistics of the model cache during the run (with those of the
+        # pool workers)
+        self.model_cache = None
+
+    @property
+    def posterior(self):
+        """Samples with the log-likelihood as the last column, the layout of
+        the MultiNest post_equal_weights file"""
+        return np.column_stack((self.samples, self.loglikelihood))
+
+    def save(self, basename, posterior=True):
+        """Write <basename>post_equal_weights.dat (read by run.multinest
+        through lightcurve_utils.get_post_file) and <basename>evidence.json"""
+        if posterior:
+            np.savetxt('%spost_equal_weights.dat' % basename, self.posterior)
+        with open('%sevidence.json' % basename, 'w') as fid:
+            json.dump({'logZ': self.logZ, 'logZerr': self.logZerr,
+                       'nsamples': len(self.samples),
+                       'parameters': self.parameters,
+                       'model_cache': self.model_cache}, fid, indent=2)
+
+class SamplerBackend(object):
+    """
+    Common interface of the samplers: a backend is built from a Likelihood
+    (which provides the prior transform) and its settings, and run() returns
+    a SamplerResult after writing it next to outputfiles_basename.
+
+    batched : evaluate whole batches of points with Likelihood.batch, for
+        backends that propose several points at once
+    nprocs : size of the process pool the likelihood is evaluated in, for
+        backends that support one
+    """
+
+    # whether the sampler writes post_equal_weights.dat itself
+    writes_posterior = False
+
+    def __init__(self, likelihood, outputfiles_basename, n_live_points=100,
+                 evidence_tolerance=0.5, max_iter=0, batched=False, nprocs=1,
+                 seed=None, verbose=True, **kwargs):
+        self.likelihood = likelihood
+        self.ndim = likelihood.ndim
+        self.outputfiles_basename = outputfiles_basename
+        self.n_live_points = n_live_points
+        self.evidence_tolerance = evidence_tolerance
+        self.max_iter = max_iter
+        self.batched = batched
+        self.nprocs = nprocs
+        self.seed = seed
+        self.verbose = verbose
+        self.kwargs = kwargs
+
+    @contextlib.contextmanager
+    def pool(self):
+        """Process pool of nprocs workers, None for a serial run. The
+        Likelihood is installed once in every worker (and in this process),
+        so that the _worker_* functions mapped over the pool only carry the
+        points. When the block ends, the telemetry and model cache counts
+        of the workers are added to those of this process; the progress
+        lines written during the run count this process only."""
+        if self.nprocs is None or self.nprocs <= 1:
+            yield None
+            return
+        import multiprocessing
+        telemetry = get_telemetry()
+        model_cache = get_model_cache()
+        _install_likelihood(self.likelihood)
+        pool = multiprocessing.Pool(self.nprocs, initializer=_init_worker,
+                                    initargs=(self.likelihood, multiprocessing.Barrier(self.nprocs),
+                                              telemetry.enabled, model_cache.maxsize, model_cache.rtol))
+        try:
+            yield pool
+            for summary in pool.map(_worker_summary, range(self.nprocs), chunksize=1):
+                telemetry.merge(summary)
+                model_cache.merge_stats(summary['model_cache'])
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self):
+        model_cache = get_model_cache()
+        model_cache.reset_stats()
+        telemetry = get_telemetry()
+        telemetry.reset()
+        likelihood = self.likelihood
+        with likelihood.activate():
+            result = self._run()
+        posterior = not self.writes_posterior
+        if likelihood.marginalized:
+            # the sampler did not see t0 / zp, draw them for every sample
+            result.samples = likelihood.insert_marginalized(result.samples, seed=self.seed)
+            posterior = True
+        result.parameters = likelihood.parameters
+        result.model_cache = model_cache.stats()
+        if self.verbose:
+            print(model_cache.summary())
+        if telemetry.enabled:
+            telemetry.report()
+            telemetry.save('%stelemetry.json' % self.outputfiles_basename)
+        result.save(self.outputfiles_basename, posterior=posterior)
+        return result
+
+    def _run(self):
+        raise NotImplementedError
+
+class _FiniteLogLike(object):
+    """Likelihood with nan mapped to -inf, or to a large negative number for
+    samplers that require finite values"""
+
+    def __init__(self, likelihood, floor=-np.inf):
+        self.likelihood = likelihood
+        self.floor = floor
+
+    def __call__(self, theta):
+        logl = self.likelihood(theta)
+        if not np.isfinite(logl):
+            return self.floor
+        return logl
+
+    def batch(self, thetas):
+        logl = self.likelihood.batch(thetas)
+        logl[~np.isfinite(logl)] = self.floor
+        return logl
+
+class _UnitCubeLogProb(object):
+    """log-probability of points of the unit hypercube: the prior transforms
+    of the model are uniform there, so only the likelihood remains"""
+
+    def __init__(self, likelihood, pool=None, nchunks=1):
+        self.loglike = _FiniteLogLike(likelihood)
+        self.likelihood = likelihood
+        self.pool = pool
+        self.nchunks = nchunks
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def _batch(self, u):
+        return self.loglike.batch(self.likelihood.prior_transform(u))
+
+    def __call__(self, u):
+        u = np.asarray(u, dtype=float)
+        inside = np.all((u >= 0.0) & (u <= 1.0), axis=-1)
+        if u.ndim == 1:
+            if not inside:
+                return -np.inf
+            return self.loglike(self.likelihood.prior_transform(u))
+
+        logp = np.full(len(u), -np.inf)
+        if np.any(inside):
+            if self.pool is None:
+                logp[inside] = self._batch(u[inside])
+            else:
+                chunks = np.array_split(u[inside], min(self.nchunks, np.sum(inside)))
+                logp[inside] = np.concatenate(self.pool.map(_worker_logprob_batch, chunks))
+        return logp
+
+# the Likelihood of this process, installed once per pool worker by
+# SamplerBackend.pool
+_WORKER = {'likelihood': None, 'logprob': None, 'loglike': None, 'barrier': None}
+
+def _install_likelihood(likelihood):
+    """Pool initializer, keeping likelihood for the _worker_* functions"""
+    _WORKER['likelihood'] = likelihood
+    _WORKER['logprob'] = _UnitCubeLogProb(likelihood)
+    # dynesty requires finite log-likelihoods
+    _WORKER['loglike'] = _FiniteLogLike(likelihood, floor=-1e300)
+
+def _init_worker(likelihood, barrier, telemetry, maxsize, rtol):
+    """Pool initializer: install likelihood and set up the telemetry (without
+    progress lines) and model cache of the worker like those of the parent"""
+    _install_likelihood(likelihood)
+    _WORKER['barrier'] = barrier
+    configure_telemetry(enabled=telemetry, interval=np.inf)
+    configure_model_cache(maxsize=maxsize, rtol=rtol)
+
+def _worker_summary(ii):
+    """Telemetry summary of a worker, with its model cache statistics. The
+    workers wait for each other, so that each of them answers once."""
+    _WORKER['barrier'].wait()
+    return get_telemetry().summary()
+
+def _worker_logprob(u):
+    """_UnitCubeLogProb of a point, in a worker"""
+    return _WORKER['logprob'](u)
+
+def _worker_logprob_batch(u):
+    """_UnitCubeLogProb of a batch of points inside the unit cube, in a worker"""
+    return _WORKER['logprob']._batch(u)
+
+def _worker_loglike(theta):
+    """Finite log-likelihood of a point, in a worker"""
+    return _WORKER['loglike'](theta)
+
+def _worker_prior_transform(u):
+    """Prior transform of a point, in a worker"""
+    return _WORKER['likelihood'].prior_transform(u)
+
+class MultiNestBackend(SamplerBackend):
+    """pymultinest.run with per-point callbacks, as run.multinest always did.
+    MultiNest parallelizes through MPI (mpirun), not a process pool."""
+
+    writes_posterior = True
+
+    def _run(self):
+        import pymultinest
+
+        likelihood = self.likelihood
+        settings = dict(importance_nested_sampling=False, resume=True,
+                        verbose=self.verbose, sampling_efficiency='parameter',
+                        multimodal=False)
+        settings.update(self.kwargs)
+        pymultinest.run(likelihood.multinest_loglike, likelihood.multinest_prior, self.ndim,
+                        n_live_points=self.n_live_points,
+                        outputfiles_basename=self.outputfiles_basename,
+                        evidence_tolerance=self.evidence_tolerance,
+                        max_iter=self.max_iter, **settings)
+
+        analyzer = pymultinest.Analyzer(n_params=self.ndim,
+                                        outputfiles_basename=self.outputfiles_basename)
+        posterior = analyzer.get_equal_weighted_posterior()
+        stats = analyzer.get_stats()
+        return SamplerResult(posterior[:,:self.ndim], posterior[:,self.ndim],
+                             logZ=stats['global evidence'],
+                             logZerr=stats['global evidence error'])
+
+class EmceeBackend(SamplerBackend):
+    """emcee ensemble MCMC in the unit hypercube of the prior transform.
+    All walkers are proposed at once, so with batched=True the likelihood
+    sees whole batches (split over the pool when nprocs > 1).
+
+    Settings: nwalkers (default 4*n_live_points rounded to even, at least
+    2*ndim), nsteps (default max_iter or 2000), nburn (default nsteps/2),
+    thin (default 1).
+    """
+
+    def _run(self):
+        import emcee
+
+        ndim = self.ndim
+        nwalkers = self.kwargs.get('nwalkers', max(2*ndim, 2*((4*self.n_live_points+1)//2)))
+        nsteps = self.kwargs.get('nsteps', self.max_iter if self.max_iter > 0 else 2000)
+        nburn = self.kwargs.get('nburn', nsteps//2)
+        thin = self.kwargs.get('thin', 1)
+
+        rng = np.random.RandomState(self.seed)
+        p0 = rng.uniform(size=(nwalkers, ndim))
+
+        with self.pool() as pool:
+            if self.batched:
+                logprob = _UnitCubeLogProb(self.likelihood, pool=pool, nchunks=self.nprocs)
+                sampler = emcee.EnsembleSampler(nwalkers, ndim, logprob, vectorize=True)
+            elif pool is not None:
+                sampler = emcee.EnsembleSampler(nwalkers, ndim, _worker_logprob, pool=pool)
+            else:
+                sampler = emcee.EnsembleSampler(nwalkers, ndim, _UnitCubeLogProb(self.likelihood))
+            if self.seed is not None:
+                sampler.random_state = rng.get_state()
+            sampler.run_mcmc(p0, nsteps, progress=self.verbose)
+
+        u = sampler.get_chain(discard=nburn, thin=thin, flat=True)
+        loglikelihood = sampler.get_log_prob(discard=nburn, thin=thin, flat=True)
+        return SamplerResult(self.likelihood.prior_transform(u), loglikelihood)
+
+class DynestyBackend(SamplerBackend):
+    """dynesty dynamic nested sampling. dynesty proposes one point at a time,
+    so the likelihood is evaluated per point, in parallel over the pool
+    when nprocs > 1. Further keyword arguments go to run_nested."""
+
+    def _run(self):
+        import dynesty
+        from dynesty.utils import resample_equal
+
+        # dynesty requires finite log-likelihoods
+        loglike = _FiniteLogLike(self.likelihood, floor=-1e300)
+        rstate = np.random.default_rng(self.seed)
+
+        prior_transform = self.likelihood.prior_transform
+        with self.pool() as pool:
+            if pool is not None:
+                loglike, prior_transform = _worker_loglike, _worker_prior_transform
+            sampler = dynesty.DynamicNestedSampler(loglike, prior_transform, self.ndim,
+                                                   nlive=self.n_live_points, pool=pool,
+                                                   queue_size=self.nprocs if pool is not None else None,
+                                                   rstate=rstate)
+            settings = dict(dlogz_init=self.evidence_tolerance, print_progress=self.verbose)
+            if self.max_iter > 0:
+                settings['maxiter'] = self.max_iter
+            settings.update(self.kwargs)
+            sampler.run_nested(**settings)
+
+        results = sampler.results
+        weights = np.exp(results.logwt - results.logz[-1])
+        weights /= np.sum(weights)
+        idx = resample_equal(np.arange(len(weights)), weights, rstate=rstate).astype(int)
+        return SamplerResult(results.samples[idx], results.logl[idx],
+                             logZ=results.logz[-1], logZerr=results.logzerr[-1])
+
+register_backend('multinest', MultiNestBackend)
+register_backend('emcee', EmceeBackend)
+register_backend('dynesty', DynestyBackend)
+
+def run_sampler(loglike, prior, parameters, outputfiles_basename, sampler='multinest', **kwargs):
+    """Sample the posterior of the myloglike_* / myprior_* pair with the
+    backend registered as sampler and return its SamplerResult"""
+    model = loglike.__name__.replace('myloglike_', '')
+    likelihood = Likelihood(model, loglike=loglike, prior=prior, parameters=parameters)
+    backend = get_backend(sampler)(likelihood, outputfiles_basename, **kwargs)
+    return backend.run()
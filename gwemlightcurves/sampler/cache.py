@@ -0,0 +1,189 @@
+import time
+import functools
+from collections import OrderedDict
+
+import numpy as np
+
+from gwemlightcurves import Global
+from .telemetry import get_telemetry
+
+__all__ = ['ModelCache', 'get_model_cache', 'configure_model_cache', 'cached_model',
+           'cached_model_batch']
+
+class ModelCache(object):
+    """
+    LRU cache of model lightcurves (tmag, lbol, mag) keyed on the physical
+    parameters of the model, quantized to the relative tolerance rtol
+    (rtol = 0 keeps the exact values), and on the SVD models in Global.
+
+    t0 and zp only shift the lightcurve in time and magnitude, so likelihood
+    calls that differ in them alone reuse the cached curve. Cached arrays
+    are shared between calls and must not be modified.
+    """
+
+    def __init__(self, maxsize=1000, rtol=0.0):
+        self.maxsize = maxsize
+        self.rtol = rtol
+        self._entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.time_saved = 0.0
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return sum(nbytes for value, cost, nbytes in self._entries.values())
+
+    def key(self, name, args):
+        values = [np.asarray(arg, dtype=float) for arg in args]
+        shapes = tuple(value.shape for value in values)
+        values = np.concatenate([np.ravel(value) for value in values]) if values else np.empty(0)
+        if self.rtol > 0:
+            with np.errstate(divide='ignore'):
+                exponent = np.where(values == 0, 0.0, np.floor(np.log10(np.abs(values))))
+            mantissa = np.round(values/10**exponent/self.rtol)
+            values = np.concatenate((exponent, mantissa))
+        # the surrogate models the lightcurves are computed from
+        svd = (id(Global.svd_mag_model), id(Global.svd_lbol_model),
+               id(Global.svd_mag_color_model))
+        return (name, shapes, values.tobytes(), svd)
+
+    def get(self, key):
+        """Cached value of key or None, counting hits and misses"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries[key] = entry
+        self.hits += 1
+        self.time_saved += entry[1]
+        return entry[0]
+
+    def put(self, key, value, cost):
+        """Store value, computed in cost seconds, and return it"""
+        value = tuple(value)
+        nbytes = sum(getattr(array, 'nbytes', 0) for array in value)
+        self._entries[key] = (value, cost, nbytes)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': float(self.hits)/calls if calls else 0.0,
+                'evictions': self.evictions, 'entries': len(self),
+                'maxsize': self.maxsize, 'rtol': self.rtol,
+                'nbytes': self.nbytes, 'time_saved': self.time_saved}
+
+    def merge_stats(self, stats):
+        """Add the counts of the stats() of another process, such as a pool
+        worker, to these (its entries stay there)"""
+        self.hits += stats['hits']
+        self.misses += stats['misses']
+        self.evictions += stats['evictions']
+        self.time_saved += stats['time_saved']
+
+    def summary(self):
+        stats = self.stats()
+        return ('model cache: %(hits)d hits / %(misses)d misses (hit rate %(hit_rate).1f%%), '
+                '%(entries)d entries using %(mbytes).1f MB, %(time_saved).1f s saved'
+                % dict(stats, hit_rate=100*stats['hit_rate'], mbytes=stats['nbytes']/1e6))
+
+_MODEL_CACHE = ModelCache()
+
+def get_model_cache():
+    """The ModelCache shared by the model functions of sampler.model"""
+    return _MODEL_CACHE
+
+def configure_model_cache(maxsize=None, rtol=None):
+    """Set the size (0 disables caching) and quantization of the model
+    cache, emptying it"""
+    if maxsize is not None:
+        _MODEL_CACHE.maxsize = maxsize
+    if rtol is not None:
+        _MODEL_CACHE.rtol = rtol
+    _MODEL_CACHE.clear()
+    _MODEL_CACHE.reset_stats()
+
+def cached_model(function):
+    """Decorator caching the (tmag, lbol, mag) of a model function of its
+    physical parameters in the model cache"""
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        cache = _MODEL_CACHE
+        telemetry = get_telemetry()
+        if cache.maxsize <= 0:
+            if not telemetry.enabled:
+                return function(*args)
+            start = time.time()
+            value = function(*args)
+            telemetry.add_time('model', time.time() - start)
+            return value
+        key = cache.key(name, args)
+        value = cache.get(key)
+        if value is None:
+            start = time.time()
+            value = function(*args)
+            cost = time.time() - start
+            if telemetry.enabled:
+                telemetry.add_time('model', cost)
+            value = cache.put(key, value, cost)
+        return value
+
+    return wrapper
+
+def cached_model_batch(name):
+    """Decorator caching the rows of a batched model function under the
+    entries of the model function name, whose parameters it takes as
+    arrays with one row per point. The function returns tmag (nt,), lbol
+    (N, nt) and mag (N, 9, nt) and is called once for the points missing
+    from the cache."""
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            cache = _MODEL_CACHE
+            telemetry = get_telemetry()
+            args = [np.asarray(arg, dtype=float) for arg in args]
+            npoints = len(args[0])
+            if cache.maxsize > 0:
+                keys = [cache.key(name, [arg[ii] for arg in args]) for ii in range(npoints)]
+                values = [cache.get(key) for key in keys]
+            else:
+                values = [None]*npoints
+            missing = [ii for ii in range(npoints) if values[ii] is None]
+            if missing:
+                start = time.time()
+                tmag, lbol, mag = function(*[arg[missing] for arg in args])
+                cost = time.time() - start
+                if telemetry.enabled:
+                    telemetry.add_time('model', cost)
+                for jj, ii in enumerate(missing):
+                    value = (tmag, lbol[jj], mag[jj])
+                    if cache.maxsize > 0:
+                        value = cache.put(keys[ii], value, cost/len(missing))
+                    values[ii] = value
+            if npoints == 0:
+                return np.empty(0), np.empty((0, 0)), np.empty((0, 9, 0))
+            tmag = values[0][0]
+            lbol = np.array([value[1] for value in values])
+            mag = np.array([value[2] for value in values])
+            return tmag, lbol, mag
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,865 @@
+import time
+import threading
+import contextlib
+
+import numpy as np
+from scipy.special import ndtr, log_ndtr, logsumexp
+from gwemlightcurves import lightcurve_utils, Global
+from .telemetry import get_telemetry
+from .prior import Prior
+
+__all__ = ['LikelihoodPlan', 'get_likelihood_plan', 'Likelihood']
+
+def _chi2_logpdf(chisquare):
+    """scipy.stats.chi2.logpdf(chisquare, 1)"""
+    with np.errstate(divide='ignore'):
+        return -0.5*np.log(2.0*np.pi*chisquare) - chisquare/2.0
+
+
+class LikelihoodPlan(object):
+    """
+    The observations of Global.data_out (packed by
+    lightcurve_utils.Observations) reduced once to the arrays calc_prob
+    needs: observation times, magnitudes and errors of all used filters,
+    the filter of each point and the registered filters used.
+    evaluate() then interpolates the model onto every observation with one
+    masked linear interpolation and sums the chi-square of all filters at
+    once, giving the same result as the per-filter loop of calc_prob.
+
+    With ZPRange given, evaluate() ignores zp and returns the likelihood
+    averaged over a flat prior on zp in [-ZPRange, ZPRange]. The chi-square
+    is quadratic in zp, so after a change of variables that removes the
+    (2 pi chisquare)**-1/2 peak of chi2.logpdf its factor is smooth. The
+    upper limits are steps of width errorbudget in zp, so the interval is
+    split at multiples of the chi-square width around the best zp, of
+    errorbudget around every step and of the width of the integrand around
+    its peak, and each piece gets a Gauss-Legendre rule.
+
+    With T0Range given, evaluate() likewise ignores t0 and averages over a
+    flat prior on t0 in [-T0Range, T0Range]: the model is interpolated onto
+    the observations for many shifts at once and the likelihood of every
+    shift is integrated with the trapezoidal rule. Unless the model is
+    extrapolated, only the shifts for which it covers every observation
+    count, and the shifts are spread over those alone, T0_SUBSTEPS per
+    model time step. The peak of the likelihood in t0 can be narrower than
+    that, so the spacing is halved around it until the integral converges.
+
+    The integrands of the last evaluation are kept in last_nuisance, from
+    which sample_nuisance() draws t0 and zp for posterior samples.
+
+    set_errorbudget() switches the plan to another errorbudget in place,
+    for likelihoods that sample it.
+    """
+
+    # Gauss-Legendre rule of every piece of the zp integral, the number of
+    # standard deviations of the chi-square in zp it covers around the best
+    # zp, and the breaks of the pieces in those standard deviations, in
+    # errorbudgets around each upper limit and in widths around the peak
+    # (growing geometrically, as the integrand can fall off slowly on the
+    # side away from the limits)
+    _gl_nodes, _gl_weights = np.polynomial.legendre.leggauss(12)
+    ZP_UMAX = 40.0
+    ZP_CHI2_BREAKS = np.array([-8.0, -3.0, -1.0, 0.0, 1.0, 3.0, 8.0])
+    ZP_UL_BREAKS = np.array([-6.0, -2.0, 0.0, 2.0, 6.0])
+    ZP_PEAK_BREAKS = np.array([-200.0, -64.0, -24.0, -8.0, -3.0, -1.0, 0.0, 1.0, 3.0, 8.0, 24.0, 64.0, 200.0])
+    # shifts of the t0 integral per model time step, and their bounds
+    T0_SUBSTEPS = 4
+    T0_MIN_NPOINTS = 21
+    T0_MAX_NPOINTS = 2001
+    # refinement of the shifts around the peak of the t0 likelihood: the
+    # log-likelihood range refined, the change of the log-likelihood between
+    # shifts above which they are refined, the largest number of halvings
+    # and the change of the log integral at which they stop
+    T0_REFINE_DLOGL = 15.0
+    T0_REFINE_STEP = 0.2
+    T0_REFINE_LEVELS = 8
+    T0_REFINE_TOL = 1e-3
+
+    def __init__(self, data_out, filters=None, doLuminosity=False, doWaveformExtrapolate=False, errorbudget=0.0, ZPRange=None, T0Range=None):
+        self.doLuminosity = doLuminosity
+        self.doWaveformExtrapolate = doWaveformExtrapolate
+        self.errorbudget = errorbudget
+        self.ZPRange = ZPRange
+        self.T0Range = T0Range
+        self.last_nuisance = None
+
+        if doLuminosity:
+            t, y, sigma_y = data_out["tt"], data_out["Lbol"], data_out["Lbol_err"]
+            idx = np.where(~np.isnan(y))[0]
+            t, y, sigma_y = t[idx], y[idx], sigma_y[idx]
+            self.t = np.asarray(t, dtype=float)
+            self.y = np.log10(y)
+            self._sigma_data = np.abs(sigma_y/(y*np.log(10)))
+            # chisquare(zp) = sum(weights*(y - model - k*zp)**2), zp shifts
+            # log10 luminosities by -zp/2.5
+            self._k = -0.4
+            self._set_errors(errorbudget)
+            return
+
+        if not isinstance(data_out, lightcurve_utils.Observations):
+            data_out = lightcurve_utils.Observations(data_out)
+
+        registered = lightcurve_utils.get_filters()
+        used = [key in filters and key in registered for key in data_out.filters]
+        keep = np.array(used, dtype=bool)[data_out.band] & ~np.isnan(data_out.mag)
+        # filters without any valid point do not count
+        bands = np.unique(data_out.band[keep])
+
+        self.nfilters = len(bands)
+        if self.nfilters == 0:
+            self.t = np.empty(0)
+            return
+        self.filters = [data_out.filters[band] for band in bands]
+        self.t = data_out.t[keep]
+        self.y = data_out.mag[keep]
+        self.segment = np.searchsorted(bands, data_out.band[keep])
+        self._sigma_data = data_out.sigma[keep]
+        self.upperlimit = ~np.isfinite(self._sigma_data)
+        self.npoints = np.bincount(self.segment, minlength=self.nfilters)
+        self.norm = np.where(self.npoints == 1, 1.0, 1.0/np.maximum(self.npoints-1, 1))
+
+        # the model is interpolated once onto the distinct observation times
+        self.tunique, self.tindex = np.unique(self.t, return_inverse=True)
+
+        self._k = 1.0
+        self._set_errors(errorbudget)
+
+    def _set_errors(self, errorbudget):
+        """Errors and chi-square weights of the observations for errorbudget"""
+        self.errorbudget = errorbudget
+        if self.doLuminosity:
+            self.sigma = np.sqrt((np.log10(1+errorbudget))**2 + self._sigma_data**2)
+            self._weights = 1.0/self.sigma**2
+            if len(self.y) > 1:
+                self._weights = self._weights/float(len(self.y)-1)
+        elif self.nfilters > 0:
+            self.sigma = np.sqrt(errorbudget**2 + self._sigma_data**2)
+            # upper limits have infinite errors and no chi-square weight
+            self._weights = self.norm[self.segment]/self.sigma**2
+
+    def set_errorbudget(self, errorbudget):
+        """Use another errorbudget, which only changes the errors, the
+        chi-square weights and the normalization"""
+        if errorbudget != self.errorbudget:
+            self._set_errors(errorbudget)
+
+    def model_mags(self, tmag, mag, t0):
+        """Model magnitude of every observation for a model shifted by t0"""
+        magfilt = lightcurve_utils.mix_mags(mag, self.filters)
+
+        tmodel = np.asarray(tmag, dtype=float) + t0
+        if not np.any(np.isnan(magfilt)):
+            # common case, all filters share the bracketing of the observation times
+            jj = np.clip(np.searchsorted(tmodel, self.t, side='right'), 1, len(tmodel)-1)
+            t0s, t1s = tmodel[jj-1], tmodel[jj]
+            y0, y1 = magfilt[self.segment, jj-1], magfilt[self.segment, jj]
+            maginterp = y0 + (y1 - y0)/(t1s - t0s)*(self.t - t0s)
+            if not self.doWaveformExtrapolate:
+                maginterp[(self.t < tmodel[0]) | (self.t > tmodel[-1])] = np.nan
+            return maginterp
+
+        tmodel = np.broadcast_to(tmodel, magfilt.shape)
+        maginterp = lightcurve_utils.interp_masked(self.tunique, tmodel, magfilt)
+        if not self.doWaveformExtrapolate:
+            valid = ~np.isnan(magfilt)
+            anyvalid = np.any(valid, axis=1)
+            tfirst = tmodel[0][np.argmax(valid, axis=1)]
+            tlast = tmodel[0][magfilt.shape[1]-1-np.argmax(valid[:,::-1], axis=1)]
+            outside = (self.tunique[np.newaxis,:] < tfirst[:,np.newaxis]) | (self.tunique[np.newaxis,:] > tlast[:,np.newaxis]) | ~anyvalid[:,np.newaxis]
+            maginterp[outside] = np.nan
+        return maginterp[self.segment, self.tindex]
+
+    def model_mags_shifted(self, tmag, mag, t0s):
+        """Model magnitudes (len(t0s), nobs) of every observation for the
+        model shifted by each t0 of an array"""
+        magfilt = lightcurve_utils.mix_mags(mag, self.filters)
+        tmag = np.asarray(tmag, dtype=float)
+        t0s = np.asarray(t0s, dtype=float)
+
+        if not np.any(np.isnan(magfilt)):
+            tq = self.t[np.newaxis,:] - t0s[:,np.newaxis]
+            jj = np.clip(np.searchsorted(tmag, tq, side='right'), 1, len(tmag)-1)
+            t0q, t1q = tmag[jj-1], tmag[jj]
+            y0, y1 = magfilt[self.segment, jj-1], magfilt[self.segment, jj]
+            maginterp = y0 + (y1 - y0)/(t1q - t0q)*(tq - t0q)
+            if not self.doWaveformExtrapolate:
+                maginterp[(tq < tmag[0]) | (tq > tmag[-1])] = np.nan
+            return maginterp
+
+        # one interpolation row per shift and filter
+        nshifts, nfilters = len(t0s), magfilt.shape[0]
+        tmodel = tmag[np.newaxis,:] + np.repeat(t0s, nfilters)[:,np.newaxis]
+        rows = np.tile(magfilt, (nshifts, 1))
+        maginterp = lightcurve_utils.interp_masked(self.tunique, tmodel, rows).reshape(nshifts, nfilters, -1)
+        if not self.doWaveformExtrapolate:
+            valid = ~np.isnan(magfilt)
+            anyvalid = np.any(valid, axis=1)
+            tfirst = tmag[np.argmax(valid, axis=1)][np.newaxis,:] + t0s[:,np.newaxis]
+            tlast = tmag[magfilt.shape[1]-1-np.argmax(valid[:,::-1], axis=1)][np.newaxis,:] + t0s[:,np.newaxis]
+            outside = (self.tunique < tfirst[:,:,np.newaxis]) | (self.tunique > tlast[:,:,np.newaxis]) | ~anyvalid[np.newaxis,:,np.newaxis]
+            maginterp[outside] = np.nan
+        return maginterp[:, self.segment, self.tindex]
+
+    def evaluate(self, tmag, lbol, mag, t0, zp):
+        """log-likelihood of calc_prob"""
+        if self.ZPRange is not None or self.T0Range is not None:
+            return self.evaluate_marginalized(tmag, lbol, mag, t0, zp)
+        if self.doLuminosity:
+            return self._evaluate_luminosity(tmag, lbol, t0, zp)
+
+        if len(np.isfinite(lbol)) == 0:
+            return -np.inf
+        if np.sum(lbol) == 0.0:
+            return -np.inf
+        if self.nfilters == 0:
+            chisquare = np.nan
+        else:
+            maginterp = self.model_mags(tmag, mag, t0) + zp
+            chisquarevals = ((self.y-maginterp)/self.sigma)**2
+            chisquaresums = np.bincount(self.segment, weights=chisquarevals, minlength=self.nfilters)
+            chisquare = np.sum(self.norm*chisquaresums)
+
+        if np.isnan(chisquare):
+            prob = -np.inf
+        else:
+            if np.any(self.upperlimit):
+                gaussprobvals = 1-ndtr((self.y[self.upperlimit]-maginterp[self.upperlimit])/self.errorbudget)
+                with np.errstate(divide='ignore'):
+                    gaussprob = np.sum(np.log(gaussprobvals))
+            else:
+                gaussprob = 0.0
+            if chisquare == 0:
+                chiprob = 0
+            else:
+                chiprob = _chi2_logpdf(chisquare)
+
+            prob = chiprob + gaussprob - (len(self.y)/2.0)*np.log(2.0*np.pi*self.errorbudget**2)
+        if np.isnan(prob):
+            prob = -np.inf
+        return prob
+
+    def evaluate_batch(self, tmag, lbol, mag, t0, zp):
+        """log-likelihoods of calc_prob of N models sharing tmag, with lbol
+        (N, nt), mag (N, 9, nt) and t0, zp (N,). Models without missing
+        magnitudes are interpolated onto the observations and compared to
+        them together, the others (and luminosities and marginalized
+        likelihoods) go through evaluate() one by one."""
+        lbol = np.asarray(lbol, dtype=float)
+        mag = np.asarray(mag, dtype=float)
+        t0 = np.broadcast_to(np.asarray(t0, dtype=float), (len(mag),))
+        zp = np.broadcast_to(np.asarray(zp, dtype=float), (len(mag),))
+        prob = np.empty(len(mag))
+        if len(mag) == 0:
+            return prob
+
+        if self.doLuminosity or self.ZPRange is not None or self.T0Range is not None or self.nfilters == 0:
+            together = np.zeros(len(mag), dtype=bool)
+        else:
+            magfilt = lightcurve_utils.mix_mags(mag, self.filters)
+            together = ~np.any(np.isnan(magfilt), axis=(1,2)) & (np.sum(lbol, axis=1) != 0.0)
+        for ii in np.where(~together)[0]:
+            prob[ii] = self.evaluate(tmag, lbol[ii], mag[ii], t0[ii], zp[ii])
+        if not np.any(together):
+            return prob
+
+        # the interpolation of model_mags, one row per model
+        magfilt = magfilt[together]
+        tmodel = np.asarray(tmag, dtype=float)[np.newaxis,:] + t0[together][:,np.newaxis]
+        jj = np.array([np.searchsorted(row, self.t, side='right') for row in tmodel])
+        jj = np.clip(jj, 1, tmodel.shape[1]-1)
+        rows = np.arange(len(tmodel))[:,np.newaxis]
+        t0s, t1s = tmodel[rows, jj-1], tmodel[rows, jj]
+        y0, y1 = magfilt[rows, self.segment, jj-1], magfilt[rows, self.segment, jj]
+        maginterp = y0 + (y1 - y0)/(t1s - t0s)*(self.t - t0s)
+        if not self.doWaveformExtrapolate:
+            maginterp[(self.t < tmodel[:,:1]) | (self.t > tmodel[:,-1:])] = np.nan
+        maginterp = maginterp + zp[together][:,np.newaxis]
+
+        chisquare = np.dot(((self.y-maginterp)/self.sigma)**2, self.norm[self.segment])
+        if np.any(self.upperlimit):
+            gaussprobvals = 1-ndtr((self.y[self.upperlimit]-maginterp[:,self.upperlimit])/self.errorbudget)
+            with np.errstate(divide='ignore'):
+                gaussprob = np.sum(np.log(gaussprobvals), axis=1)
+        else:
+            gaussprob = 0.0
+        chiprob = np.where(chisquare == 0, 0.0, _chi2_logpdf(chisquare))
+        probs = chiprob + gaussprob - (len(self.y)/2.0)*np.log(2.0*np.pi*self.errorbudget**2)
+        probs[np.isnan(chisquare) | np.isnan(probs)] = -np.inf
+        prob[together] = probs
+        return prob
+
+    def model_loglbol(self, tmag, lbol, t0):
+        """Model log10 luminosity at every observation for a model shifted by t0"""
+        return self.model_loglbol_shifted(tmag, lbol, [t0])[0]
+
+    def model_loglbol_shifted(self, tmag, lbol, t0s):
+        """Model log10 luminosities (len(t0s), nobs) of every observation for
+        the model shifted by each t0 of an array"""
+        lbol = np.asarray(lbol, dtype=float)
+        t0s = np.asarray(t0s, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loglbol = np.log10(lbol)
+        loglbol[np.isnan(lbol)] = np.nan
+        if len(self.t) == 0 or np.all(np.isnan(loglbol)):
+            return np.nan*np.ones((len(t0s),) + self.t.shape)
+        tmodel = np.asarray(tmag, dtype=float)[np.newaxis,:] + t0s[:,np.newaxis]
+        rows = np.broadcast_to(loglbol, tmodel.shape)
+        with np.errstate(invalid='ignore'):
+            return lightcurve_utils.interp_masked(self.t, tmodel, rows)
+
+    def _evaluate_luminosity(self, tmag, lbol, t0, zp):
+        if self.rejects(lbol):
+            return -np.inf
+
+        lbolinterp = self.model_loglbol(tmag, lbol, t0) + zp/-2.5
+
+        chisquarevals = ((self.y-lbolinterp)/self.sigma)**2
+        chisquare = np.sum(chisquarevals)
+        if np.isnan(chisquare):
+            return np.nan
+        if not float(len(chisquarevals)-1) == 0:
+            chisquare = (1/float(len(chisquarevals)-1))*chisquare
+
+        prob = _chi2_logpdf(chisquare)
+        if np.isnan(prob):
+            prob = -np.inf
+        return prob
+
+    def rejects(self, lbol):
+        """Whether calc_prob rejects a model before comparing it to the data"""
+        if self.doLuminosity:
+            # no observed luminosity at all leaves nothing to compare
+            return len(self.t) == 0 or np.sum(lbol) == 0.0
+        return len(np.isfinite(lbol)) == 0 or np.sum(lbol) == 0.0 or self.nfilters == 0
+
+    def _log_upperlimits(self, modelvals, zp):
+        """Upper limit term of the log-likelihood of (S, nobs) model values
+        for an (S, K) array of zp"""
+        if self.doLuminosity or not np.any(self.upperlimit):
+            return np.zeros(np.shape(zp))
+        residuals = self.y[self.upperlimit] - modelvals[:,self.upperlimit]
+        # log(1 - ndtr(x)) without underflow far below the limits
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sum(log_ndtr((zp[:,:,np.newaxis] - residuals[:,np.newaxis,:])/self.errorbudget), axis=2)
+
+    def _zp_peak(self, A, B, limits, niter=30):
+        """Peak in [-ZPRange, ZPRange] and width of exp(-chisquare/2) times
+        the upper limit terms, for the (S,) chi-square coefficients of
+        _log_zp_marginal and (S, nlimits) zp of the upper limit steps"""
+        errorbudget = max(self.errorbudget, 1e-12)
+        zp = np.clip(B/A if A > 0 else np.zeros(len(limits)), -self.ZPRange, self.ZPRange)
+        for ii in range(niter + 1):
+            x = (zp[:,np.newaxis] - limits)/errorbudget
+            # d/dx log(ndtr(x)) and its derivative
+            mills = np.exp(-0.5*x**2 - 0.5*np.log(2.0*np.pi) - log_ndtr(x))
+            grad = -(A*zp - B) + np.sum(mills, axis=1)/errorbudget
+            # no wider than the prior, which also keeps a flat integrand finite
+            curv = np.maximum(A + np.sum(mills*(x + mills), axis=1)/errorbudget**2, 0.25/self.ZPRange**2)
+            if ii < niter:
+                zp = np.clip(zp + grad/curv, -self.ZPRange, self.ZPRange)
+        # a peak at the edge of the prior is as wide as the slope there allows
+        with np.errstate(divide='ignore'):
+            return zp, np.minimum(1.0/np.sqrt(curv), 1.0/np.abs(grad))
+
+    def _gauss_legendre_pieces(self, breaks):
+        """Nodes and log weights (S, pieces*nodes) of Gauss-Legendre rules on
+        the pieces between the sorted (S, pieces+1) breaks"""
+        lo, hi = breaks[:,:-1,np.newaxis], breaks[:,1:,np.newaxis]
+        nodes = lo + 0.5*(hi - lo)*(self._gl_nodes + 1)
+        with np.errstate(divide='ignore'):
+            logw = np.log(0.5*(hi - lo)*self._gl_weights)
+        return nodes.reshape(len(breaks), -1), logw.reshape(len(breaks), -1)
+
+    def _loglike_values(self, modelvals, zp):
+        """log-likelihood of (S, nobs) model values for a given zp"""
+        residuals = self.y - modelvals - self._k*zp
+        chisquare = np.dot(residuals**2, self._weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prob = _chi2_logpdf(chisquare)
+        if not self.doLuminosity:
+            prob[chisquare == 0] = 0.0
+            prob = prob + self._log_upperlimits(modelvals, np.full((len(modelvals), 1), zp))[:,0]
+            prob = prob - (len(self.y)/2.0)*np.log(2.0*np.pi*self.errorbudget**2)
+        prob[np.isnan(prob)] = -np.inf
+        return prob, None, None
+
+    def _log_zp_marginal(self, modelvals):
+        """log-likelihood of (S, nobs) model values averaged over zp, with the
+        (S, K) zp nodes and log integrand of the zp integral"""
+        ZPRange = self.ZPRange
+        k, weights = self._k, self._weights
+        residuals = self.y - modelvals
+        nshifts = len(modelvals)
+
+        # chisquare(zp) = A*zp**2 - 2*B*zp + C
+        A = k**2*np.sum(weights)
+        B = k*np.dot(residuals, weights)
+        C = np.dot(residuals**2, weights)
+        # the steps of the upper limits in zp, and the peak of the integrand
+        if not self.doLuminosity and np.any(self.upperlimit):
+            limits = self.y[self.upperlimit] - modelvals[:,self.upperlimit]
+            steps = (limits[:,:,np.newaxis] + self.errorbudget*self.ZP_UL_BREAKS).reshape(nshifts, -1)
+            peak, width = self._zp_peak(A, B, limits)
+            steps = np.concatenate((steps, peak[:,np.newaxis] + width[:,np.newaxis]*self.ZP_PEAK_BREAKS), axis=1)
+            lo, hi = np.min(steps, axis=1), np.max(steps, axis=1)
+        else:
+            steps = np.empty((nshifts, 0))
+            lo, hi = np.full(nshifts, np.inf), np.full(nshifts, -np.inf)
+
+        if A > 0:
+            # chisquare = q0 + u**2 with u = sqrt(A)*(zp - mu); u = sqrt(q0)*sinh(t)
+            # turns chi2.logpdf(chisquare)*dzp into exp(-q0*cosh(t)**2/2)*dt/sqrt(2 pi A)
+            mu = B/A
+            q0 = np.maximum(C - B*mu, 1e-12)
+            # upper limits can move the peak far from the best zp
+            ua = np.maximum(np.sqrt(A)*(-ZPRange - mu), np.minimum(np.sqrt(A)*(lo - mu), -self.ZP_UMAX))
+            ub = np.minimum(np.sqrt(A)*(ZPRange - mu), np.maximum(np.sqrt(A)*(hi - mu), self.ZP_UMAX))
+            # rows whose best zp is far outside the prior range do not count
+            ub = np.maximum(ua, ub)
+            breaks = np.concatenate((np.tile(self.ZP_CHI2_BREAKS, (nshifts, 1)),
+                                     np.sqrt(A)*(steps - mu[:,np.newaxis])), axis=1)
+            breaks = np.clip(breaks, ua[:,np.newaxis], ub[:,np.newaxis])
+            breaks = np.sort(np.concatenate((ua[:,np.newaxis], breaks, ub[:,np.newaxis]), axis=1), axis=1)
+            t, logw = self._gauss_legendre_pieces(np.arcsinh(breaks/np.sqrt(q0)[:,np.newaxis]))
+            logw = logw - 0.5*q0[:,np.newaxis]*np.cosh(t)**2 - 0.5*np.log(2.0*np.pi*A)
+            zp = mu[:,np.newaxis] + np.sqrt(q0/A)[:,np.newaxis]*np.sinh(t)
+        else:
+            # only upper limits, whose chi-square vanishes
+            breaks = np.clip(steps, -ZPRange, ZPRange)
+            breaks = np.sort(np.concatenate((np.full((nshifts, 1), -ZPRange), breaks, np.full((nshifts, 1), ZPRange)), axis=1), axis=1)
+            zp, logw = self._gauss_legendre_pieces(breaks)
+        logw = logw + self._log_upperlimits(modelvals, zp)
+        logw[np.isnan(logw)] = -np.inf
+
+        prob = logsumexp(logw, axis=1) - np.log(2.0*ZPRange)
+        if not self.doLuminosity:
+            prob = prob - (len(self.y)/2.0)*np.log(2.0*np.pi*self.errorbudget**2)
+        prob[np.isnan(prob)] = -np.inf
+        return prob, zp, logw
+
+    def t0_shifts(self, tmag, mag):
+        """Shifts of the t0 integral over [-T0Range, T0Range], clipped to
+        where the model covers every observation unless it is extrapolated
+        (empty if it never does)"""
+        tmag = np.asarray(tmag, dtype=float)
+        lo, hi = -self.T0Range, self.T0Range
+        if not self.doLuminosity and not self.doWaveformExtrapolate:
+            magfilt = lightcurve_utils.mix_mags(mag, self.filters)
+            valid = ~np.isnan(magfilt)
+            if not np.all(np.any(valid, axis=1)):
+                return np.empty(0)
+            tfirst = tmag[np.argmax(valid, axis=1)]
+            tlast = tmag[magfilt.shape[1]-1-np.argmax(valid[:,::-1], axis=1)]
+            tobsmin = np.full(self.nfilters, np.inf)
+            tobsmax = np.full(self.nfilters, -np.inf)
+            np.minimum.at(tobsmin, self.segment, self.t)
+            np.maximum.at(tobsmax, self.segment, self.t)
+            # slightly inside, so that round-off does not drop the end shifts
+            margin = 1e-9*(tmag[-1] - tmag[0])
+            lo = max(lo, np.max(tobsmax - tlast) + margin)
+            hi = min(hi, np.min(tobsmin - tfirst) - margin)
+        if lo > hi:
+            return np.empty(0)
+        dt = (tmag[-1] - tmag[0])/max(len(tmag) - 1, 1)/self.T0_SUBSTEPS
+        npoints = int(np.clip(np.ceil((hi - lo)/dt) + 1, self.T0_MIN_NPOINTS, self.T0_MAX_NPOINTS))
+        return np.linspace(lo, hi, npoints)
+
+    def evaluate_marginalized(self, tmag, lbol, mag, t0, zp):
+        """log-likelihood averaged over flat priors on t0 in [-T0Range,
+        T0Range] and zp in [-ZPRange, ZPRange], for those of T0Range and
+        ZPRange given (a zero range fixes the parameter to 0)"""
+        self.last_nuisance = None
+        if self.rejects(lbol):
+            return -np.inf
+
+        doT0 = self.T0Range is not None and self.T0Range > 0
+        doZP = self.ZPRange is not None and self.ZPRange > 0
+        if self.T0Range is not None:
+            t0 = 0.0
+        if self.ZPRange is not None:
+            zp = 0.0
+
+        if doT0:
+            t0s = self.t0_shifts(tmag, mag)
+            if len(t0s) == 0:
+                return -np.inf
+        else:
+            t0s = np.array([t0], dtype=float)
+        prob, zpnodes, zplogw = self._shift_loglike(tmag, lbol, mag, t0s, zp, doZP)
+
+        if doT0:
+            t0s, prob, zpnodes, zplogw = self._refine_t0(tmag, lbol, mag, t0s, prob, zpnodes, zplogw, doZP)
+            logw = prob
+            prob = self._log_trapezoid(t0s, prob) - np.log(2.0*self.T0Range)
+        else:
+            logw = prob
+            prob = prob[0]
+        if not np.isfinite(prob):
+            return -np.inf
+        self.last_nuisance = (t0s if doT0 else None, logw, zpnodes, zplogw)
+        return prob
+
+    def _shift_loglike(self, tmag, lbol, mag, t0s, zp, doZP):
+        """log-likelihood of the model shifted by each t0 of an array, with
+        the zp nodes and log integrand of the zp integral (None unless
+        doZP)"""
+        if self.doLuminosity:
+            modelvals = self.model_loglbol_shifted(tmag, lbol, t0s)
+        else:
+            modelvals = self.model_mags_shifted(tmag, mag, t0s)
+        invalid = np.any(np.isnan(modelvals), axis=1)
+        modelvals[invalid] = 0.0
+
+        if doZP:
+            prob, zpnodes, zplogw = self._log_zp_marginal(modelvals)
+        else:
+            prob, zpnodes, zplogw = self._loglike_values(modelvals, zp)
+        prob[invalid] = -np.inf
+        return prob, zpnodes, zplogw
+
+    @staticmethod
+    def _log_trapezoid(t0s, prob):
+        """log of the trapezoidal rule of exp(prob) over the sorted t0s"""
+        with np.errstate(divide='ignore'):
+            logdt = np.log(np.diff(t0s))
+        return logsumexp(np.logaddexp(prob[1:], prob[:-1]) + logdt) - np.log(2.0)
+
+    def _refine_t0(self, tmag, lbol, mag, t0s, prob, zpnodes, zplogw, doZP):
+        """Halve the spacing of the shifts where the likelihood is within
+        T0_REFINE_DLOGL of its peak, which can be narrower than the model
+        time step, until the t0 integral changes by less than T0_REFINE_TOL"""
+        integral = self._log_trapezoid(t0s, prob)
+        for level in range(self.T0_REFINE_LEVELS):
+            if not np.isfinite(integral):
+                break
+            # intervals near the peak across or next to which the
+            # log-likelihood changes too much for the trapezoidal rule
+            with np.errstate(invalid='ignore'):
+                step = np.abs(np.diff(prob))
+            step[np.isnan(step)] = np.inf
+            step = np.maximum(step, np.maximum(np.concatenate(([0.0], step[:-1])), np.concatenate((step[1:], [0.0]))))
+            refine = (np.maximum(prob[1:], prob[:-1]) > np.max(prob) - self.T0_REFINE_DLOGL) & (step > self.T0_REFINE_STEP)
+            if not np.any(refine):
+                break
+            t0new = 0.5*(t0s[1:] + t0s[:-1])[refine]
+            probnew, zpnew, zplogwnew = self._shift_loglike(tmag, lbol, mag, t0new, 0.0, doZP)
+            order = np.argsort(np.concatenate((t0s, t0new)), kind='mergesort')
+            t0s = np.concatenate((t0s, t0new))[order]
+            prob = np.concatenate((prob, probnew))[order]
+            if doZP:
+                zpnodes = np.concatenate((zpnodes, zpnew))[order]
+                zplogw = np.concatenate((zplogw, zplogwnew))[order]
+            previous, integral = integral, self._log_trapezoid(t0s, prob)
+            if abs(integral - previous) < self.T0_REFINE_TOL:
+                break
+        return t0s, prob, zpnodes, zplogw
+
+    def sample_nuisance(self, random_state=None):
+        """(t0, zp) drawn from their distribution given the last evaluated
+        model, None for a parameter that is not marginalized"""
+        rng = np.random.mtrand._rand if random_state is None else random_state
+        doT0 = self.T0Range is not None
+        doZP = self.ZPRange is not None
+        if self.last_nuisance is None:
+            # nothing evaluated, draw from the priors
+            t0 = self.T0Range*(2*rng.uniform() - 1) if doT0 else None
+            zp = self.ZPRange*(2*rng.uniform() - 1) if doZP else None
+            return t0, zp
+
+        t0s, t0logw, zpnodes, zplogw = self.last_nuisance
+        ishift = 0
+        t0 = 0.0 if doT0 else None
+        if t0s is not None:
+            # piecewise linear density between the shifts
+            density = np.exp(t0logw - np.max(t0logw))
+            cdf = np.concatenate(([0.0], np.cumsum(0.5*(density[1:] + density[:-1])*np.diff(t0s))))
+            t0 = np.interp(rng.uniform()*cdf[-1], cdf, t0s)
+            ishift = np.argmin(np.abs(t0s - t0))
+        zp = 0.0 if doZP else None
+        if zpnodes is not None:
+            # each node holds the weight around it, half on either side
+            weights = np.exp(zplogw[ishift] - np.max(zplogw[ishift]))
+            cdf = np.cumsum(weights) - 0.5*weights
+            zp = np.interp(rng.uniform()*np.sum(weights), cdf, zpnodes[ishift])
+        return t0, zp
+
+# the plan of the current Global settings, rebuilt when they change
+_PLAN = {'key': None, 'plan': None}
+
+# Likelihood objects currently evaluating, innermost last
+_ACTIVE = []
+
+# held while a Likelihood has its settings installed in Global, which the
+# threads of a process share
+_ACTIVE_LOCK = threading.RLock()
+
+def get_likelihood_plan(errorbudget=None):
+    """LikelihoodPlan of Global.data_out and the Global likelihood settings,
+    or of the Likelihood object currently evaluating"""
+    if errorbudget is None:
+        errorbudget = Global.errorbudget
+    if _ACTIVE:
+        # kept for insert_marginalized, which needs the plan calc_prob used
+        plan = _ACTIVE[-1].get_plan(errorbudget)
+        _ACTIVE[-1].last_plan = plan
+        return plan
+    doLuminosity = bool(Global.doLuminosity)
+    ZPRange = Global.ZPRange if Global.doMarginalizeZP else None
+    T0Range = Global.T0Range if Global.doMarginalizeT0 else None
+    key = (id(Global.data_out), doLuminosity, bool(Global.doLightcurves),
+           tuple(Global.filters) if not doLuminosity and Global.filters else None,
+           bool(Global.doWaveformExtrapolate), ZPRange, T0Range)
+    if _PLAN['key'] == key:
+        _PLAN['plan'].set_errorbudget(errorbudget)
+    else:
+        _PLAN['plan'] = LikelihoodPlan(Global.data_out, filters=Global.filters,
+                                       doLuminosity=doLuminosity,
+                                       doWaveformExtrapolate=bool(Global.doWaveformExtrapolate),
+                                       errorbudget=errorbudget, ZPRange=ZPRange, T0Range=T0Range)
+        _PLAN['key'] = key
+    return _PLAN['plan']
+
+class Likelihood(object):
+    """
+    Self-contained fit problem: the log-likelihood and prior transform of a
+    model (myloglike_<model> and myprior_<model> by default) together with
+    the data and settings they read from Global (data_out, filters,
+    errorbudget, ZPRange, T0Range, the SVD models, ...).
+
+    The settings are taken from Global when the object is created, updated
+    by the keyword arguments, and installed in Global only while the object
+    evaluates, so several fits can share a process. The model functions
+    read them from Global, so Likelihood objects are process-safe but not
+    thread-safe: activate() holds a lock, and Likelihood objects in
+    threads of one process take turns (a sampler run holds it throughout).
+    Fits run in parallel in separate processes. Likelihood objects are
+    picklable and can be shipped to worker processes without re-running the
+    script setup.
+
+    With doMarginalizeT0 / doMarginalizeZP the t0 / zp parameter (which
+    must be among parameters) is not sampled: points have ndim entries less
+    the marginalized ones, the likelihood is marginalized over them and
+    insert_marginalized() draws them for posterior samples afterwards.
+
+    A Prior of sampler.prior transforms whole batches of points at once and
+    provides the parameter names when parameters is not given. batch()
+    likewise evaluates all of its points in one call of loglike_batch
+    (myloglike_<model>_batch, defined for the Ka2017 surrogate fits), and
+    point by point for models without one.
+
+    >>> like = Likelihood('Ka2017', data_out=data_out, filters=['g','r'])
+    >>> theta = like.prior_transform(np.random.rand(like.ndim))
+    >>> like(theta), like.batch([theta, theta])
+    """
+
+    def __init__(self, model, loglike=None, prior=None, parameters=None, ndim=None, loglike_batch=None, **settings):
+        from . import loglike as loglike_module, prior as prior_module
+        if loglike is None:
+            loglike = getattr(loglike_module, 'myloglike_%s' % model)
+        if loglike_batch is None and loglike is getattr(loglike_module, 'myloglike_%s' % model, None):
+            loglike_batch = getattr(loglike_module, 'myloglike_%s_batch' % model, None)
+        if prior is None:
+            prior = getattr(prior_module, 'myprior_%s' % model, None)
+
+        if parameters is None and isinstance(prior, Prior):
+            parameters = prior.names
+
+        self.model = model
+        self.loglike = loglike
+        self.loglike_batch = loglike_batch
+        self.prior = prior
+        self.parameters = parameters
+
+        self.settings = Global.get_settings()
+        unknown = set(settings) - set(Global.SETTINGS)
+        if unknown:
+            raise TypeError('unknown settings %s' % ', '.join(sorted(unknown)))
+        self.settings.update(settings)
+        self._plan = None
+        self.last_plan = None
+
+        # nparams parameters of the myloglike / myprior layout, ndim sampled
+        if ndim is None and parameters is not None:
+            ndim = len(parameters)
+        self.nparams = ndim
+        # indices of the marginalized parameters in that layout
+        self.marginalized = []
+        for name, setting in [('t0', 'doMarginalizeT0'), ('zp', 'doMarginalizeZP')]:
+            if self.settings[setting]:
+                if parameters is None or name not in parameters:
+                    raise ValueError('%s needs parameters including %s' % (setting, name))
+                self.marginalized.append(list(parameters).index(name))
+        self.marginalized.sort()
+        if ndim is not None:
+            ndim = ndim - len(self.marginalized)
+        self.ndim = ndim
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the plan is rebuilt on first use
+        state['_plan'] = None
+        state['last_plan'] = None
+        return state
+
+    def get_plan(self, errorbudget=None):
+        """LikelihoodPlan of the data and settings of this object, built
+        once and switched to errorbudget (the errorbudget setting by
+        default)"""
+        if errorbudget is None:
+            errorbudget = self.settings['errorbudget']
+        if self._plan is None:
+            settings = self.settings
+            doLuminosity = bool(settings['doLuminosity'])
+            ZPRange = settings['ZPRange'] if settings['doMarginalizeZP'] else None
+            T0Range = settings['T0Range'] if settings['doMarginalizeT0'] else None
+            self._plan = LikelihoodPlan(settings['data_out'], filters=settings['filters'],
+                                        doLuminosity=doLuminosity,
+                                        doWaveformExtrapolate=bool(settings['doWaveformExtrapolate']),
+                                        errorbudget=errorbudget, ZPRange=ZPRange, T0Range=T0Range)
+        else:
+            self._plan.set_errorbudget(errorbudget)
+        return self._plan
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Install the settings of this object in Global for a with block,
+        holding _ACTIVE_LOCK so that other threads wait for it to end"""
+        with _ACTIVE_LOCK:
+            with Global.use(self.settings):
+                _ACTIVE.append(self)
+                try:
+                    yield self
+                finally:
+                    _ACTIVE.pop()
+
+    def _expand(self, x, value):
+        """Points in the layout of myloglike / myprior, with the
+        marginalized parameters set to value"""
+        if not self.marginalized:
+            return x
+        positions = [index - ii for ii, index in enumerate(self.marginalized)]
+        return np.insert(x, positions, value, axis=-1)
+
+    def _nparams(self, x):
+        if self.nparams is not None:
+            return self.nparams
+        return len(x)
+
+    def _loglike(self, theta, nparams):
+        """myloglike_* of a point in its layout, counted by the telemetry"""
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return self.loglike(theta, nparams, nparams)
+        evaluations = telemetry.evaluations
+        prob = self.loglike(theta, nparams, nparams)
+        if evaluations == telemetry.evaluations and not prob > -np.inf:
+            # rejected before the model was compared to the data
+            telemetry.reject('prior')
+        telemetry.count()
+        return prob
+
+    def __call__(self, theta):
+        """log-likelihood of one point of the (prior transformed) parameters"""
+        theta = self._expand(np.array(theta, dtype=float), 0.0)
+        nparams = self._nparams(theta)
+        with self.activate():
+            return self._loglike(theta, nparams)
+
+    def _loglike_batch(self, thetas, nparams):
+        """myloglike_*_batch of an (N, nparams) array of points, counted by
+        the telemetry"""
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return self.loglike_batch(thetas, nparams, nparams)
+        evaluations = telemetry.evaluations
+        logl = self.loglike_batch(thetas, nparams, nparams)
+        # the points rejected before their models were compared to the data
+        for ii in range(len(thetas) - (telemetry.evaluations - evaluations)):
+            telemetry.reject('prior')
+        telemetry.count(len(thetas))
+        return logl
+
+    def batch(self, thetas):
+        """log-likelihood of each row of an (N, ndim) array of parameters,
+        in one call of the myloglike_*_batch of the model if there is one
+        (which evaluates the surrogate models for all points at once)"""
+        thetas = self._expand(np.atleast_2d(np.array(thetas, dtype=float)), 0.0)
+        nparams = self._nparams(thetas[0])
+        with self.activate():
+            if self.loglike_batch is not None:
+                return np.asarray(self._loglike_batch(thetas, nparams), dtype=float)
+            logl = np.empty(len(thetas))
+            for ii, theta in enumerate(thetas):
+                logl[ii] = self._loglike(theta, nparams)
+        return logl
+
+    def prior_transform(self, cube):
+        """Parameters of a point (or an (N, ndim) array of points) of the
+        unit hypercube"""
+        if self.prior is None:
+            raise ValueError('no prior transform for model %s' % self.model)
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            start = time.time()
+        cube = np.array(cube, dtype=float)
+        points = self._expand(np.atleast_2d(cube), 0.5)
+        nparams = self._nparams(points[0])
+        with self.activate():
+            if isinstance(self.prior, Prior):
+                points = self.prior.transform(points)
+            else:
+                for point in points:
+                    self.prior(point, nparams, nparams)
+        if telemetry.enabled:
+            telemetry.add_time('prior', time.time() - start)
+        if self.marginalized:
+            points = np.delete(points, self.marginalized, axis=1)
+        return points.reshape(cube.shape)
+
+    def multinest_loglike(self, cube, ndim, nparams):
+        """myloglike_* callback for pymultinest, run under activate()"""
+        if not self.marginalized:
+            return self._loglike(cube, nparams)
+        theta = self._expand(np.array([cube[ii] for ii in range(ndim)]), 0.0)
+        return self._loglike(theta, self.nparams)
+
+    def multinest_prior(self, cube, ndim, nparams):
+        """myprior_* callback for pymultinest, run under activate()"""
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            start = time.time()
+        if not self.marginalized:
+            self.prior(cube, ndim, nparams)
+        else:
+            point = self._expand(np.array([cube[ii] for ii in range(ndim)]), 0.5)
+            self.prior(point, self.nparams, self.nparams)
+            for ii, value in enumerate(np.delete(point, self.marginalized)):
+                cube[ii] = value
+        if telemetry.enabled:
+            telemetry.add_time('prior', time.time() - start)
+
+    def insert_marginalized(self, samples, seed=None):
+        """Posterior samples (N, ndim) with columns of the marginalized t0
+        and zp drawn from their distribution given the other parameters of
+        each sample, in the layout of parameters"""
+        samples = np.atleast_2d(np.array(samples, dtype=float))
+        if not self.marginalized:
+            return samples
+        rng = np.random.RandomState(seed)
+        full = self._expand(samples, 0.0)
+        t0_index = self.parameters.index('t0') if self.settings['doMarginalizeT0'] else None
+        zp_index = self.parameters.index('zp') if self.settings['doMarginalizeZP'] else None
+        with self.activate():
+            for theta in full:
+                self.get_plan().last_nuisance = None
+                self.last_plan = None
+                self.loglike(theta.copy(), self.nparams, self.nparams)
+                # the plan of the errorbudget this sample was evaluated with,
+                # or the priors if the model was rejected before calc_prob
+                plan = self.last_plan if self.last_plan is not None else self.get_plan()
+                t0, zp = plan.sample_nuisance(random_state=rng)
+                if t0_index is not None:
+                    theta[t0_index] = t0
+                if zp_index is not None:
+                    theta[zp_index] = zp
+        return full
@@ -4,6 +4,9 @@ import scipy.stats
 from scipy.interpolate import interpolate as interp
 from gwemlightcurves import lightcurve_utils, Global
 from .model import *
+from .likelihood import get_likelihood_plan
+from .telemetry import get_telemetry
+import time
 
 def prior_2Component(Xlan1,Xlan2):
     if Xlan1 < Xlan2:
@@ -125,7 +128,17 @@ def myloglike_Ka2017_ejecta(cube, ndim, nparams):
     tmag, lbol, mag = Ka2017_model_ejecta(mej,vej,Xlan)
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
-    print(prob)
+    return prob
+
+def myloglike_Ka2017_ejecta_batch(cubes, ndim, nparams):
+    t0 = cubes[:,0]
+    mej = 10**cubes[:,1]
+    vej = cubes[:,2]
+    Xlan = 10**cubes[:,3]
+    zp = cubes[:,4]
+
+    tmag, lbol, mag = Ka2017_model_ejecta_batch(mej,vej,Xlan)
+    prob = calc_prob_batch(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
     return prob
 
@@ -140,8 +153,6 @@ def myloglike_Ka2017inc_ejecta(cube, ndim, nparams):
     tmag, lbol, mag = Ka2017inc_model_ejecta(mej,vej,Xlan,iota)
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
-    print(prob)
-
     return prob
 
 def myloglike_Ka2017_A_ejecta(cube, ndim, nparams):
@@ -181,6 +192,22 @@ def myloglike_Ka2017x2_ejecta(cube, ndim, nparams):
 
     return prob
 
+def myloglike_Ka2017x2_ejecta_batch(cubes, ndim, nparams):
+    t0 = cubes[:,0]
+    mej = 10**cubes[:,[1,4]]
+    vej = cubes[:,[2,5]]
+    Xlan = 10**cubes[:,[3,6]]
+    zp = cubes[:,7]
+
+    prob = np.full(len(cubes), -np.inf)
+    keep = np.array([prior_2Component(*Xlan[ii]) != 0.0 and prior_2ComponentVel(*vej[ii]) != 0.0
+                     for ii in range(len(cubes))], dtype=bool)
+    if np.any(keep):
+        tmag, lbol, mag = Ka2017xN_model_ejecta_batch(mej[keep],vej[keep],Xlan[keep])
+        prob[keep] = calc_prob_batch(tmag, lbol, mag, t0[keep], zp[keep], errorbudget = Global.errorbudget)
+
+    return prob
+
 def myloglike_Ka2017x2inc_ejecta(cube, ndim, nparams):
     t0 = cube[0]
     mej_1 = 10**cube[1]
@@ -203,8 +230,6 @@ def myloglike_Ka2017x2inc_ejecta(cube, ndim, nparams):
     tmag, lbol, mag = Ka2017x2inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,iota)
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
-    print(prob)
-
     return prob
 
 def myloglike_Ka2017x3inc_ejecta(cube, ndim, nparams):
@@ -232,8 +257,6 @@ def myloglike_Ka2017x3inc_ejecta(cube, ndim, nparams):
     tmag, lbol, mag = Ka2017x3inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,mej_3,vej_3,Xlan_3,iota)
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
-    print(prob)
-
     return prob
 
 def myloglike_Ka2017x2_ejecta_sigma(cube, ndim, nparams):
@@ -278,6 +301,18 @@ def myloglike_Ka2017x3_ejecta(cube, ndim, nparams):
 
     return prob
 
+def myloglike_Ka2017x3_ejecta_batch(cubes, ndim, nparams):
+    t0 = cubes[:,0]
+    mej = 10**cubes[:,[1,4,7]]
+    vej = cubes[:,[2,5,8]]
+    Xlan = 10**cubes[:,[3,6,9]]
+    zp = cubes[:,10]
+
+    tmag, lbol, mag = Ka2017xN_model_ejecta_batch(mej,vej,Xlan)
+    prob = calc_prob_batch(tmag, lbol, mag, t0, zp)
+
+    return prob
+
 def myloglike_Ka2017_BNSFit(cube, ndim, nparams):
 
     t0 = cube[0]
@@ -397,8 +432,6 @@ def myloglike_Me2017_ejecta(cube, ndim, nparams):
 
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
 
-    print(prob)
-
     return prob
 
 def myloglike_Me2017_A_ejecta(cube, ndim, nparams):
@@ -771,7 +804,6 @@ def myloglike_Ka2017_TrPi2018(cube, ndim, nparams):
     tmag, lbol, mag = Ka2017_TrPi2018_model(mej, vej, Xlan, theta_v, E0, theta_c, theta_w, n, p, epsilon_E, epsilon_B)
 
     prob = calc_prob(tmag, lbol, mag, t0, zp, errorbudget = Global.errorbudget)
-    print(prob)
 
     return prob
 
@@ -800,171 +832,47 @@ def myloglike_Ka2017_TrPi2018_A(cube, ndim, nparams):
 
 def calc_prob(tmag, lbol, mag, t0, zp, errorbudget=Global.errorbudget):
 
-    if Global.doLuminosity:
-        if np.sum(lbol) == 0.0:
-            prob = -np.inf
-            return prob
-        tmag = tmag + t0
-
-        count = 0
-        chisquare = np.nan
-
-        t = Global.data_out["tt"]
-        y = Global.data_out["Lbol"]
-        sigma_y = Global.data_out["Lbol_err"]
-
-        idx = np.where(~np.isnan(y))[0]
-        t = t[idx]
-        y = y[idx]
-        sigma_y = sigma_y[idx]
-
-        ii = np.where(~np.isnan(lbol))[0]
-        if len(ii) == 0:
-            lbolinterp = np.nan*np.ones(t.shape)
-        else:
-            f = interp.interp1d(tmag[ii], np.log10(lbol[ii]), fill_value='extrapolate')
-            lbolinterp = 10**f(t)
-
-        zp_factor = 10**(zp/-2.5)
-        lbolinterp = lbolinterp*zp_factor
-
-        sigma_y = np.abs(sigma_y/(y*np.log(10)))
-        sigma = np.sqrt((np.log10(1+errorbudget))**2 + sigma_y**2)
-        y = np.log10(y)
-        lbolinterp = np.log10(lbolinterp)
-
-        chisquarevals = ((y-lbolinterp)/sigma)**2
-
-        chisquaresum = np.sum(chisquarevals)
-        if np.isnan(chisquaresum):
-            chisquare = np.nan
-            return chisquare
-
-        if not float(len(chisquarevals)-1) == 0:
-            chisquaresum = (1/float(len(chisquarevals)-1))*chisquaresum
-
-        chisquare = chisquaresum
-
-        if np.isnan(chisquare):
-            prob = -np.inf
-        else:
-            #prob = scipy.stats.chi2.logpdf(chisquare, count, loc=0, scale=1)
-            #prob = -chisquare/2.0
-            #prob = chisquare
-            prob = scipy.stats.chi2.logpdf(chisquare, 1, loc=0, scale=1)
-
-        if np.isnan(prob):
-            prob = -np.inf
-
-        #if np.isfinite(prob):
-        #    print t0, zp, prob
-        return prob
-
-    elif Global.doLightcurves:
-        if len(np.isfinite(lbol)) == 0:
-            prob = -np.inf
-            return prob
-
-        if np.sum(lbol) == 0.0:
-            prob = -np.inf
-            return prob
-        tmag = tmag + t0
-
-        count = 0
-        chisquare = np.nan
-        gaussprob = np.nan
-        nsamples = 0
-
-        for key in Global.data_out:
-            samples = Global.data_out[key]
-            t = samples[:,0]
-            y = samples[:,1]
-            sigma_y = samples[:,2]
-
-            idx = np.where(~np.isnan(y))[0]
-            t = t[idx]
-            y = y[idx]
-            sigma_y = sigma_y[idx]
-            if len(idx) == 0: continue
-            if not key in Global.filters: continue
-
-            keyslist = ["u","g","r","i","z","y","J","H","K"]
-
-            if key in keyslist:
-                idx = keyslist.index(key)
-                ii = np.where(np.isfinite(mag[idx]))[0]
-                if len(ii) == 0:
-                    maginterp = np.nan*np.ones(t.shape)
-                else:
-                    if Global.doWaveformExtrapolate:
-                        f = interp.interp1d(tmag[ii], mag[idx][ii], fill_value='extrapolate')
-                    else:
-                        f = interp.interp1d(tmag[ii], mag[idx][ii], fill_value=np.nan, bounds_error = False)
-                    maginterp = f(t)
-            elif key in ["w","c","o","V","B","R","I","F606W","F160W","F814W","U","UVW2","UVW1","UVM2"]:
-                magave = lightcurve_utils.get_mag(mag,key)
-
-                ii = np.where(np.isfinite(magave))[0]
-                if len(ii) == 0:
-                    maginterp = np.nan*np.ones(t.shape)
-                else:
-                    if Global.doWaveformExtrapolate:                    
-                        f = interp.interp1d(tmag[ii], magave[ii], fill_value='extrapolate')
-                    else:
-                        f = interp.interp1d(tmag[ii], magave[ii], fill_value=np.nan, bounds_error = False)
-                    maginterp = f(t)
+    # the observations are flattened once into a LikelihoodPlan, rebuilt
+    # only when Global.data_out or the likelihood settings change
+    if Global.doLuminosity or Global.doLightcurves:
+        plan = get_likelihood_plan(errorbudget=errorbudget)
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return plan.evaluate(tmag, lbol, mag, t0, zp)
+
+        start = time.time()
+        prob = plan.evaluate(tmag, lbol, mag, t0, zp)
+        telemetry.add_time('likelihood', time.time() - start)
+        telemetry.evaluations += 1
+        if not prob > -np.inf:
+            if plan.rejects(lbol):
+                telemetry.reject('empty_model')
             else:
-                continue
-
-            maginterp = maginterp + zp
-            sigma = np.sqrt(errorbudget**2 + sigma_y**2)
-
-            chisquarevals = np.zeros(y.shape)
-            chisquarevals = ((y-maginterp)/sigma)**2
-            idx = np.where(~np.isfinite(sigma))[0]
-
-            if len(idx) > 0:
-                gaussprobvals = 1-scipy.stats.norm.cdf(y[idx], maginterp[idx], errorbudget)
-                gaussprobsum = np.sum(np.log(gaussprobvals))
-            else:
-                gaussprobsum = 0.0
-
-            chisquaresum = np.sum(chisquarevals)
-
-            if np.isnan(chisquaresum):
-                chisquare = np.nan
-                break
-   
-            if not float(len(chisquarevals)-1) == 0:
-                chisquaresum = (1/float(len(chisquarevals)-1))*chisquaresum
+                telemetry.reject('nonfinite_likelihood')
+        return prob
+    else:
+        print("Enable doLuminosity or doLightcurves...")
+        exit(0)
 
-            if count == 0:
-                chisquare = chisquaresum
-                gaussprob = gaussprobsum
-            else:
-                chisquare = chisquare + chisquaresum
-                gaussprob = gaussprob + gaussprobsum
-            #count = count + len(chisquarevals)
-            count = count + 1
-            nsamples = nsamples + len(y)
-
-        if np.isnan(chisquare):
-            prob = -np.inf
-        else:
-            #prob = scipy.stats.chi2.logpdf(chisquare, count, loc=0, scale=1)
-            #prob = -chisquare/2.0
-            #prob = chisquare
-            if chisquare == 0:
-                chiprob = 0 
+def calc_prob_batch(tmag, lbol, mag, t0, zp, errorbudget=Global.errorbudget):
+    """calc_prob of N models sharing tmag, with lbol (N, nt), mag (N, 9, nt)
+    and arrays t0 and zp (N,)"""
+
+    if Global.doLuminosity or Global.doLightcurves:
+        plan = get_likelihood_plan(errorbudget=errorbudget)
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return plan.evaluate_batch(tmag, lbol, mag, t0, zp)
+
+        start = time.time()
+        prob = plan.evaluate_batch(tmag, lbol, mag, t0, zp)
+        telemetry.add_time('likelihood', time.time() - start)
+        telemetry.evaluations += len(prob)
+        for ii in np.where(~(prob > -np.inf))[0]:
+            if plan.rejects(lbol[ii]):
+                telemetry.reject('empty_model')
             else:
-                chiprob = scipy.stats.chi2.logpdf(chisquare, 1, loc=0, scale=1)
-
-            prob = chiprob + gaussprob - (nsamples/2.0)*np.log(2.0*np.pi*errorbudget**2)
-        if np.isnan(prob):
-            prob = -np.inf
-
-        #if np.isfinite(prob):
-        #    print t0, zp, prob
+                telemetry.reject('nonfinite_likelihood')
         return prob
     else:
         print("Enable doLuminosity or doLightcurves...")
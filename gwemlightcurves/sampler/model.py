@@ -2,7 +2,12 @@
 import numpy as np
 from gwemlightcurves.KNModels import KNTable
 from astropy.table import Table, Column
-from gwemlightcurves import SALT2, BOXFit, TrPi2018, Global
+from gwemlightcurves import SALT2, BOXFit, TrPi2018, Global, svd_utils
+from gwemlightcurves.KNModels.io import KaKy2016 as KaKy2016_lc
+from gwemlightcurves.KNModels.io import Me2017 as Me2017_lc
+from gwemlightcurves.KNModels.io import WoKo2017 as WoKo2017_lc
+from gwemlightcurves.KNModels.io import Ka2017 as Ka2017_lc
+from .cache import cached_model, cached_model_batch
 
 def generate_lightcurve(model,samples):
 
@@ -18,6 +23,7 @@ def generate_lightcurve(model,samples):
         t, lbol, mag = model_table["t"][0], model_table["lbol"][0], model_table["mag"][0]
         return t, lbol, mag
 
+@cached_model
 def KaKy2016_model(q,chi_eff,mns,mb,c,th,ph):
 
     tini = 0.1
@@ -30,28 +36,14 @@ def KaKy2016_model(q,chi_eff,mns,mb,c,th,ph):
     alp = 1.2
     eth = 0.5
 
-    samples = {}
-    samples['tini'] = tini
-    samples['tmax'] = tmax
-    samples['dt'] = dt
-    samples['q'] = q
-    samples['chi_eff'] = chi_eff
-    samples['mns'] = mns
-    samples['mb'] = mb
-    samples['c'] = c
-    samples['th'] = th
-    samples['ph'] = ph
-    samples['vmin'] = vmin
-    samples['kappa'] = kappa
-    samples['eps'] = eps
-    samples['alp'] = alp
-    samples['eth'] = eth
-
-    model = "KaKy2016"
-    t, lbol, mag = generate_lightcurve(model,samples)
+    # evaluate the vectorized engine directly, skipping the per-call KNTable
+    t, lbol, mag, mej, vej = KaKy2016_lc.lightcurve(tini,tmax,dt,vmin,th,ph,kappa,eps,alp,eth,q,chi_eff,mns,mb,c)
+    if not mej[0] > 0:
+        return [], [], []
 
-    return t, lbol, mag
+    return t, lbol[0], mag[0]
 
+@cached_model
 def KaKy2016_model_ejecta(mej,vej,th,ph):
 
     tini = 0.1
@@ -64,25 +56,14 @@ def KaKy2016_model_ejecta(mej,vej,th,ph):
     alp = 1.2
     eth = 0.5
 
-    samples = {}
-    samples['tini'] = tini
-    samples['tmax'] = tmax
-    samples['dt'] = dt
-    samples['mej'] = mej
-    samples['vej'] = vej
-    samples['th'] = th
-    samples['ph'] = ph
-    samples['vmin'] = vmin
-    samples['kappa'] = kappa
-    samples['eps'] = eps
-    samples['alp'] = alp
-    samples['eth'] = eth
+    if not mej > 0:
+        return [], [], []
 
-    model = "KaKy2016"
-    t, lbol, mag = generate_lightcurve(model,samples)
+    t, lbol, mag = KaKy2016_lc.calc_lc_batch(tini,tmax,dt,mej,vej,vmin,th,ph,kappa,eps,alp,eth)
 
-    return t, lbol, mag
+    return t, lbol[0], mag[0]
 
+@cached_model
 def Me2017_model(m1,mb1,c1,m2,mb2,c2,beta,kappa_r):
 
     tini = 0.1
@@ -107,37 +88,39 @@ def Me2017_model(m1,mb1,c1,m2,mb2,c2,beta,kappa_r):
 
     return t, lbol, mag
 
+@cached_model
 def Me2017_model_ejecta(mej,vej,beta,kappa_r):
 
     tini = 0.1
     tmax = 50.0
     dt = 0.1
 
-    samples = {}
-    samples['tini'] = tini
-    samples['tmax'] = tmax
-    samples['dt'] = dt
-    samples['mej'] = mej
-    samples['vej'] = vej
-    samples['beta'] = beta
-    samples['kappa_r'] = kappa_r
+    if not mej > 0:
+        return [], [], []
 
-    model = "Me2017"
-    t, lbol, mag = generate_lightcurve(model,samples)
+    t, lbol, mag, Tobs = Me2017_lc.calc_lc_batch(tini,tmax,dt,mej,vej,beta,kappa_r)
 
-    return t, lbol, mag
+    return t, lbol[0], mag[0]
 
+@cached_model
 def Me2017x2_model_ejecta(mej_1,vej_1,beta_1,kappa_r_1,mej_2,vej_2,beta_2,kappa_r_2):
 
-    tmag_1, lbol_1, mag_1 = Me2017_model_ejecta(mej_1,vej_1,beta_1,kappa_r_1)
-    tmag_2, lbol_2, mag_2 = Me2017_model_ejecta(mej_2,vej_2,beta_2,kappa_r_2)
+    tini = 0.1
+    tmax = 50.0
+    dt = 0.1
 
-    tmag = tmag_1
-    lbol = lbol_1 + lbol_2
-    mag = -2.5*np.log10(10**(-mag_1*0.4) + 10**(-mag_2*0.4))
+    if not (mej_1 > 0 and mej_2 > 0):
+        return [], [], []
+
+    # integrate both components together along the sample axis
+    tmag, lbol, mag, Tobs = Me2017_lc.calc_lc_batch(tini,tmax,dt,[mej_1,mej_2],[vej_1,vej_2],[beta_1,beta_2],[kappa_r_1,kappa_r_2])
+
+    lbol = lbol[0] + lbol[1]
+    mag = -2.5*np.log10(10**(-mag[0]*0.4) + 10**(-mag[1]*0.4))
 
     return tmag, lbol, mag
 
+@cached_model
 def WoKo2017_model(m1,mb1,c1,m2,mb2,c2,theta_r,kappa_r):
 
     tini = 0.1
@@ -162,26 +145,21 @@ def WoKo2017_model(m1,mb1,c1,m2,mb2,c2,theta_r,kappa_r):
 
     return t, lbol, mag
 
+@cached_model
 def WoKo2017_model_ejecta(mej,vej,theta_r,kappa_r):
 
     tini = 0.1
     tmax = 50.0
     dt = 0.1
 
-    samples = {}
-    samples['tini'] = tini
-    samples['tmax'] = tmax
-    samples['dt'] = dt
-    samples['mej'] = mej
-    samples['vej'] = vej
-    samples['theta_r'] = theta_r
-    samples['kappa'] = kappa_r
+    if not mej > 0:
+        return [], [], []
 
-    model = "WoKo2017"
-    t, lbol, mag = generate_lightcurve(model,samples)
+    t, lbol, mag = WoKo2017_lc.calc_lc_batch(tini,tmax,dt,mej,vej,theta_r,kappa_r)
 
-    return t, lbol, mag
+    return t[0], lbol[0], mag[0]
 
+@cached_model
 def BaKa2016_model(m1,mb1,c1,m2,mb2,c2):
 
     tini = 0.1
@@ -204,6 +182,7 @@ def BaKa2016_model(m1,mb1,c1,m2,mb2,c2):
 
     return t, lbol, mag
 
+@cached_model
 def BaKa2016_model_ejecta(mej,vej):
 
     tini = 0.1
@@ -222,6 +201,7 @@ def BaKa2016_model_ejecta(mej,vej):
 
     return t, lbol, mag
 
+@cached_model
 def Ka2017_model(m1,mb1,c1,m2,mb2,c2,Xlan):
 
     tini = 0.1
@@ -245,6 +225,7 @@ def Ka2017_model(m1,mb1,c1,m2,mb2,c2,Xlan):
 
     return t, lbol, mag
 
+@cached_model
 def Ka2017_model_BNS(m1,c1,m2,c2,Xlan):
 
     tini = 0.1
@@ -269,6 +250,7 @@ def Ka2017_model_BNS(m1,c1,m2,c2,Xlan):
 
     return t, lbol, mag
 
+@cached_model
 def Ka2017_model_ejecta(mej,vej,Xlan):
 
     tini = 0.1
@@ -288,6 +270,21 @@ def Ka2017_model_ejecta(mej,vej,Xlan):
 
     return t, lbol, mag
 
+@cached_model_batch('Ka2017_model_ejecta')
+def Ka2017_model_ejecta_batch(mej,vej,Xlan):
+    """Ka2017_model_ejecta of arrays of (positive) parameters, with every
+    point in one surrogate prediction"""
+
+    tini = 0.1
+    tmax = 50.0
+    dt = 0.1
+
+    param_array = np.vstack((np.log10(mej),np.log10(vej),np.log10(Xlan))).T
+    tmag, lbol, mag = svd_utils.calc_lc_batch(tini,tmax,dt,param_array,svd_mag_model=Global.svd_mag_model,svd_lbol_model=Global.svd_lbol_model,model="Ka2017")
+
+    return tmag, lbol, mag
+
+@cached_model
 def Ka2017inc_model_ejecta(mej,vej,Xlan,iota):
 
     tini = 0.1
@@ -310,21 +307,45 @@ def Ka2017inc_model_ejecta(mej,vej,Xlan,iota):
 
 def Ka2017x2_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2):
 
-    tmag_1, lbol_1, mag_1 = Ka2017_model_ejecta(mej_1,vej_1,Xlan_1)
-    tmag_2, lbol_2, mag_2 = Ka2017_model_ejecta(mej_2,vej_2,Xlan_2)
+    tmag, lbol, mag = Ka2017xN_model_ejecta([mej_1,mej_2],[vej_1,vej_2],[Xlan_1,Xlan_2])
 
-    tmag = tmag_1
-    lbol = lbol_1 + lbol_2
-    mag = -2.5*np.log10(10**(-mag_1*0.4) + 10**(-mag_2*0.4))
+    return tmag, lbol, mag
+
+@cached_model
+def Ka2017xN_model_ejecta(mej,vej,Xlan):
+
+    tini = 0.1
+    tmax = 50.0
+    dt = 0.1
+
+    if not np.all(np.asarray(mej) > 0):
+        return [], [], []
+
+    # all components share one batched surrogate prediction
+    tmag, lbol, mag = Ka2017_lc.calc_lc_components(tini,tmax,dt,mej,vej,Xlan,Global.svd_mag_model,Global.svd_lbol_model)
+
+    return tmag, lbol[0], mag[0]
+
+@cached_model_batch('Ka2017xN_model_ejecta')
+def Ka2017xN_model_ejecta_batch(mej,vej,Xlan):
+    """Ka2017xN_model_ejecta of (N, ncomp) arrays of (positive) parameters,
+    with every component of every point in one surrogate prediction"""
+
+    tini = 0.1
+    tmax = 50.0
+    dt = 0.1
+
+    tmag, lbol, mag = Ka2017_lc.calc_lc_components(tini,tmax,dt,mej,vej,Xlan,Global.svd_mag_model,Global.svd_lbol_model)
 
     return tmag, lbol, mag
 
 def Ka2017x2inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,iota):
 
-    Global.svd_mag_color_model = Global.svd_mag_color_models[0]
-    tmag_1, lbol_1, mag_1 = Ka2017inc_model_ejecta(mej_1,vej_1,Xlan_1,iota)
-    Global.svd_mag_color_model = Global.svd_mag_color_models[1]
-    tmag_2, lbol_2, mag_2 = Ka2017inc_model_ejecta(mej_2,vej_2,Xlan_2,iota)
+    # each component uses its own color model, restored afterwards
+    with Global.use({'svd_mag_color_model': Global.svd_mag_color_models[0]}):
+        tmag_1, lbol_1, mag_1 = Ka2017inc_model_ejecta(mej_1,vej_1,Xlan_1,iota)
+    with Global.use({'svd_mag_color_model': Global.svd_mag_color_models[1]}):
+        tmag_2, lbol_2, mag_2 = Ka2017inc_model_ejecta(mej_2,vej_2,Xlan_2,iota)
 
     tmag = tmag_1
     lbol = lbol_1 + lbol_2
@@ -334,25 +355,20 @@ def Ka2017x2inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,iota):
 
 def Ka2017x3_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,mej_3,vej_3,Xlan_3):
 
-    tmag_1, lbol_1, mag_1 = Ka2017_model_ejecta(mej_1,vej_1,Xlan_1)
-    tmag_2, lbol_2, mag_2 = Ka2017_model_ejecta(mej_2,vej_2,Xlan_2)
-    tmag_3, lbol_3, mag_3 = Ka2017_model_ejecta(mej_3,vej_3,Xlan_3)
-
-    tmag = tmag_1
-    lbol = lbol_1 + lbol_2 + lbol_3
-    mag = -2.5*np.log10(10**(-mag_1*0.4) + 10**(-mag_2*0.4) + 10**(-mag_3*0.4))
+    tmag, lbol, mag = Ka2017xN_model_ejecta([mej_1,mej_2,mej_3],[vej_1,vej_2,vej_3],[Xlan_1,Xlan_2,Xlan_3])
 
     return tmag, lbol, mag
 
 def Ka2017x3inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,mej_3,vej_3,Xlan_3,iota):
 
-    Global.svd_mag_color_model = Global.svd_mag_color_models[0]
-    tmag_1, lbol_1, mag_1 = Ka2017inc_model_ejecta(mej_1,vej_1,Xlan_1,iota)
-    Global.svd_mag_color_model = Global.svd_mag_color_models[1]
-    tmag_2, lbol_2, mag_2 = Ka2017inc_model_ejecta(mej_2,vej_2,Xlan_2,iota)
-    Global.svd_mag_color_model = Global.svd_mag_color_models[2]
+    # each component uses its own color model, restored afterwards
+    with Global.use({'svd_mag_color_model': Global.svd_mag_color_models[0]}):
+        tmag_1, lbol_1, mag_1 = Ka2017inc_model_ejecta(mej_1,vej_1,Xlan_1,iota)
+    with Global.use({'svd_mag_color_model': Global.svd_mag_color_models[1]}):
+        tmag_2, lbol_2, mag_2 = Ka2017inc_model_ejecta(mej_2,vej_2,Xlan_2,iota)
     iota_mod = np.mod(iota-90,180)
-    tmag_3, lbol_3, mag_3 = Ka2017inc_model_ejecta(mej_3,vej_3,Xlan_3,iota_mod)
+    with Global.use({'svd_mag_color_model': Global.svd_mag_color_models[2]}):
+        tmag_3, lbol_3, mag_3 = Ka2017inc_model_ejecta(mej_3,vej_3,Xlan_3,iota_mod)
 
     tmag = tmag_1
     lbol = lbol_1 + lbol_2 + lbol_3
@@ -360,6 +376,7 @@ def Ka2017x3inc_model_ejecta(mej_1,vej_1,Xlan_1,mej_2,vej_2,Xlan_2,mej_3,vej_3,X
 
     return tmag, lbol, mag_1
 
+@cached_model
 def RoFe2017_model(m1,mb1,c1,m2,mb2,c2,Ye):
 
     tini = 0.1
@@ -383,6 +400,7 @@ def RoFe2017_model(m1,mb1,c1,m2,mb2,c2,Ye):
 
     return t, lbol, mag
 
+@cached_model
 def RoFe2017_model_ejecta(mej,vej,Ye):
 
     tini = 0.1
@@ -406,6 +424,7 @@ def RoFe2017_model_ejecta(mej,vej,Ye):
 
     return t, lbol, mag
 
+@cached_model
 def SmCh2017_model(m1,mb1,c1,m2,mb2,c2,slope_r,kappa_r):
 
     tini = 0.1
@@ -430,6 +449,7 @@ def SmCh2017_model(m1,mb1,c1,m2,mb2,c2,slope_r,kappa_r):
 
     return t, lbol, mag
 
+@cached_model
 def SmCh2017_model_ejecta(mej,vej,slope_r,kappa_r):
 
     tini = 0.1
@@ -450,6 +470,7 @@ def SmCh2017_model_ejecta(mej,vej,slope_r,kappa_r):
 
     return t, lbol, mag
 
+@cached_model
 def DiUj2017_model(m1,mb1,c1,m2,mb2,c2,th,ph):
 
     tini = 0.1
@@ -488,6 +509,7 @@ def DiUj2017_model(m1,mb1,c1,m2,mb2,c2,th,ph):
 
     return t, lbol, mag
 
+@cached_model
 def DiUj2017_model_ejecta(mej,vej,th,ph):
 
     tini = 0.1
@@ -523,6 +545,7 @@ def DiUj2017_model_ejecta(mej,vej,th,ph):
 
     return t, lbol, mag
 
+@cached_model
 def sn_model(z,t0,x0,x1,c):
 
     tini = 0.1
@@ -533,6 +556,7 @@ def sn_model(z,t0,x0,x1,c):
 
     return t, lbol, mag
 
+@cached_model
 def boxfit_model(theta_0, E, n, theta_obs, p, epsilon_B, epsilon_E, ksi_N):
 
     boxfitDir = '../boxfit'
@@ -544,6 +568,7 @@ def boxfit_model(theta_0, E, n, theta_obs, p, epsilon_B, epsilon_E, ksi_N):
 
     return t, lbol, mag
 
+@cached_model
 def TrPi2018_model(theta_v, E0, theta_c, theta_w, n, p, epsilon_E, epsilon_B):
 
     tini = 0.1
@@ -1,429 +1,240 @@
-
 import numpy as np
 from gwemlightcurves import Global
 
-def myprior_KaKy2016(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*6.0 + 3.0
-        cube[2] = cube[2]*0.75
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*0.1 + 0.1
-        cube[6] = cube[6]*np.pi/2
-        cube[7] = cube[7]*2*np.pi
-        cube[8] = cube[8]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_KaKy2016_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*np.pi/2
-        cube[4] = cube[4]*2*np.pi
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_KaKy2016_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*6.0 + 3.0
-        cube[2] = cube[2]*0.75
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.1 + 0.1
-        cube[5] = cube[5]*np.pi/2
-        cube[6] = cube[6]*2*np.pi
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Me2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*4.0 + 1.0
-        cube[8] = cube[8]*3.0 - 1.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_WoKo2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*180.0
-        cube[8] = cube[8]*3.0 - 1.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_BaKa2016(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*5.0 - 5.0
-        cube[8] = cube[8]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_RoFe2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*1.0
-        cube[8] = cube[8]*2*Global.ZPRange - Global.ZPRange   
-
-def myprior_SmCh2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*10.0 - 5.0
-        cube[8] = cube[8]*3.0 - 1.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Me2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*4.0 + 1.0
-        cube[6] = cube[6]*3.0 - 1.0
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_WoKo2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*180.0
-        cube[6] = cube[6]*3.0 - 1.0
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_BaKa2016_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*5.0 - 5.0
-        cube[6] = cube[6]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_RoFe2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*1.0
-        cube[6] = cube[6]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_SmCh2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*10.0 - 5.0
-        cube[6] = cube[6]*3.0 - 1.0
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Me2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*4.0 - 5.0
-        cube[1] = cube[1]*6.0 - 5.0
-        #cube[2] = cube[2]*0.3
-        cube[2] = cube[2]*0.25 + 0.05
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*4.0 + 1.0
-        cube[4] = cube[4]*3.0 - 1.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Me2017_A_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*4.0 - 5.0
-        cube[1] = cube[1]*6.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*4.0 + 1.0
-        cube[4] = cube[4]*3.0 - 1.0
-        cube[5] = cube[5]*10.0
-        cube[6] = cube[6]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Me2017x2_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*4.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*4.0 + 1.0
-        cube[4] = cube[4]*2.0 - 0.0
-        cube[5] = cube[5]*4.0 - 5.0
-        cube[6] = cube[6]*0.3
-        #cube[6] = cube[6]*1.0
-        cube[7] = cube[7]*4.0 + 1.0
-        cube[8] = cube[8]*1.0 - 1.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_WoKo2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*180.0
-        cube[4] = cube[4]*3.0 - 1.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_BaKa2016_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*5.0 - 5.0
-        cube[1] = cube[1]*4.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*8.0 - 9.0
-        cube[4] = cube[4]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017inc_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*5.0 - 5.0
-        cube[1] = cube[1]*4.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*8.0 - 9.0
-        cube[4] = cube[4]*180.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017_A_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*5.0 - 5.0
-        cube[1] = cube[1]*4.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*8.0 - 9.0
-        cube[4] = cube[4]*10.0 - 0.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017x2_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*4.0 - 5.0
-        #cube[2] = cube[2]*0.1
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*5.0 - 5.0
-        cube[4] = cube[4]*4.0 - 5.0
-        #cube[5] = cube[5]*0.2 + 0.1
-        cube[5] = cube[5]*0.3
-        cube[6] = cube[6]*5.0 - 5.0
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017x2inc_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*4.0 - 5.0
-        #cube[2] = cube[2]*0.1
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*5.0 - 5.0
-        cube[4] = cube[4]*4.0 - 5.0
-        #cube[5] = cube[5]*0.2 + 0.1
-        cube[5] = cube[5]*0.3
-        cube[6] = cube[6]*5.0 - 5.0
-        cube[7] = cube[7]*180.0
-        cube[8] = cube[8]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017x2_ejecta_sigma(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*4.0 - 5.0
-        #cube[2] = cube[2]*0.1
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*5.0 - 5.0
-        cube[4] = cube[4]*4.0 - 5.0
-        #cube[5] = cube[5]*0.2 + 0.1
-        cube[5] = cube[5]*0.3
-        cube[6] = cube[6]*5.0 - 5.0
-        cube[7] = cube[7]*2.0
-        cube[8] = cube[8]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017x3_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*0.1 + 0.2
-        cube[3] = cube[3]*2.0 - 2.0
-        cube[4] = cube[4]*5.0 - 5.0
-        cube[5] = cube[5]*0.1 + 0.2
-        cube[6] = cube[6]*4.0 - 5.0
-        cube[7] = cube[7]*5.0 - 5.0
-        cube[8] = cube[8]*0.2
-        cube[9] = cube[9]*5.0 - 5.0
-        cube[10] = cube[10]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017x3inc_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*4.0 - 5.0
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*5.0 - 5.0
-        cube[4] = cube[4]*4.0 - 5.0
-        cube[5] = cube[5]*0.3
-        cube[6] = cube[6]*5.0 - 5.0
-        cube[7] = cube[7]*4.0 - 5.0
-        cube[8] = cube[8]*0.3
-        cube[9] = cube[9]*5.0 - 5.0
-        cube[10] = cube[10]*180.0
-        cube[11] = cube[11]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_RoFe2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*0.3
-        #cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*1.0
-        cube[4] = cube[4]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_SmCh2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        #cube[2] = cube[2]*1.0
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*10.0 - 5.0
-        cube[4] = cube[4]*3.0 - 1.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_DiUj2017(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*2.0 + 1.0
-        cube[3] = cube[3]*0.16 + 0.08
-        cube[4] = cube[4]*2.0 + 1.0
-        cube[5] = cube[5]*2.0 + 1.0
-        cube[6] = cube[6]*0.16 + 0.08
-        cube[7] = cube[7]*np.pi/2
-        cube[8] = cube[8]*2*np.pi
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_DiUj2017_EOSFit(cube, ndim, nparams):
-
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*2.0 + 1.0
-        cube[2] = cube[2]*0.16 + 0.08
-        cube[3] = cube[3]*2.0 + 1.0
-        cube[4] = cube[4]*0.16 + 0.08
-        cube[5] = cube[5]*np.pi/2
-        cube[6] = cube[6]*2*np.pi
-        cube[7] = cube[7]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_DiUj2017_ejecta(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*1.0
-        cube[3] = cube[3]*np.pi/2
-        cube[4] = cube[4]*2*np.pi
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_sn(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*10.0
-        cube[2] = cube[2]*10.0
-        cube[3] = cube[3]*10.0
-        cube[4] = cube[4]*10.0
-        cube[5] = cube[5]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_boxfit(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*np.pi/4.0
-        cube[2] = cube[2]*4.0 + 49.0
-        cube[3] = cube[3]*4.0 - 4.0
-        cube[4] = cube[4]*np.pi/4.0
-        cube[5] = cube[5]*0.1 + 2.1
-        cube[6] = cube[6]*3.0 - 4.0
-        cube[7] = cube[7]*3.0 - 4.0
-        cube[8] = cube[8]*4.0 - 4.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_TrPi2018(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*np.pi/4.0
-        cube[2] = cube[2]*6.0 + 49.0
-        cube[3] = cube[3]*np.pi/4.0
-        cube[4] = cube[4]*np.pi/4.0
-        cube[5] = cube[5]*4.0 - 4.0
-        cube[6] = cube[6]*0.4 + 2.1
-        cube[7] = cube[7]*4.0 - 4.0
-        cube[8] = cube[8]*4.0 - 4.0
-        cube[9] = cube[9]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017_TrPi2018(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        #cube[1] = cube[1]*5.0 - 5.0
-        cube[1] = cube[1]*3.0 - 3.0
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*8.0 - 9.0
-        cube[4] = cube[4]*np.pi/4.0
-        cube[5] = cube[5]*6.0 + 49.0
-        cube[6] = cube[6]*np.pi/4.0
-        cube[7] = cube[7]*np.pi/4.0
-        cube[8] = cube[8]*4.0 - 4.0
-        cube[9] = cube[9]*0.4 + 2.1
-        cube[10] = cube[10]*4.0 - 4.0
-        cube[11] = cube[11]*4.0 - 4.0
-        cube[12] = cube[12]*2*Global.ZPRange - Global.ZPRange
-
-def myprior_Ka2017_TrPi2018_A(cube, ndim, nparams):
-        cube[0] = cube[0]*2*Global.T0Range - Global.T0Range
-        cube[1] = cube[1]*5.0 - 5.0
-        cube[2] = cube[2]*0.3
-        cube[3] = cube[3]*8.0 - 9.0
-        cube[4] = cube[4]*np.pi/4.0
-        cube[5] = cube[5]*6.0 + 49.0
-        cube[6] = cube[6]*np.pi/4.0
-        cube[7] = cube[7]*np.pi/4.0
-        cube[8] = cube[8]*4.0 - 4.0
-        cube[9] = cube[9]*0.4 + 2.1
-        cube[10] = cube[10]*4.0 - 4.0
-        cube[11] = cube[11]*4.0 - 4.0
-        cube[12] = cube[12]*10.0 - 0.0
-        cube[13] = cube[13]*2*Global.ZPRange - Global.ZPRange
+class Parameter(object):
+    """
+    Prior of one parameter: uniform or loguniform between minimum and
+    maximum. With scale, the bounds are multiplied by that Global setting
+    when the transform runs (t0 and zp use scale='T0Range' / 'ZPRange').
+    """
+
+    DISTRIBUTIONS = ('uniform', 'loguniform')
+
+    def __init__(self, name, minimum, maximum, distribution='uniform', scale=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError("Unknown distribution %r, choose from %s"
+                             % (distribution, ', '.join(self.DISTRIBUTIONS)))
+        if distribution == 'loguniform' and not 0 < minimum < maximum:
+            raise ValueError("loguniform prior on %s needs 0 < minimum < maximum" % name)
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.distribution = distribution
+        self.scale = scale
+
+    def bounds(self):
+        if self.scale is None:
+            return self.minimum, self.maximum
+        scale = getattr(Global, self.scale)
+        return self.minimum*scale, self.maximum*scale
+
+    def transform(self, u):
+        """Value of the parameter at u (a float or an array) in [0, 1]"""
+        minimum, maximum = self.bounds()
+        if self.distribution == 'loguniform':
+            return minimum*(maximum/minimum)**u
+        return u*(maximum - minimum) + minimum
+
+class Prior(object):
+    """
+    Prior of a model, a list of Parameter in the layout of its myloglike_*.
+    Called as prior(cube, ndim, nparams) it is the in-place MultiNest prior
+    transform of one point; transform() maps whole (N, ndim) arrays.
+    """
+
+    def __init__(self, parameters, name=None):
+        self.parameters = list(parameters)
+        self.__name__ = name
+
+    @property
+    def names(self):
+        return [parameter.name for parameter in self.parameters]
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def __call__(self, cube, ndim, nparams):
+        for ii, parameter in enumerate(self.parameters):
+            cube[ii] = parameter.transform(cube[ii])
+
+    def transform(self, cube):
+        """Parameters of the points of an (N, ndim) (or (ndim,)) array of
+        the unit hypercube"""
+        cube = np.asarray(cube, dtype=float)
+        theta = np.empty(cube.shape)
+        for ii, parameter in enumerate(self.parameters):
+            theta[...,ii] = parameter.transform(cube[...,ii])
+        return theta
+
+# model -> Prior
+_PRIORS = {}
+
+def register_prior(model, parameters, force=False):
+    """Register the prior of model, returned as myprior_<model>"""
+    if model in _PRIORS and not force:
+        raise ValueError("Prior of %r already registered" % model)
+    _PRIORS[model] = Prior(parameters, name='myprior_%s' % model)
+    return _PRIORS[model]
+
+def get_prior(model):
+    """Prior registered for model"""
+    try:
+        return _PRIORS[model]
+    except KeyError:
+        raise ValueError("No prior registered for %r" % model)
+
+T0 = Parameter('t0', -1.0, 1.0, scale='T0Range')
+ZP = Parameter('zp', -1.0, 1.0, scale='ZPRange')
+
+def _bns(baryonic=True):
+    """Masses (and baryonic masses) and compactnesses of two neutron stars"""
+    parameters = []
+    for ii in ['1', '2']:
+        parameters.append(Parameter('m'+ii, 1.0, 3.0))
+        if baryonic:
+            parameters.append(Parameter('mb'+ii, 1.0, 3.0))
+        parameters.append(Parameter('c'+ii, 0.08, 0.24))
+    return parameters
+
+def _ka2017(suffix='', mej=(-5.0, -1.0), vej=(0.0, 0.3), xlan=(-9.0, -1.0)):
+    """log10 ejecta mass, velocity and log10 lanthanide fraction of a
+    Ka2017 component"""
+    return [Parameter('mej'+suffix, *mej), Parameter('vej'+suffix, *vej),
+            Parameter('xlan'+suffix, *xlan)]
+
+def _trpi2018():
+    return [Parameter('theta_v', 0.0, np.pi/4.0), Parameter('E0', 49.0, 55.0),
+            Parameter('theta_c', 0.0, np.pi/4.0), Parameter('theta_w', 0.0, np.pi/4.0),
+            Parameter('n', -4.0, 0.0), Parameter('p', 2.1, 2.5),
+            Parameter('epsilon_E', -4.0, 0.0), Parameter('epsilon_B', -4.0, 0.0)]
+
+myprior_KaKy2016 = register_prior('KaKy2016',
+    [T0, Parameter('q', 3.0, 9.0), Parameter('chi_eff', 0.0, 0.75),
+     Parameter('mns', 1.0, 3.0), Parameter('mb', 1.0, 3.0), Parameter('c', 0.1, 0.2),
+     Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_KaKy2016_ejecta = register_prior('KaKy2016_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 1.0),
+     Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_KaKy2016_EOSFit = register_prior('KaKy2016_EOSFit',
+    [T0, Parameter('q', 3.0, 9.0), Parameter('chi_eff', 0.0, 0.75),
+     Parameter('mns', 1.0, 3.0), Parameter('c', 0.1, 0.2),
+     Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_Me2017 = register_prior('Me2017',
+    [T0] + _bns() + [Parameter('beta', 1.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_WoKo2017 = register_prior('WoKo2017',
+    [T0] + _bns() + [Parameter('beta', 0.0, 180.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_BaKa2016 = register_prior('BaKa2016', [T0] + _bns() + [ZP])
+
+myprior_Ka2017 = register_prior('Ka2017', [T0] + _bns() + [Parameter('xlan', -5.0, 0.0), ZP])
+
+myprior_RoFe2017 = register_prior('RoFe2017', [T0] + _bns() + [Parameter('ye', 0.0, 1.0), ZP])
+
+myprior_SmCh2017 = register_prior('SmCh2017',
+    [T0] + _bns() + [Parameter('beta', -5.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_Me2017_EOSFit = register_prior('Me2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('beta', 1.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_WoKo2017_EOSFit = register_prior('WoKo2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('beta', 0.0, 180.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_BaKa2016_EOSFit = register_prior('BaKa2016_EOSFit', [T0] + _bns(baryonic=False) + [ZP])
+
+myprior_Ka2017_EOSFit = register_prior('Ka2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('xlan', -5.0, 0.0), ZP])
+
+myprior_RoFe2017_EOSFit = register_prior('RoFe2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('ye', 0.0, 1.0), ZP])
+
+myprior_SmCh2017_EOSFit = register_prior('SmCh2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('beta', -5.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_Me2017_ejecta = register_prior('Me2017_ejecta',
+    [T0, Parameter('mej', -5.0, 1.0), Parameter('vej', 0.05, 0.3),
+     Parameter('beta', 1.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_Me2017_A_ejecta = register_prior('Me2017_A_ejecta',
+    [T0, Parameter('mej', -5.0, 1.0), Parameter('vej', 0.0, 0.3),
+     Parameter('beta', 1.0, 5.0), Parameter('kappa_r', -1.0, 2.0),
+     Parameter('A', 0.0, 10.0), ZP])
+
+myprior_Me2017x2_ejecta = register_prior('Me2017x2_ejecta',
+    [T0, Parameter('mej1', -5.0, -1.0), Parameter('vej1', 0.0, 0.3),
+     Parameter('beta1', 1.0, 5.0), Parameter('kappa_r1', 0.0, 2.0),
+     Parameter('mej2', -5.0, -1.0), Parameter('vej2', 0.0, 0.3),
+     Parameter('beta2', 1.0, 5.0), Parameter('kappa_r2', -1.0, 0.0), ZP])
+
+myprior_WoKo2017_ejecta = register_prior('WoKo2017_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 0.3),
+     Parameter('beta', 0.0, 180.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_BaKa2016_ejecta = register_prior('BaKa2016_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 0.3), ZP])
+
+myprior_Ka2017_ejecta = register_prior('Ka2017_ejecta', [T0] + _ka2017() + [ZP])
+
+myprior_Ka2017inc_ejecta = register_prior('Ka2017inc_ejecta',
+    [T0] + _ka2017() + [Parameter('iota', 0.0, 180.0), ZP])
+
+myprior_Ka2017_A_ejecta = register_prior('Ka2017_A_ejecta',
+    [T0] + _ka2017() + [Parameter('A', 0.0, 10.0), ZP])
+
+myprior_Ka2017x2_ejecta = register_prior('Ka2017x2_ejecta',
+    [T0] + _ka2017('1', xlan=(-5.0, 0.0)) + _ka2017('2', xlan=(-5.0, 0.0)) + [ZP])
+
+myprior_Ka2017x2inc_ejecta = register_prior('Ka2017x2inc_ejecta',
+    [T0] + _ka2017('1', xlan=(-5.0, 0.0)) + _ka2017('2', xlan=(-5.0, 0.0))
+    + [Parameter('iota', 0.0, 180.0), ZP])
+
+myprior_Ka2017x2_ejecta_sigma = register_prior('Ka2017x2_ejecta_sigma',
+    [T0] + _ka2017('1', xlan=(-5.0, 0.0)) + _ka2017('2', xlan=(-5.0, 0.0))
+    + [Parameter('sigma', 0.0, 2.0), ZP])
+
+myprior_Ka2017x3_ejecta = register_prior('Ka2017x3_ejecta',
+    [T0] + _ka2017('1', mej=(-5.0, 0.0), vej=(0.2, 0.3), xlan=(-2.0, 0.0))
+    + _ka2017('2', mej=(-5.0, 0.0), vej=(0.2, 0.3), xlan=(-5.0, -1.0))
+    + _ka2017('3', mej=(-5.0, 0.0), vej=(0.0, 0.2), xlan=(-5.0, 0.0)) + [ZP])
+
+myprior_Ka2017x3inc_ejecta = register_prior('Ka2017x3inc_ejecta',
+    [T0] + _ka2017('1', xlan=(-5.0, 0.0)) + _ka2017('2', xlan=(-5.0, 0.0))
+    + _ka2017('3', xlan=(-5.0, 0.0)) + [Parameter('iota', 0.0, 180.0), ZP])
+
+myprior_RoFe2017_ejecta = register_prior('RoFe2017_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 0.3), Parameter('ye', 0.0, 1.0), ZP])
+
+myprior_SmCh2017_ejecta = register_prior('SmCh2017_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 0.3),
+     Parameter('beta', -5.0, 5.0), Parameter('kappa_r', -1.0, 2.0), ZP])
+
+myprior_DiUj2017 = register_prior('DiUj2017',
+    [T0] + _bns() + [Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_DiUj2017_EOSFit = register_prior('DiUj2017_EOSFit',
+    [T0] + _bns(baryonic=False) + [Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_DiUj2017_ejecta = register_prior('DiUj2017_ejecta',
+    [T0, Parameter('mej', -5.0, 0.0), Parameter('vej', 0.0, 1.0),
+     Parameter('th', 0.0, np.pi/2), Parameter('ph', 0.0, 2*np.pi), ZP])
+
+myprior_sn = register_prior('sn',
+    [T0, Parameter('z', 0.0, 10.0), Parameter('x0', 0.0, 10.0),
+     Parameter('x1', 0.0, 10.0), Parameter('c', 0.0, 10.0), ZP])
+
+myprior_boxfit = register_prior('boxfit',
+    [T0, Parameter('theta_0', 0.0, np.pi/4.0), Parameter('E', 49.0, 53.0),
+     Parameter('n', -4.0, 0.0), Parameter('theta_obs', 0.0, np.pi/4.0),
+     Parameter('p', 2.1, 2.2), Parameter('epsilon_B', -4.0, -1.0),
+     Parameter('epsilon_E', -4.0, -1.0), Parameter('ksi_N', -4.0, 0.0), ZP])
+
+myprior_TrPi2018 = register_prior('TrPi2018', [T0] + _trpi2018() + [ZP])
+
+myprior_Ka2017_TrPi2018 = register_prior('Ka2017_TrPi2018',
+    [T0] + _ka2017(mej=(-3.0, 0.0)) + _trpi2018() + [ZP])
+
+myprior_Ka2017_TrPi2018_A = register_prior('Ka2017_TrPi2018_A',
+    [T0] + _ka2017(mej=(-5.0, 0.0)) + _trpi2018() + [Parameter('A', 0.0, 10.0), ZP])
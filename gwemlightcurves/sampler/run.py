@@ -1,8 +1,10 @@
 
 import os, sys
 import numpy as np
-import pymultinest
 from gwemlightcurves.sampler import *
+from gwemlightcurves.sampler.backends import run_sampler
+from gwemlightcurves.sampler.cache import configure_model_cache
+from gwemlightcurves.sampler.telemetry import configure_telemetry
 from gwemlightcurves import lightcurve_utils, Global
 
 def multinest(opts,plotDir):
@@ -15,6 +17,18 @@ def multinest(opts,plotDir):
     max_iter = 0
     best = []
 
+    # opts.sampler names a backend of sampler.backends, opts.nprocs its pool
+    sampler = getattr(opts, 'sampler', 'multinest')
+    nprocs = getattr(opts, 'nprocs', 1)
+    configure_model_cache(maxsize=getattr(opts, 'model_cache_size', None),
+                          rtol=getattr(opts, 'model_cache_rtol', None))
+    configure_telemetry(enabled=getattr(opts, 'doTelemetry', False),
+                        interval=getattr(opts, 'telemetry_interval', None))
+    def sample(loglike, prior, parameters):
+        return run_sampler(loglike, prior, parameters, '%s/2-'%plotDir, sampler=sampler,
+                           n_live_points=n_live_points, evidence_tolerance=evidence_tolerance,
+                           max_iter=max_iter, batched=sampler != 'multinest', nprocs=nprocs)
+
     if opts.model in ["KaKy2016","DiUj2017","Me2017","Me2017_A","Me2017x2","SmCh2017","WoKo2017","BaKa2016","Ka2017","Ka2017inc","Ka2017_A","Ka2017x2","Ka2017x2inc","Ka2017x3","Ka2017x3inc","RoFe2017"]:
     
         if opts.doMasses:
@@ -23,181 +37,181 @@ def multinest(opts,plotDir):
                     parameters = ["t0","q","chi_eff","mns","c","th","ph","zp"]
                     labels = [r"$T_0$",r"$q$",r"$\chi_{\rm eff}$",r"$M_{\rm ns}$",r"$C$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_KaKy2016_EOSFit, myprior_KaKy2016_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_KaKy2016_EOSFit, myprior_KaKy2016_EOSFit, parameters)
                 else:
                     parameters = ["t0","q","chi_eff","mns","mb","c","th","ph","zp"]
                     labels = [r"$T_0$",r"$q$",r"$\chi_{\rm eff}$",r"$M_{\rm ns}$",r"$M_{\rm b}$",r"$C$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_KaKy2016, myprior_KaKy2016, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_KaKy2016, myprior_KaKy2016, parameters)
             elif opts.model == "DiUj2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","th","ph","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_DiUj2017_EOSFit, myprior_DiUj2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_DiUj2017_EOSFit, myprior_DiUj2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","th","ph","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_DiUj2017, myprior_DiUj2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_DiUj2017, myprior_DiUj2017, parameters)
             elif opts.model == "BaKa2016":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_BaKa2016_EOSFit, myprior_BaKa2016_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_BaKa2016_EOSFit, myprior_BaKa2016_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_BaKa2016, myprior_BaKa2016, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_BaKa2016, myprior_BaKa2016, parameters)
             elif opts.model == "Ka2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","xlan","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$","$X_{\rm lan}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Ka2017_EOSFit, myprior_Ka2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Ka2017_EOSFit, myprior_Ka2017_EOSFit, parameters)
                 elif opts.doBNSFit:
                     parameters = ["t0","m1","c1","m2","c2","xlan","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$","Xlan","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Ka2017_EOSFit, myprior_Ka2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Ka2017_EOSFit, myprior_Ka2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","xlan","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$","$X_{\rm lan}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Ka2017, myprior_Ka2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Ka2017, myprior_Ka2017, parameters)
             elif opts.model == "RoFe2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","ye","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$","Ye","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_RoFe2017_EOSFit, myprior_RoFe2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_RoFe2017_EOSFit, myprior_RoFe2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","ye","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$","Ye","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_RoFe2017, myprior_RoFe2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_RoFe2017, myprior_RoFe2017, parameters)
             elif opts.model == "Me2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$",r"$\alpha$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Me2017_EOSFit, myprior_Me2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Me2017_EOSFit, myprior_Me2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$",r"$\alpha$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Me2017, myprior_Me2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Me2017, myprior_Me2017, parameters)
             elif opts.model == "WoKo2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$",r"$\theta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_WoKo2017_EOSFit, myprior_WoKo2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_WoKo2017_EOSFit, myprior_WoKo2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$",r"$\theta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_WoKo2017, myprior_WoKo2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_WoKo2017, myprior_WoKo2017, parameters)
             elif opts.model == "SmCh2017":
                 if opts.doEOSFit:
                     parameters = ["t0","m1","c1","m2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$C_{\rm 2}$",r"$\beta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_SmCh2017_EOSFit, myprior_SmCh2017_EOSFit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_SmCh2017_EOSFit, myprior_SmCh2017_EOSFit, parameters)
                 else:
                     parameters = ["t0","m1","mb1","c1","m2","mb2","c2","beta","kappa_r","zp"]
                     labels = [r"$T_0$",r"$M_{\rm 1}$",r"$M_{\rm b1}$",r"$C_{\rm 1}$",r"$M_{\rm 2}$",r"$M_{\rm b2}$",r"$C_{\rm 2}$",r"$\beta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_SmCh2017, myprior_SmCh2017, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_SmCh2017, myprior_SmCh2017, parameters)
         elif opts.doEjecta:
             if opts.model == "KaKy2016":
                 parameters = ["t0","mej","vej","th","ph","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_KaKy2016_ejecta, myprior_KaKy2016_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_KaKy2016_ejecta, myprior_KaKy2016_ejecta, parameters)
             elif opts.model == "DiUj2017":
                 parameters = ["t0","mej","vej","th","ph","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\theta_{\rm ej}$",r"$\phi_{\rm ej}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_DiUj2017_ejecta, myprior_DiUj2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_DiUj2017_ejecta, myprior_DiUj2017_ejecta, parameters)
             elif opts.model == "BaKa2016":
                 parameters = ["t0","mej","vej","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_BaKa2016_ejecta, myprior_BaKa2016_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_BaKa2016_ejecta, myprior_BaKa2016_ejecta, parameters)
             elif opts.model == "Ka2017":
                 parameters = ["t0","mej","vej","xlan","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"${\rm log}_{10} (X_{\rm lan})$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017_ejecta, myprior_Ka2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017_ejecta, myprior_Ka2017_ejecta, parameters)
             elif opts.model == "Ka2017inc":
                 parameters = ["t0","mej","vej","xlan","iota","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"${\rm log}_{10} (X_{\rm lan})$",r"$\iota$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017inc_ejecta, myprior_Ka2017inc_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017inc_ejecta, myprior_Ka2017inc_ejecta, parameters)
             elif opts.model == "Ka2017_A":
                 parameters = ["t0","mej","vej","xlan","A","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"${\rm log}_{10} (X_{\rm lan})$",r"${\rm log}_{10} (A)$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017_A_ejecta, myprior_Ka2017_A_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017_A_ejecta, myprior_Ka2017_A_ejecta, parameters)
             elif opts.model == "Ka2017x2":
                 if opts.doFitSigma:
                     parameters = ["t0","mej1","vej1","xlan1","mej2","vej2","xlan2","sigma","zp"]
                     labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"${\rm log}_{10} (X_{\rm lan 1})$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"${\rm log}_{10} (X_{\rm lan 2})$",r"$\sigma$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Ka2017x2_ejecta_sigma, myprior_Ka2017x2_ejecta_sigma, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Ka2017x2_ejecta_sigma, myprior_Ka2017x2_ejecta_sigma, parameters)
                 else:
                     parameters = ["t0","mej1","vej1","xlan1","mej2","vej2","xlan2","zp"]
                     labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"${\rm log}_{10} (X_{\rm lan 1})$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"${\rm log}_{10} (X_{\rm lan 2})$","ZP"]
                     n_params = len(parameters)
-                    pymultinest.run(myloglike_Ka2017x2_ejecta, myprior_Ka2017x2_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                    sample(myloglike_Ka2017x2_ejecta, myprior_Ka2017x2_ejecta, parameters)
             elif opts.model == "Ka2017x2inc":
                 parameters = ["t0","mej1","vej1","xlan1","mej2","vej2","xlan2","iota","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"${\rm log}_{10} (X_{\rm lan 1})$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"${\rm log}_{10} (X_{\rm lan 2})$",r"$\iota$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017x2inc_ejecta, myprior_Ka2017x2inc_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017x2inc_ejecta, myprior_Ka2017x2inc_ejecta, parameters)
             elif opts.model == "Ka2017x3":
                 parameters = ["t0","mej1","vej1","xlan1","mej2","vej2","xlan2","mej3","vej3","xlan3","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"${\rm log}_{10} (X_{\rm lan 1})$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"${\rm log}_{10} (X_{\rm lan 2})$",r"${\rm log}_{10} (M_{\rm ej 3})$",r"$v_{\rm ej 3}$",r"${\rm log}_{10} (X_{\rm lan 3})$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017x3_ejecta, myprior_Ka2017x3_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017x3_ejecta, myprior_Ka2017x3_ejecta, parameters)
             elif opts.model == "Ka2017x3inc":
                 parameters = ["t0","mej1","vej1","xlan1","mej2","vej2","xlan2","mej3","vej3","xlan3","emcee","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"${\rm log}_{10} (X_{\rm lan 1})$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"${\rm log}_{10} (X_{\rm lan 2})$",r"${\rm log}_{10} (M_{\rm ej 3})$",r"$v_{\rm ej 3}$",r"${\rm log}_{10} (X_{\rm lan 3})$",r"$\iota$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Ka2017x3inc_ejecta, myprior_Ka2017x3inc_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Ka2017x3inc_ejecta, myprior_Ka2017x3inc_ejecta, parameters)
             elif opts.model == "RoFe2017":
                 parameters = ["t0","mej","vej","xlan","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$","$X_{\rm lan}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_RoFe2017_ejecta, myprior_RoFe2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_RoFe2017_ejecta, myprior_RoFe2017_ejecta, parameters)
             elif opts.model == "Me2017":
                 parameters = ["t0","mej","vej","beta","kappa_r","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\alpha$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Me2017_ejecta, myprior_Me2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Me2017_ejecta, myprior_Me2017_ejecta, parameters)
             elif opts.model == "Me2017_A":
-                parameters = ["t0","mej","vej","beta","kappa_r","zp","A"]
+                parameters = ["t0","mej","vej","beta","kappa_r","A","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\alpha$",r"${\rm log}_{10} \kappa_{\rm r}$","A","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Me2017_A_ejecta, myprior_Me2017_A_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Me2017_A_ejecta, myprior_Me2017_A_ejecta, parameters)
             elif opts.model == "Me2017x2":
                 parameters = ["t0","mej1","vej1","beta1","kappa_r1","mej2","vej2","beta2","kappa_r2","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej 1})$",r"$v_{\rm ej 1}$",r"$\alpha_1$",r"${\rm log}_{10} \kappa_{\rm r 1}$",r"${\rm log}_{10} (M_{\rm ej 2})$",r"$v_{\rm ej 2}$",r"$\alpha_2$",r"${\rm log}_{10} \kappa_{\rm r 2}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_Me2017x2_ejecta, myprior_Me2017x2_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_Me2017x2_ejecta, myprior_Me2017x2_ejecta, parameters)
             elif opts.model == "WoKo2017":
                 parameters = ["t0","mej","vej","beta","kappa_r","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\theta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_WoKo2017_ejecta, myprior_WoKo2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_WoKo2017_ejecta, myprior_WoKo2017_ejecta, parameters)
             elif opts.model == "SmCh2017":
                 parameters = ["t0","mej","vej","beta","kappa_r","zp"]
                 labels = [r"$T_0$",r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"$\beta$",r"${\rm log}_{10} \kappa_{\rm r}$","ZP"]
                 n_params = len(parameters)
-                pymultinest.run(myloglike_SmCh2017_ejecta, myprior_SmCh2017_ejecta, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+                sample(myloglike_SmCh2017_ejecta, myprior_SmCh2017_ejecta, parameters)
         else:
             print("Enable --doEjecta or --doMasses")
             exit(0)
@@ -207,7 +221,7 @@ def multinest(opts,plotDir):
         labels = [r"$T_0$", r"$z$", r"$x_0$", r"$x_1$",r"$c$","ZP"]
         n_params = len(parameters)
     
-        pymultinest.run(myloglike_sn, myprior_sn, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+        sample(myloglike_sn, myprior_sn, parameters)
     
     elif opts.model in ["BoxFit"]:
 
@@ -215,7 +229,7 @@ def multinest(opts,plotDir):
         labels = [r"$T_0$", r"$theta_0$", r"$E$", r"$n$",r"$theta_{\rm obs}$","$p$","$epsilon_B$","$epsilon_E$","$ksi_N$","ZP"]
         n_params = len(parameters)
 
-        pymultinest.run(myloglike_boxfit, myprior_boxfit, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+        sample(myloglike_boxfit, myprior_boxfit, parameters)
 
     elif opts.model in ["TrPi2018"]:
 
@@ -223,7 +237,7 @@ def multinest(opts,plotDir):
         labels = [r"$T_0$", r"$\theta_v$", r"$E_0$", r"$\theta_c$", r"$\theta_w$", r"$n$",r"$p$", "$\epsilon_E$","$\epsilon_B$","ZP"]
         n_params = len(parameters)
 
-        pymultinest.run(myloglike_TrPi2018, myprior_TrPi2018, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+        sample(myloglike_TrPi2018, myprior_TrPi2018, parameters)
 
     elif opts.model in ["Ka2017_TrPi2018"]:
 
@@ -231,15 +245,15 @@ def multinest(opts,plotDir):
         labels = [r"$T_0$", r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"${\rm log}_{10} (X_{\rm lan})$", r"$\theta_v$", r"$E_0$", r"$\theta_c$", r"$\theta_w$", r"$n$",r"$p$", "$\epsilon_E$","$\epsilon_B$","ZP"]
         n_params = len(parameters)
 
-        pymultinest.run(myloglike_Ka2017_TrPi2018, myprior_Ka2017_TrPi2018, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+        sample(myloglike_Ka2017_TrPi2018, myprior_Ka2017_TrPi2018, parameters)
 
     elif opts.model in ["Ka2017_TrPi2018_A"]:
 
-        parameters = ["t0","mej","vej","xlan","theta_v","E0","theta_c","theta_w","n","p","epsilon_E","epsilon_B","zp","A"]
+        parameters = ["t0","mej","vej","xlan","theta_v","E0","theta_c","theta_w","n","p","epsilon_E","epsilon_B","A","zp"]
         labels = [r"$T_0$", r"${\rm log}_{10} (M_{\rm ej})$",r"$v_{\rm ej}$",r"${\rm log}_{10} (X_{\rm lan})$", r"$\theta_v$", r"$E_0$", r"$\theta_c$", r"$\theta_w$", r"$n$",r"$p$", "$\epsilon_E$","$\epsilon_B$","${\rm log}_{10} (A)","ZP"]
         n_params = len(parameters)
 
-        pymultinest.run(myloglike_Ka2017_TrPi2018_A, myprior_Ka2017_TrPi2018_A, n_params, importance_nested_sampling = False, resume = True, verbose = True, sampling_efficiency = 'parameter', n_live_points = n_live_points, outputfiles_basename='%s/2-'%plotDir, evidence_tolerance = evidence_tolerance, multimodal = False, max_iter = max_iter)
+        sample(myloglike_Ka2017_TrPi2018_A, myprior_Ka2017_TrPi2018_A, parameters)
 
     #multifile= os.path.join(plotDir,'2-.txt')
     multifile = lightcurve_utils.get_post_file(plotDir)
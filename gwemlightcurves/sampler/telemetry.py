@@ -0,0 +1,103 @@
+import sys
+import json
+import time
+
+__all__ = ['Telemetry', 'get_telemetry', 'configure_telemetry']
+
+class Telemetry(object):
+    """
+    Counters of a sampling run: likelihood calls, time spent in model
+    evaluation, likelihood math and prior transforms, and the reasons points
+    were rejected. While enabled, a progress line is written to stream at
+    most every interval seconds; summary() gives the totals, with the model
+    cache statistics, for the final JSON report.
+
+    Every hook checks enabled first, so a disabled Telemetry costs one
+    attribute lookup per call.
+    """
+
+    SECTIONS = ('model', 'likelihood', 'prior')
+
+    def __init__(self, enabled=False, interval=30.0, stream=None):
+        self.enabled = enabled
+        self.interval = interval
+        self.stream = stream
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        # calc_prob evaluations, the calls not rejected by a prior
+        self.evaluations = 0
+        self.times = dict((section, 0.0) for section in self.SECTIONS)
+        self.rejections = {}
+        self.start = time.time()
+        self._last_report = self.start
+        self._last_calls = 0
+
+    def add_time(self, section, seconds):
+        self.times[section] = self.times.get(section, 0.0) + seconds
+
+    def reject(self, reason):
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+
+    def count(self, ncalls=1):
+        """Count likelihood calls and report progress if it is time to"""
+        self.calls += ncalls
+        now = time.time()
+        if now - self._last_report >= self.interval:
+            self.report(now)
+
+    def report(self, now=None):
+        if now is None:
+            now = time.time()
+        rate = (self.calls - self._last_calls)/max(now - self._last_report, 1e-9)
+        self._last_report, self._last_calls = now, self.calls
+        elapsed = max(now - self.start, 1e-9)
+        fractions = ', '.join('%s %.0f%%' % (section, 100*self.times[section]/elapsed)
+                              for section in self.SECTIONS)
+        from .cache import get_model_cache
+        stats = get_model_cache().stats()
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write('telemetry: %d likelihood calls (%.1f/s), %s, cache hit rate %.1f%%, %d rejected\n'
+                     % (self.calls, rate, fractions, 100*stats['hit_rate'], sum(self.rejections.values())))
+        stream.flush()
+
+    def summary(self):
+        from .cache import get_model_cache
+        elapsed = time.time() - self.start
+        return {'likelihood_calls': self.calls,
+                'elapsed': elapsed,
+                'calls_per_second': self.calls/elapsed if elapsed > 0 else 0.0,
+                'time': dict(self.times),
+                'rejections': dict(self.rejections),
+                'model_cache': get_model_cache().stats()}
+
+    def merge(self, summary):
+        """Add the counts of the summary() of another process, such as a
+        pool worker, to these"""
+        self.calls += summary['likelihood_calls']
+        for section, seconds in summary['time'].items():
+            self.add_time(section, seconds)
+        for reason, count in summary['rejections'].items():
+            self.rejections[reason] = self.rejections.get(reason, 0) + count
+
+    def save(self, filename):
+        with open(filename, 'w') as fid:
+            json.dump(self.summary(), fid, indent=2)
+
+_TELEMETRY = Telemetry()
+
+def get_telemetry():
+    """The Telemetry of the sampler functions of this process"""
+    return _TELEMETRY
+
+def configure_telemetry(enabled=None, interval=None, stream=None):
+    """Enable or disable telemetry, set its reporting interval in seconds
+    and output stream, and reset its counters"""
+    if enabled is not None:
+        _TELEMETRY.enabled = enabled
+    if interval is not None:
+        _TELEMETRY.interval = interval
+    if stream is not None:
+        _TELEMETRY.stream = stream
+    _TELEMETRY.reset()
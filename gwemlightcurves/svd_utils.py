@@ -628,6 +628,78 @@ def calc_lc(tini,tmax,dt,param_list,svd_mag_model=None,svd_lbol_model=None, mode
 
     return np.squeeze(tt), np.squeeze(lbol), mAB
 
+def calc_lc_batch(tini,tmax,dt,param_array,svd_mag_model=None,svd_lbol_model=None, model = "BaKa2016"):
+    """
+    Version of calc_lc for an (N, nparams) array of parameters. Every GP
+    is asked once for all N points.
+
+    Returns times (nt,), lbol (N, nt) and mag (N, 9, nt).
+    """
+
+    tt = np.arange(tini,tmax+dt,dt)
+    param_array = np.atleast_2d(np.asarray(param_array, dtype=float))
+
+    if svd_mag_model == None:
+        svd_mag_model = calc_svd_mag(tini,tmax,dt,model=model)
+    if svd_lbol_model == None:
+        svd_lbol_model = calc_svd_lbol(tini,tmax,dt,model=model)
+
+    filters = ["u","g","r","i","z","y","J","H","K"]
+    mAB = np.zeros((len(param_array),9,len(tt)))
+    for jj,filt in enumerate(filters):
+        mag_back = svd_predict(param_array,svd_mag_model[filt])
+        mAB[:,jj,:] = interp_rows(svd_mag_model[filt]["tt"],mag_back,tt)
+
+    lbol_back = svd_predict(param_array,svd_lbol_model)
+    lbol = 10**interp_rows(svd_lbol_model["tt"],lbol_back,tt)
+
+    return tt, lbol, mAB
+
+def svd_predict(param_array,svd_model):
+    """SVD reconstruction (N, ntt) of the GP predicted coefficients for each row of param_array"""
+
+    n_coeff = svd_model["n_coeff"]
+    VA = svd_model["VA"]
+    param_mins = np.asarray(svd_model["param_mins"])
+    param_maxs = np.asarray(svd_model["param_maxs"])
+    mins = svd_model["mins"]
+    maxs = svd_model["maxs"]
+    gps = svd_model["gps"]
+
+    param_array_postprocess = np.array(param_array, dtype=float)
+    nparams = len(param_mins)
+    param_array_postprocess[:,:nparams] = (param_array_postprocess[:,:nparams]-param_mins)/(param_maxs-param_mins)
+
+    cAproj = np.zeros((len(param_array),n_coeff))
+    for i in range(n_coeff):
+        cAproj[:,i] = gps[i].predict(param_array_postprocess)
+
+    vals_back = np.dot(cAproj,VA[:,:n_coeff].T)
+    vals_back = vals_back*(maxs-mins)+mins
+
+    return vals_back
+
+def interp_rows(tt_interp,vals,tt):
+    """Linear interpolation (and extrapolation) of each row of vals onto tt, skipping NaNs"""
+
+    out = np.zeros((len(vals),len(tt)))
+    good = ~np.any(np.isnan(vals),axis=1)
+
+    # rows without NaNs share the interpolation weights
+    jj = np.clip(np.searchsorted(tt_interp,tt),1,len(tt_interp)-1)
+    fac = (tt-tt_interp[jj-1])/(tt_interp[jj]-tt_interp[jj-1])
+    out[good] = (1-fac)*vals[good][:,jj-1] + fac*vals[good][:,jj]
+
+    for kk in np.where(~good)[0]:
+        ii = np.where(~np.isnan(vals[kk]))[0]
+        if len(ii) < 2:
+            out[kk] = np.nan
+        else:
+            f = interp.interp1d(tt_interp[ii], vals[kk,ii], fill_value='extrapolate')
+            out[kk] = f(tt)
+
+    return out
+
 def calc_spectra(tini,tmax,dt,lambdaini,lambdamax,dlambda,param_list,svd_spec_model=None,model = "BaKa2016"):
 
     tt = np.arange(tini,tmax+dt,dt)
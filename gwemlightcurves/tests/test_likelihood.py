@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Tests for :mod:`gwemlightcurves.sampler.likelihood`
+"""
+
+import numpy as np
+from scipy.special import logsumexp, log_ndtr
+from scipy.stats import chi2, kstest
+
+from gwemlightcurves.sampler.likelihood import LikelihoodPlan
+
+ERRORBUDGET = 0.01
+
+
+def _data_out(limit):
+    # one filter with three detections and an upper limit at limit
+    return {'g': np.array([[1.0, 20.0, 0.1],
+                           [2.0, 20.3, 0.1],
+                           [3.0, 20.5, 0.2],
+                           [2.5, limit, np.inf]])}
+
+
+def _loglike_zp(limit, zps):
+    # likelihood of calc_prob for the model magnitudes 20 + 0.2*t
+    data = _data_out(limit)['g']
+    detections, upperlimit = data[:3], data[3]
+    residuals = detections[:,1] - (20.0 + 0.2*detections[:,0]) - zps[:,np.newaxis]
+    sigma = np.sqrt(ERRORBUDGET**2 + detections[:,2]**2)
+    chisquare = np.sum((residuals/sigma)**2, axis=1)/(len(data) - 1)
+    logl = chi2.logpdf(chisquare, 1)
+    logl += log_ndtr((20.0 + 0.2*upperlimit[0] + zps - upperlimit[1])/ERRORBUDGET)
+    logl -= (len(data)/2.0)*np.log(2.0*np.pi*ERRORBUDGET**2)
+    return logl
+
+
+def _brute_force(limit, ZPRange, npoints=400001):
+    # trapezoidal rule of the likelihood over a flat prior on zp
+    zps = np.linspace(-ZPRange, ZPRange, npoints)
+    logl = _loglike_zp(limit, zps)
+    logw = np.log(np.full(npoints, zps[1] - zps[0]))
+    logw[[0, -1]] -= np.log(2.0)
+    return logsumexp(logl + logw) - np.log(2.0*ZPRange)
+
+
+def test_zp_marginal_upper_limit_away_from_chisquare_minimum():
+    tmag = np.linspace(0.0, 5.0, 51)
+    lbol = np.ones(len(tmag))
+    mag = np.tile(20.0 + 0.2*tmag, (9, 1))
+    # the best zp of the detections is near -0.13, the upper limit only
+    # allows zp above limit - 20.5, many errorbudgets away
+    for limit, ZPRange in [(20.9, 3.0), (21.3, 3.0), (22.0, 3.0), (22.0, 1.0)]:
+        plan = LikelihoodPlan(_data_out(limit), filters=['g'], errorbudget=ERRORBUDGET, ZPRange=ZPRange)
+        result = plan.evaluate(tmag, lbol, mag, 0.0, 0.0)
+        np.testing.assert_allclose(result, _brute_force(limit, ZPRange), atol=1e-3)
+
+
+def test_evaluate_batch_matches_evaluate():
+    rng = np.random.RandomState(0)
+    tmag = np.linspace(0.0, 5.0, 51)
+    lbol = np.ones((20, len(tmag)))
+    mag = 20.0 + 0.2*tmag + rng.normal(0.0, 0.3, (20, 9, 1))
+    # a model with a missing band goes through evaluate()
+    mag[3, 1, :10] = np.nan
+    t0 = rng.uniform(-1.0, 1.0, 20)
+    zp = rng.uniform(-0.5, 0.5, 20)
+    plan = LikelihoodPlan(_data_out(21.0), filters=['g'], errorbudget=0.1)
+    expected = [plan.evaluate(tmag, lbol[ii], mag[ii], t0[ii], zp[ii]) for ii in range(20)]
+    np.testing.assert_allclose(plan.evaluate_batch(tmag, lbol, mag, t0, zp), expected, rtol=1e-12)
+
+
+def test_t0_marginal_resolves_narrow_peak():
+    # a well-measured rise and decline pins t0 to much less than the model
+    # time step
+    tmag = np.arange(0.1, 14.0, 0.1)
+    mag = np.tile(19.0 + np.log1p(((tmag - 2.0)/0.7)**2), (9, 1))
+    tobs = np.array([0.8, 1.5, 2.3, 3.1, 4.6, 6.0, 8.5])
+    noise = np.array([0.012, -0.004, 0.009, -0.015, 0.003, 0.007, -0.01])
+    data_out = {'g': np.column_stack((tobs, np.interp(tobs - 0.237, tmag, mag[1]) + noise, np.full(len(tobs), 0.01)))}
+    plan = LikelihoodPlan(data_out, filters=['g'], errorbudget=0.01, T0Range=1.0)
+    result = plan.evaluate(tmag, np.ones(len(tmag)), mag, 0.0, 0.0)
+
+    t0s = np.linspace(-1.0, 1.0, 200001)
+    modelvals = plan.model_mags_shifted(tmag, mag, t0s)
+    logl = plan._loglike_values(modelvals, 0.0)[0]
+    logw = np.log(np.full(len(t0s), t0s[1] - t0s[0]))
+    logw[[0, -1]] -= np.log(2.0)
+    np.testing.assert_allclose(result, logsumexp(logl + logw) - np.log(2.0), atol=1e-3)
+
+
+def test_sample_nuisance_zp_distribution():
+    tmag = np.linspace(0.0, 5.0, 51)
+    lbol = np.ones(len(tmag))
+    mag = np.tile(20.0 + 0.2*tmag, (9, 1))
+    zps = np.linspace(-3.0, 3.0, 400001)
+    for limit in [21.0, 21.3]:
+        plan = LikelihoodPlan(_data_out(limit), filters=['g'], errorbudget=ERRORBUDGET, ZPRange=3.0)
+        plan.evaluate(tmag, lbol, mag, 0.0, 0.0)
+        rng = np.random.RandomState(1)
+        draws = [plan.sample_nuisance(random_state=rng)[1] for ii in range(20000)]
+        logl = _loglike_zp(limit, zps)
+        cdf = np.cumsum(np.exp(logl - np.max(logl)))
+        assert kstest(draws, lambda zp: np.interp(zp, zps, cdf/cdf[-1])).statistic < 0.01